@@ -0,0 +1,168 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Histograms of the requests handled by this process, recorded by the
+RequestMetricsMiddleware and exposed in the Prometheus text format.
+"""
+
+import bisect
+import hmac
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+# Upper bounds of the histogram buckets for each metric, by unit
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+BYTES_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Quoted literals of a query plan, holding the values of the query parameters
+REGEX_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+METRICS = {
+    "request_duration_seconds": ("Total time spent handling requests", SECONDS_BUCKETS),
+    "request_db_seconds": ("Time spent running SQL queries", SECONDS_BUCKETS),
+    "request_serialization_seconds": (
+        "Time spent rendering responses",
+        SECONDS_BUCKETS,
+    ),
+    "request_queries": ("Number of SQL queries", QUERIES_BUCKETS),
+    "response_size_bytes": ("Size of the responses sent", BYTES_BUCKETS),
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # The last count is for values above every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, view):
+        cumulated = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            cumulated += count
+            yield f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulated}'
+        yield f'{name}_sum{{view="{view}"}} {self.sum}'
+        yield f'{name}_count{{view="{view}"}} {self.count}'
+
+
+class Registry:
+    """
+    Histograms of each metric by view, shared by the threads of the process
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {
+                name: defaultdict(lambda buckets=buckets: Histogram(buckets))
+                for name, (_, buckets) in METRICS.items()
+            }
+
+    def observe(self, view, values):
+        with self.lock:
+            for name, value in values.items():
+                if value is not None:
+                    self.histograms[name][view].observe(value)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, (description, _) in METRICS.items():
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} histogram")
+                for view, histogram in sorted(self.histograms[name].items()):
+                    lines.extend(histogram.render(name, view))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper measuring the queries run while handling a request.
+    Statements slower than slow_threshold (in seconds) are kept to be explained.
+    """
+
+    def __init__(self, slow_threshold=None):
+        self.count = 0
+        self.duration = 0
+        self.slow_threshold = slow_threshold
+        self.slow_queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if (
+                self.slow_threshold is not None
+                and duration >= self.slow_threshold
+                and not many
+            ):
+                self.slow_queries.append(
+                    (duration, context["connection"].alias, sql, params)
+                )
+
+    def slowest(self, limit):
+        return sorted(self.slow_queries, key=lambda query: query[0], reverse=True)[
+            :limit
+        ]
+
+
+def explain(alias, sql, params):
+    """
+    Query plan of a statement, or None when it cannot be explained (e.g. not a SELECT).
+    The values of the parameters are redacted from the plan, as they may hold user input.
+    """
+    if not sql.lstrip().upper().startswith("SELECT"):
+        return None
+    connection = connections[alias]
+    prefix = "EXPLAIN" if connection.vendor == "postgresql" else "EXPLAIN QUERY PLAN"
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {sql}", params)
+            plan = "\n".join(
+                " ".join(str(value) for value in row) for row in cursor.fetchall()
+            )
+    except DatabaseError:
+        return None
+    return REGEX_LITERAL.sub("'?'", plan)
+
+
+def metrics_view(request):
+    """
+    Expose the histograms to a scraper authenticated with the METRICS_TOKEN
+    bearer token. The endpoint is disabled when no token is configured.
+    """
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    authorization = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(
+        authorization.encode(), f"Bearer {settings.METRICS_TOKEN}".encode()
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
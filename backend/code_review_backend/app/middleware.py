@@ -0,0 +1,178 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import logging
+import re
+import secrets
+import time
+from contextlib import ExitStack
+
+import brotli
+from django.conf import settings
+from django.db import connections
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+from code_review_backend.app import metrics
+
+logger = logging.getLogger("request.metrics")
+slow_query_logger = logging.getLogger("request.slow_query")
+
+RE_ACCEPTS_BROTLI = re.compile(r"\bbr\b")
+
+# Highest levels are too slow for dynamic content
+BROTLI_QUALITY = 5
+
+
+def brotli_padding(max_random_bytes):
+    """
+    Metadata meta-block of random size, ignored by decoders (RFC 7932, section 9.2).
+    Like the random file name added to gzip responses by Django, it mitigates the
+    BREACH attack by varying the size of compressed responses.
+    """
+    size = secrets.randbelow(max_random_bytes) + 1
+    # ISLAST=0, MNIBBLES=0 (metadata), reserved bit, MSKIPBYTES=1,
+    # then MSKIPLEN-1 on 8 bits and zero bits up to the next byte
+    skip = size - 1
+    header = bytes([0b00010110 | (skip & 0b11) << 6, skip >> 2])
+    return header + secrets.token_bytes(size)
+
+
+def compress_brotli_sequence(sequence, max_random_bytes):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    # The padding must start on a byte boundary, after the stream header
+    yield compressor.flush() + brotli_padding(max_random_bytes)
+    for item in sequence:
+        data = compressor.process(item)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compress responses with brotli when the client accepts it, falling back to gzip.
+    Responses smaller than COMPRESSION_MIN_SIZE are not worth compressing, and
+    streaming responses are compressed chunk by chunk without being buffered.
+    Both encodings add random padding to the responses, against BREACH.
+    """
+
+    def process_response(self, request, response):
+        if (
+            not response.streaming
+            and len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+
+        if (
+            response.has_header("Content-Encoding")
+            or (response.streaming and response.is_async)
+            or not RE_ACCEPTS_BROTLI.search(request.headers.get("Accept-Encoding", ""))
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if response.streaming:
+            response.streaming_content = compress_brotli_sequence(
+                response.streaming_content, self.max_random_bytes
+            )
+            # The compressed size is only known once everything has been streamed
+            del response.headers["Content-Length"]
+        else:
+            compressed_content = b"".join(
+                compress_brotli_sequence([response.content], self.max_random_bytes)
+            )
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers["Content-Length"] = str(len(response.content))
+
+        # Compressed representations only match weakly the original ETag
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
+
+
+class RequestMetricsMiddleware:
+    """
+    Record the duration, SQL queries, rendering time and response size of each
+    request, in the histograms of its view and in the request.metrics log.
+    Statements slower than SLOW_QUERY_THRESHOLD milliseconds are logged with their
+    query plan, up to SLOW_QUERY_MAX_EXPLAINED statements per request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        threshold = settings.SLOW_QUERY_THRESHOLD
+        recorder = metrics.QueryRecorder(
+            slow_threshold=threshold / 1000 if threshold else None
+        )
+        request._serialization_time = 0
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match is not None else "unresolved"
+        values = {
+            "request_duration_seconds": duration,
+            "request_db_seconds": recorder.duration,
+            "request_serialization_seconds": request._serialization_time,
+            "request_queries": recorder.count,
+            # Streamed responses have no known size
+            "response_size_bytes": (
+                None if response.streaming else len(response.content)
+            ),
+        }
+        metrics.registry.observe(view, values)
+        logger.info(
+            "",
+            extra={
+                "view": view,
+                "status": response.status_code,
+                "t": int(duration * 1000),
+                "db_t": int(recorder.duration * 1000),
+                "serialization_t": int(request._serialization_time * 1000),
+                "queries": recorder.count,
+                "size": values["response_size_bytes"],
+            },
+        )
+
+        for query_duration, alias, sql, params in recorder.slowest(
+            settings.SLOW_QUERY_MAX_EXPLAINED
+        ):
+            slow_query_logger.warning(
+                "",
+                extra={
+                    "view": view,
+                    "t": int(query_duration * 1000),
+                    "sql": sql,
+                    "plan": metrics.explain(alias, sql, params),
+                },
+            )
+
+        return response
+
+    def process_template_response(self, request, response):
+        # Responses are rendered by Django once all middlewares processed them
+        render = response.render
+
+        def timed_render():
+            start = time.perf_counter()
+            try:
+                return render()
+            finally:
+                request._serialization_time += time.perf_counter() - start
+                del response.render
+
+        response.render = timed_render
+        return response
@@ -50,6 +50,16 @@ env = environ.Env(
         ["http://localhost:8000", "http://localhost:8010"],
     ),
     DYNO=(str, ""),
+    MAX_PAGE_SIZE=(int, 1000),
+    EXPORT_CHUNK_SIZE=(int, 2000),
+    COMPRESSION_MIN_SIZE=(int, 1024),
+    PAGINATION_ESTIMATE_THRESHOLD=(int, 10000),
+    SLOW_QUERY_THRESHOLD=(int, 0),
+    SLOW_QUERY_MAX_EXPLAINED=(int, 3),
+    METRICS_TOKEN=(str, ""),
+    ISSUE_LINKS_PARTITIONED=(bool, False),
+    CACHE_URL=(str, "dummycache://"),
+    API_CACHE_TIMEOUT=(int, 24 * 3600),
 )
 
 # Set backend user agent
@@ -84,8 +94,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Measure requests as a whole, including the other middlewares
+    "code_review_backend.app.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
+    # Compress responses before they are handled by other middlewares
+    "code_review_backend.app.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -157,8 +171,61 @@ REST_FRAMEWORK = {
     # Setup pagination
     "PAGE_SIZE": 50,
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
+    # Use orjson to render and parse JSON payloads
+    "DEFAULT_RENDERER_CLASSES": [
+        "code_review_backend.issues.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "code_review_backend.issues.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
 }
 
+# Maximum page size that machine clients (e.g. the bot) can request
+# on endpoints supporting the keyset pagination
+MAX_PAGE_SIZE = env("MAX_PAGE_SIZE")
+
+# Listings estimated above this number of rows use the planner estimate as their
+# total count instead of an exact COUNT(*) (PostgreSQL only)
+PAGINATION_ESTIMATE_THRESHOLD = env("PAGINATION_ESTIMATE_THRESHOLD")
+
+# SQL statements slower than this duration (in milliseconds) are logged with
+# their query plan, up to SLOW_QUERY_MAX_EXPLAINED per request (0 disables it)
+SLOW_QUERY_THRESHOLD = env("SLOW_QUERY_THRESHOLD")
+SLOW_QUERY_MAX_EXPLAINED = env("SLOW_QUERY_MAX_EXPLAINED")
+
+# Bearer token required to scrape the request metrics on /__metrics__
+# (the endpoint is disabled when empty)
+METRICS_TOKEN = env("METRICS_TOKEN")
+
+# Number of rows fetched from the database cursor and written at once by streaming exports
+EXPORT_CHUNK_SIZE = env("EXPORT_CHUNK_SIZE")
+
+# Responses smaller than this size (in bytes) are sent uncompressed
+COMPRESSION_MIN_SIZE = env("COMPRESSION_MIN_SIZE")
+
+# Set once issue links have been converted to monthly partitions (PostgreSQL only)
+# using the partition_issue_links command, so that cleanup drops whole partitions
+ISSUE_LINKS_PARTITIONED = env("ISSUE_LINKS_PARTITIONED")
+
+# Cache shared by all the workers (e.g. rediscache:// or dbcache://), used to store
+# API responses.
+# https://django-environ.readthedocs.io/en/latest/types.html#environ-env-cache-url
+CACHES = {"default": env.cache("CACHE_URL")}
+
+# Cached API responses are invalidated by every process writing to the database
+# (web workers, process_issues_queue, cleanup_issues...), so they are only cached
+# in a backend shared by all those processes
+API_CACHE_ENABLED = CACHES["default"]["BACKEND"] not in (
+    "django.core.cache.backends.dummy.DummyCache",
+    "django.core.cache.backends.locmem.LocMemCache",
+)
+
+# API responses are invalidated on writes, so they can be kept for a long time
+API_CACHE_TIMEOUT = env("API_CACHE_TIMEOUT")
+
 # Internal Ips where django debug toolbar is enabled
 INTERNAL_IPS = ["127.0.0.1"]
 
@@ -205,6 +272,14 @@ LOGGING = {
             "handlers": ["json"],
             "level": "DEBUG",
         },
+        "request.metrics": {
+            "handlers": ["json"],
+            "level": "DEBUG",
+        },
+        "request.slow_query": {
+            "handlers": ["json"],
+            "level": "DEBUG",
+        },
     },
 }
 
@@ -10,6 +10,7 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
+from code_review_backend.app.metrics import metrics_view
 from code_review_backend.issues import api
 
 # Build Swagger schema view
@@ -29,6 +30,7 @@ urlpatterns = [
     path("", lambda request: redirect("docs/", permanent=False)),
     path("v1/", include(api.urls)),
     path("admin/", admin.site.urls),
+    path("__metrics__", metrics_view, name="metrics"),
     path(
         r"docs<format>\.json|\.yaml)",
         schema_view.without_ui(cache_timeout=0),
@@ -5,46 +5,139 @@
 from collections import defaultdict
 from datetime import date, datetime, timedelta
 
+import orjson
 from django.conf import settings
 from django.core.exceptions import BadRequest
-from django.db.models import BooleanField, Count, ExpressionWrapper, Prefetch, Q
+from django.db.models import (
+    BooleanField,
+    Count,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Prefetch,
+    Q,
+)
 from django.db.models.functions import TruncDate
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.urls import path
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
 from rest_framework import generics, mixins, routers, status, viewsets
+from rest_framework.decorators import action
 from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from code_review_backend.issues import cache
+from code_review_backend.issues.compare import compare_diffs
 from code_review_backend.issues.models import (
     LEVEL_ERROR,
     Diff,
+    DirectoryStats,
     Issue,
+    IssueBulkRequest,
     IssueLink,
+    KnownIssue,
     Repository,
     Revision,
 )
+from code_review_backend.issues.pagination import (
+    DiffPagination,
+    IssueCheckPagination,
+    IssueHashPagination,
+    IssuePagination,
+)
+from code_review_backend.issues.projections import DiffProjection, IssueProjection
 from code_review_backend.issues.serializers import (
     DiffFullSerializer,
     DiffSerializer,
     HistoryPointSerializer,
+    IssueBulkRequestSerializer,
     IssueBulkSerializer,
     IssueCheckSerializer,
     IssueCheckStatsSerializer,
     IssueHashSerializer,
     IssueSerializer,
     RepositorySerializer,
+    RevisionDetailsSerializer,
     RevisionSerializer,
 )
 
 
 class CachedView:
-    """Helper to bring DRF caching to GET methods"""
+    """
+    Helper to store the data of successful list & retrieve responses in the shared cache.
+    Views describe the data they depend on through cache scopes, so that cached
+    responses are invalidated as soon as that data changes.
+    No scopes (None) disables the cache, as well as a cache backend that is not shared
+    by all the processes (see API_CACHE_ENABLED).
+
+    Responses also carry an ETag derived from the cache key, so clients can revalidate
+    their copy with If-None-Match and get a 304 without any query nor serialization.
+    """
+
+    cache_scopes = ()
+
+    def get_cache_scopes(self):
+        return self.cache_scopes
+
+    def cached(self, method, request, *args, **kwargs):
+        scopes = self.get_cache_scopes()
+        if scopes is None or not cache.is_enabled():
+            return method(request, *args, **kwargs)
+
+        key = cache.build_key(request, scopes)
+        etag = cache.build_etag(request, key)
+        # Compressed responses carry a weak version of the ETag
+        if_none_match = {
+            tag.removeprefix("W/")
+            for tag in parse_etags(request.headers.get("If-None-Match", ""))
+        }
+        if etag in if_none_match:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = cache.get_data(key)
+            if data is not None:
+                response = Response(data)
+            else:
+                response = method(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set_data(key, response.data)
+
+            # The wildcard only matches a resource that exists
+            if "*" in if_none_match:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+
+        # New issues may still be published, so clients must always revalidate
+        response["ETag"] = etag
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(super().retrieve, request, *args, **kwargs)
+
+
+class ProjectedListMixin:
+    """
+    List rows through a lightweight projection instead of the serializer class,
+    which is still used to retrieve, update and document single objects.
+    """
+
+    projection_class = None
+
+    def list(self, request, *args, **kwargs):
+        projection = self.projection_class(request)
+        queryset = projection.prepare(self.filter_queryset(self.get_queryset()))
 
-    @method_decorator(cache_page(1800))
-    def get(self, *args, **kwargs):
-        return super().get(*args, **kwargs)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(projection.project(page))
+        return Response(projection.project(queryset))
 
 
 class CreateListRetrieveViewSet(
@@ -64,7 +157,7 @@ class RepositoryViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = RepositorySerializer
 
 
-class RevisionViewSet(CreateListRetrieveViewSet):
+class RevisionViewSet(CachedView, CreateListRetrieveViewSet):
     """
     Manages revisions
     """
@@ -72,6 +165,52 @@ class RevisionViewSet(CreateListRetrieveViewSet):
     queryset = Revision.objects.all()
     serializer_class = RevisionSerializer
 
+    def get_cache_scopes(self):
+        # Only the details of a revision are cached
+        if self.action in ("retrieve", "details"):
+            return [cache.revision_scope(self.kwargs["pk"])]
+        return None
+
+    @action(detail=True)
+    def details(self, request, *args, **kwargs):
+        """
+        Retrieve a revision with all its diffs and their counters, and with
+        their issues when the `issues` parameter is true, in a fixed number of queries
+        """
+        return self.cached(self.get_details, request, *args, **kwargs)
+
+    def get_details(self, request, pk):
+        with_issues = request.query_params.get("issues", "false").lower() == "true"
+        diffs = Diff.objects.with_counters().select_related("repository")
+        if with_issues:
+            diffs = diffs.prefetch_related(
+                Prefetch(
+                    "issue_links",
+                    queryset=IssueLink.objects.select_related("issue__message")
+                    # Same flag as the issues listed by IssueViewSet
+                    .annotate(
+                        listed_publishable=Q(in_patch=True)
+                        & Q(issue__level=LEVEL_ERROR)
+                    )
+                    .order_by("id"),
+                )
+            )
+        revision = get_object_or_404(
+            Revision.objects.select_related(
+                "base_repository", "head_repository"
+            ).prefetch_related(Prefetch("diffs", queryset=diffs.order_by("id"))),
+            pk=pk,
+        )
+
+        data = RevisionDetailsSerializer(revision, context={"request": request}).data
+        if with_issues:
+            projection = IssueProjection(request)
+            for diff, diff_data in zip(revision.diffs.all(), data["diffs"]):
+                diff_data["issues"] = [
+                    projection.project_link(link) for link in diff.issue_links.all()
+                ]
+        return Response(data)
+
     def create(self, request, *args, **kwargs):
         """Override CreateModelMixin.create to avoid creating duplicates"""
 
@@ -96,13 +235,16 @@ class RevisionViewSet(CreateListRetrieveViewSet):
         return super().create(request, *args, **kwargs)
 
 
-class RevisionDiffViewSet(CreateListRetrieveViewSet):
+class RevisionDiffViewSet(CachedView, CreateListRetrieveViewSet):
     """
     Manages diffs in a revision (allow creation)
     """
 
     serializer_class = DiffSerializer
 
+    def get_cache_scopes(self):
+        return [cache.revision_scope(self.kwargs.get("revision_id"))]
+
     def get_queryset(self):
         # Required to generate the OpenAPI documentation
         if not self.kwargs.get("revision_id"):
@@ -113,14 +255,18 @@ class RevisionDiffViewSet(CreateListRetrieveViewSet):
         # Attach revision to diff created
         revision = get_object_or_404(Revision, id=self.kwargs["revision_id"])
         serializer.save(revision=revision)
+        cache.invalidate(cache.DIFFS, cache.revision_scope(revision.id))
 
 
-class DiffViewSet(viewsets.ReadOnlyModelViewSet):
+class DiffViewSet(CachedView, ProjectedListMixin, viewsets.ReadOnlyModelViewSet):
     """
     List and retrieve diffs with detailed revision information
     """
 
     serializer_class = DiffFullSerializer
+    projection_class = DiffProjection
+    pagination_class = DiffPagination
+    cache_scopes = (cache.DIFFS,)
 
     def get_queryset(self):
         diffs = (
@@ -137,24 +283,7 @@ class DiffViewSet(viewsets.ReadOnlyModelViewSet):
                 "revision__head_repository",
                 "repository",
             )
-            .annotate(nb_issues=Count("issue_links"))
-            .annotate(
-                nb_errors=Count(
-                    "issue_links", filter=Q(issue_links__issue__level=LEVEL_ERROR)
-                )
-            )
-            .annotate(
-                nb_warnings=Count(
-                    "issue_links", filter=Q(issue_links__issue__level="warning")
-                )
-            )
-            .annotate(
-                nb_issues_publishable=Count(
-                    "issue_links",
-                    filter=Q(issue_links__in_patch=True)
-                    | Q(issue_links__issue__level=LEVEL_ERROR),
-                )
-            )
+            .with_counters()
             .order_by("-id")
         )
 
@@ -170,12 +299,9 @@ class DiffViewSet(viewsets.ReadOnlyModelViewSet):
         # Filter by text search query
         query = self.request.query_params.get("search")
         if query is not None:
-            search_query = (
-                Q(id__icontains=query)
-                | Q(revision__provider_id__icontains=query)
-                | Q(revision__bugzilla_id__icontains=query)
-                | Q(revision__title__icontains=query)
-            )
+            search_query = Q(revision__in=Revision.objects.search(query))
+            if query.strip().isdigit():
+                search_query |= Q(id__contains=query.strip())
             diffs = diffs.filter(search_query)
 
         # Filter by issues types
@@ -191,6 +317,8 @@ class DiffViewSet(viewsets.ReadOnlyModelViewSet):
 
 
 class IssueViewSet(
+    CachedView,
+    ProjectedListMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
     mixins.DestroyModelMixin,
@@ -203,6 +331,24 @@ class IssueViewSet(
     """
 
     serializer_class = IssueSerializer
+    projection_class = IssueProjection
+    pagination_class = IssuePagination
+
+    def get_cache_scopes(self):
+        # Issues are listed and retrieved through their diff, while updates
+        # and deletions of an issue invalidate the whole cache
+        if self.action in ("list", "retrieve"):
+            return [cache.diff_scope(self.kwargs.get("diff_provider_id"))]
+        return None
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        # An issue can be listed on any diff or statistics
+        cache.invalidate(cache.ALL)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        cache.invalidate(cache.ALL)
 
     def get_queryset(self):
         # Required to generate the OpenAPI documentation
@@ -222,14 +368,50 @@ class IssueViewSet(
                 "issue_links__nb_lines",
                 "issue_links__char",
                 "level",
-                "message",
                 "publishable",
                 "issue_links__in_patch",
                 "issue_links__new_for_revision",
+                message_text=F("message__text"),
+                # Unique key used by the keyset pagination
+                link_id=F("issue_links__id"),
             )
         )
 
 
+class DiffComparison(CachedView, generics.GenericAPIView):
+    """
+    Compare the issues of a diff to the ones of a previous diff, listing the hashes
+    of unresolved, closed and new issues
+    """
+
+    def get_cache_scopes(self):
+        return [
+            cache.diff_scope(self.kwargs["diff_provider_id"]),
+            cache.diff_scope(self.kwargs["previous_provider_id"]),
+        ]
+
+    def get(self, request, *args, **kwargs):
+        return self.cached(self.compare, request, *args, **kwargs)
+
+    def compare(self, request, diff_provider_id, previous_provider_id):
+        diffs = {
+            diff.provider_id: diff
+            for diff in Diff.objects.filter(
+                provider_id__in=(diff_provider_id, previous_provider_id)
+            )
+        }
+        if diff_provider_id not in diffs or previous_provider_id not in diffs:
+            raise Http404("No diff matches the given provider IDs.")
+
+        comparison = compare_diffs(diffs[diff_provider_id], diffs[previous_provider_id])
+        return Response(
+            {
+                key: sorted(hash.hex for hash in hashes)
+                for key, hashes in comparison.items()
+            }
+        )
+
+
 class IssueBulkCreate(generics.CreateAPIView):
     """
     Create multiple issues at once, linked to a mandatory revision and an optional diff.
@@ -242,17 +424,62 @@ class IssueBulkCreate(generics.CreateAPIView):
         # Required to generate the OpenAPI documentation
         if not self.kwargs.get("revision_id"):
             return context
-        revision = get_object_or_404(Revision, id=self.kwargs["revision_id"])
+        revision = get_object_or_404(
+            Revision.objects.select_related("head_repository"),
+            id=self.kwargs["revision_id"],
+        )
         context["revision"] = revision
         return context
 
+    def create(self, request, *args, **kwargs):
+        """
+        Clients sending a `Prefer: respond-async` header get their issues queued
+        for the process_issues_queue worker, and a status URL to follow their creation
+        """
+        if "respond-async" not in request.headers.get("Prefer", ""):
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        bulk_request = IssueBulkRequest.objects.create(
+            revision=serializer.context["revision"],
+            diff=serializer.validated_data.get("diff_provider_id"),
+            payload=request.data["issues"],
+        )
+        data = IssueBulkRequestSerializer(
+            bulk_request, context=self.get_serializer_context()
+        ).data
+        return Response(
+            data, status=status.HTTP_202_ACCEPTED, headers={"Location": data["url"]}
+        )
+
+
+class IssueBulkRequestDetail(generics.RetrieveAPIView):
+    """
+    Follow the creation of issues queued by the asynchronous mode of IssueBulkCreate
+    """
+
+    # Only the clients allowed to queue issues can follow them
+    permission_classes = [IsAuthenticated]
+    serializer_class = IssueBulkRequestSerializer
+
+    def get_queryset(self):
+        return IssueBulkRequest.objects.filter(revision_id=self.kwargs["revision_id"])
+
 
-class IssueCheckDetails(generics.ListAPIView):
+class IssueCheckDetails(CachedView, generics.ListAPIView):
     """
     List all the issues found by a specific analyzer check in a repository
     """
 
     serializer_class = IssueCheckSerializer
+    pagination_class = IssueCheckPagination
+
+    def get_cache_scopes(self):
+        return [
+            cache.repository_scope(self.kwargs["repository"]),
+            cache.analyzer_scope(self.kwargs["analyzer"]),
+        ]
 
     def get_queryset(self):
         repo = self.kwargs["repository"]
@@ -262,17 +489,18 @@ class IssueCheckDetails(generics.ListAPIView):
             .filter(analyzer=self.kwargs["analyzer"])
             .filter(analyzer_check=self.kwargs["check"])
             .annotate(publishable=Q(issue_links__in_patch=True) & Q(level=LEVEL_ERROR))
+            .annotate(message_text=F("message__text"))
+            # List of diffs for each link of this issue, with their revision
             .prefetch_related(
-                "issue_links__diff__repository",
                 Prefetch(
-                    "issue_links__diff__revision",
-                    queryset=Revision.objects.select_related(
-                        "base_repository", "head_repository"
+                    "diffs",
+                    queryset=Diff.objects.select_related(
+                        "repository",
+                        "revision__base_repository",
+                        "revision__head_repository",
                     ),
-                ),
+                )
             )
-            # List of diffs for each link of this issue
-            .prefetch_related("diffs")
             .order_by("-created")
         )
 
@@ -305,6 +533,7 @@ class IssueCheckStats(CachedView, generics.ListAPIView):
     """
 
     serializer_class = IssueCheckStatsSerializer
+    cache_scopes = (cache.STATS,)
 
     def get_queryset(self):
         queryset = (
@@ -363,6 +592,26 @@ class IssueCheckStats(CachedView, generics.ListAPIView):
         )
 
 
+class IssueCheckStatsCompact(IssueCheckStats):
+    """
+    Same statistics as IssueCheckStats in a single unpaginated response,
+    as rows of values sharing a list of columns
+    """
+
+    pagination_class = None
+    columns = ("repository", "analyzer", "check", "total", "publishable")
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(self.list_rows, request, *args, **kwargs)
+
+    def list_rows(self, request, *args, **kwargs):
+        fields = [
+            self.get_serializer().fields[column].source for column in self.columns
+        ]
+        rows = [[row[field] for field in fields] for row in self.get_queryset()]
+        return Response({"columns": self.columns, "rows": rows})
+
+
 class IssueCheckHistory(CachedView, generics.ListAPIView):
     """
     Historical usage per day of an issue checks
@@ -373,6 +622,7 @@ class IssueCheckHistory(CachedView, generics.ListAPIView):
     """
 
     serializer_class = HistoryPointSerializer
+    cache_scopes = (cache.STATS,)
 
     # For ease of use, the history is available without pagination
     # as the SQL request should be always fast to calculate
@@ -428,12 +678,13 @@ class IssueCheckHistory(CachedView, generics.ListAPIView):
         return queryset.order_by("date").distinct()
 
 
-class IssueList(generics.ListAPIView):
-    serializer_class = IssueHashSerializer
-
-    def get_queryset(self):
-        qs = Issue.objects.all().only("id", "hash").prefetch_related("revisions")
+class RepositoryIssuesMixin:
+    """
+    Filter the issues detected on a repository, optionally on a path and
+    on the revision matching a changeset or closest to a date.
+    """
 
+    def filter_issues(self, qs):
         errors = defaultdict(list)
         repo_slug = self.kwargs["repo_slug"]
         filters = {}
@@ -493,6 +744,134 @@ class IssueList(generics.ListAPIView):
         return qs.filter(**filters).order_by("created").distinct()
 
 
+class IssueList(RepositoryIssuesMixin, generics.ListAPIView):
+    serializer_class = IssueHashSerializer
+    pagination_class = IssueHashPagination
+
+    def get_queryset(self):
+        return self.filter_issues(
+            Issue.objects.all().only("id", "hash").prefetch_related("revisions")
+        )
+
+
+class IssueExport(RepositoryIssuesMixin, generics.GenericAPIView):
+    """
+    Stream all the issues of a repository as newline-delimited JSON, using the same
+    filters as IssueList. Rows are read through a server-side cursor (on PostgreSQL)
+    and written as they come, so memory usage does not depend on the number of issues.
+    The output is compressed on the fly by the CompressionMiddleware.
+    """
+
+    fields = ("id", "hash", "analyzer", "analyzer_check", "path", "level", "created")
+
+    def get_queryset(self):
+        return self.filter_issues(Issue.objects.all())
+
+    def iter_lines(self, queryset):
+        rows = queryset.values(*self.fields, message_text=F("message__text"))
+        chunk = []
+        for row in rows.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+            row["hash"] = row["hash"].hex
+            row["message"] = row.pop("message_text")
+            chunk.append(orjson.dumps(row))
+            if len(chunk) >= settings.EXPORT_CHUNK_SIZE:
+                yield b"\n".join(chunk) + b"\n"
+                chunk = []
+        if chunk:
+            yield b"\n".join(chunk) + b"\n"
+
+    def get(self, request, *args, **kwargs):
+        # Invalid parameters are reported before the streaming starts
+        return StreamingHttpResponse(
+            self.iter_lines(self.get_queryset()), content_type="application/x-ndjson"
+        )
+
+
+class KnownIssueList(CachedView, generics.GenericAPIView):
+    """
+    List the hashes of the issues currently known on a repository, optionally on
+    a single path, as detected on its last ingested revision
+    """
+
+    def get_cache_scopes(self):
+        return [cache.repository_scope(self.kwargs["repo_slug"])]
+
+    def get(self, request, *args, **kwargs):
+        return self.cached(self.list_hashes, request, *args, **kwargs)
+
+    def list_hashes(self, request, repo_slug):
+        repository = get_object_or_404(
+            Repository.objects.annotate(
+                known_revision=KnownIssue.objects.revision_of(OuterRef("pk"))
+            ),
+            slug=repo_slug,
+        )
+        known_issues = KnownIssue.objects.filter(repository=repository)
+        if path := request.query_params.get("path"):
+            known_issues = known_issues.filter(path=path)
+        hashes = known_issues.order_by("path", "hash").values_list("hash", flat=True)
+        return Response(
+            {
+                "path": path,
+                # Null until a revision of the repository has been ingested
+                "revision": repository.known_revision,
+                "hashes": [hash.hex for hash in hashes],
+            }
+        )
+
+
+class KnownIssueRefresh(generics.GenericAPIView):
+    """
+    Use the issues of an ingested revision as the known issues of its repository
+    """
+
+    def post(self, request, revision_id):
+        revision = get_object_or_404(
+            Revision.objects.select_related("head_repository"), id=revision_id
+        )
+        total = KnownIssue.objects.refresh(revision)
+        if total is not None:
+            cache.invalidate(cache.repository_scope(revision.head_repository.slug))
+        return Response({"refreshed": total is not None, "known_issues": total})
+
+
+class DirectoryStatsList(CachedView, generics.GenericAPIView):
+    """
+    Count the issues currently known under a directory of a repository, and under
+    each of its subdirectories, by analyzer and check
+    """
+
+    def get_cache_scopes(self):
+        return [cache.repository_scope(self.kwargs["repo_slug"])]
+
+    def get(self, request, *args, **kwargs):
+        return self.cached(self.list_directories, request, *args, **kwargs)
+
+    def list_directories(self, request, repo_slug):
+        repository = get_object_or_404(Repository, slug=repo_slug)
+        path = request.query_params.get("path", "").strip("/")
+        rows = (
+            DirectoryStats.objects.filter(repository=repository)
+            .filter(Q(path=path) | Q(parent=path))
+            .order_by("path", "analyzer", "analyzer_check")
+            .values("path", "analyzer", "analyzer_check", "total", "errors")
+        )
+
+        checks, directories = [], []
+        for row in rows:
+            stats = {
+                "analyzer": row["analyzer"],
+                "check": row["analyzer_check"],
+                "total": row["total"],
+                "errors": row["errors"],
+            }
+            if row["path"] == path:
+                checks.append(stats)
+            else:
+                directories.append({"path": row["path"], **stats})
+        return Response({"path": path, "checks": checks, "directories": directories})
+
+
 # Build exposed urls for the API
 router = routers.DefaultRouter()
 router.register(r"repository", RepositoryViewSet)
@@ -507,12 +886,32 @@ router.register(
     r"diff/(?P<diff_provider_id>[0-9a-zA-Z-]+)/issues", IssueViewSet, basename="issues"
 )
 urls = router.urls + [
+    path(
+        "diff/<str:diff_provider_id>/compare/<str:previous_provider_id>/",
+        DiffComparison.as_view(),
+        name="diff-comparison",
+    ),
     path(
         "revision/<int:revision_id>/issues/",
         IssueBulkCreate.as_view(),
         name="revision-issues-bulk",
     ),
+    path(
+        "revision/<int:revision_id>/issues/<int:pk>/",
+        IssueBulkRequestDetail.as_view(),
+        name="revision-issues-bulk-status",
+    ),
+    path(
+        "revision/<int:revision_id>/known-issues/",
+        KnownIssueRefresh.as_view(),
+        name="revision-known-issues",
+    ),
     path("check/stats/", IssueCheckStats.as_view(), name="issue-checks-stats"),
+    path(
+        "check/stats/compact/",
+        IssueCheckStatsCompact.as_view(),
+        name="issue-checks-stats-compact",
+    ),
     path("check/history/", IssueCheckHistory.as_view(), name="issue-checks-history"),
     path(
         "check/<str:repository>/<str:analyzer>/<path:check>/",
@@ -520,4 +919,19 @@ urls = router.urls + [
         name="issue-check-details",
     ),
     path("issues/<slug:repo_slug>/", IssueList.as_view(), name="repository-issues"),
+    path(
+        "issues/<slug:repo_slug>/export/",
+        IssueExport.as_view(),
+        name="repository-issues-export",
+    ),
+    path(
+        "issues/<slug:repo_slug>/known/",
+        KnownIssueList.as_view(),
+        name="repository-known-issues",
+    ),
+    path(
+        "issues/<slug:repo_slug>/directories/",
+        DirectoryStatsList.as_view(),
+        name="repository-directories",
+    ),
 ]
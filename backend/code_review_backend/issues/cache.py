@@ -0,0 +1,110 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Versioned keys for the API responses stored in the shared cache.
+
+Each cached response depends on some scopes (e.g. a repository or an analyzer),
+and every scope has a random version token. Writes replace the tokens of the
+scopes they affect, so cached responses are never served once their data changed.
+The ALL scope is part of every key, and allows to invalidate everything at once.
+
+Version tokens must be shared by all the processes writing to the database, so
+nothing is cached without a shared cache backend (see API_CACHE_ENABLED).
+"""
+
+import hashlib
+import uuid
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import quote_etag
+
+ALL = "all"
+DIFFS = "diffs"
+STATS = "stats"
+
+VERSION_KEY = "api:version:{}"
+
+
+def repository_scope(slug):
+    return f"repository:{slug}"
+
+
+def analyzer_scope(analyzer):
+    return f"analyzer:{analyzer}"
+
+
+def revision_scope(revision_id):
+    return f"revision:{revision_id}"
+
+
+def diff_scope(provider_id):
+    return f"diff:{provider_id}"
+
+
+def is_enabled():
+    return settings.API_CACHE_ENABLED
+
+
+def get_versions(scopes):
+    """
+    Retrieve the version tokens of some scopes in a single cache query,
+    initializing the missing ones
+    """
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Another process may have initialized the version meanwhile
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def build_key(request, scopes):
+    """
+    Build the cache key of a GET request, depending on the current versions of its scopes.
+    The day is part of the key as some endpoints filter data relatively to today.
+    """
+    versions = get_versions([ALL, *scopes])
+    payload = ":".join([request.build_absolute_uri(), str(date.today()), *versions])
+    return "api:response:" + hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+
+def build_etag(request, key):
+    """
+    Build an ETag from the cache key of a request: it changes along with the versions
+    of its scopes, so it can be checked without querying the database.
+    The same data is rendered differently depending on the accepted format.
+    """
+    payload = ":".join([key, request.headers.get("Accept", "")])
+    return quote_etag(hashlib.md5(payload.encode("utf-8")).hexdigest())
+
+
+def get_data(key):
+    return cache.get(key)
+
+
+def set_data(key, data):
+    cache.set(key, data, timeout=settings.API_CACHE_TIMEOUT)
+
+
+def invalidate(*scopes):
+    """
+    Replace the version tokens of some scopes once the current transaction is committed,
+    so that no request can cache data that is about to change under the new version.
+    """
+    if not is_enabled():
+        return
+
+    def _bump():
+        cache.set_many(
+            {VERSION_KEY.format(scope): uuid.uuid4().hex for scope in scopes},
+            timeout=None,
+        )
+
+    transaction.on_commit(_bump)
@@ -0,0 +1,217 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Export and import of the issues database as Parquet files.
+
+Each table is written in its own directory, split in part files holding a bounded
+number of rows, along with a manifest describing the dump. Rows are read through
+chunked server-side cursors, and loaded back with COPY on PostgreSQL.
+"""
+
+import io
+import itertools
+import json
+import logging
+import os
+
+import pyarrow as pa
+import pyarrow.csv
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+
+from code_review_backend.issues.models import (
+    Diff,
+    Issue,
+    IssueLink,
+    IssueMessage,
+    KnownIssue,
+    Repository,
+    Revision,
+)
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+
+# Tables sorted so that rows are always imported after the rows they reference
+MODELS = (Repository, Revision, Diff, IssueMessage, Issue, IssueLink, KnownIssue)
+
+ARROW_TYPES = {
+    "AutoField": pa.int64(),
+    "BigAutoField": pa.int64(),
+    "BooleanField": pa.bool_(),
+    "CharField": pa.string(),
+    "DateTimeField": pa.timestamp("us", tz="UTC"),
+    "IntegerField": pa.int64(),
+    "PositiveIntegerField": pa.int64(),
+    "SlugField": pa.string(),
+    "TextField": pa.string(),
+    "URLField": pa.string(),
+    "UUIDField": pa.string(),
+}
+
+
+def get_fields(model):
+    """
+    Fields of a model table holding data, as generated columns are computed by the database
+    """
+    return [field for field in model._meta.concrete_fields if not field.generated]
+
+
+def get_schema(model):
+    """
+    Arrow schema of a model table, using the database column names
+    """
+    fields = []
+    for field in get_fields(model):
+        target = field.target_field if field.is_relation else field
+        fields.append(
+            pa.field(field.column, ARROW_TYPES[target.get_internal_type()], field.null)
+        )
+    return pa.schema(fields)
+
+
+def current_migration():
+    """
+    Name of the latest migration of the issues application, identifying the tables layout
+    """
+    (_, name) = MigrationLoader(None, ignore_no_migrations=True).graph.leaf_nodes(
+        "issues"
+    )[0]
+    return name
+
+
+def build_batch(schema, rows):
+    columns = list(zip(*rows))
+    arrays = []
+    for field, values in zip(schema, columns):
+        if field.type == pa.string():
+            # UUIDs are exported in their canonical text form
+            values = [None if v is None else str(v) for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def iter_chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(itertools.islice(rows, size)):
+        yield chunk
+
+
+def export_table(model, directory, rows_per_file):
+    """
+    Write all rows of a model table in Parquet part files, returning their names
+    and the number of exported rows.
+    A new part file is started once the current one holds at least rows_per_file rows.
+    """
+    schema = get_schema(model)
+    os.makedirs(os.path.join(directory, model._meta.db_table), exist_ok=True)
+    rows = (
+        model.objects.order_by("pk")
+        .values_list(*[field.attname for field in get_fields(model)])
+        .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    )
+
+    files, total = [], 0
+    writer, written = None, 0
+    for chunk in iter_chunks(rows, settings.EXPORT_CHUNK_SIZE):
+        if writer is None:
+            name = os.path.join(model._meta.db_table, f"part-{len(files):05}.parquet")
+            writer = pq.ParquetWriter(os.path.join(directory, name), schema)
+            files.append(name)
+        writer.write_batch(build_batch(schema, chunk))
+        total += len(chunk)
+        written += len(chunk)
+        if written >= rows_per_file:
+            writer.close()
+            writer, written = None, 0
+    if writer is not None:
+        writer.close()
+
+    return files, total
+
+
+def export_tables(directory, rows_per_file):
+    """
+    Export all the issues tables in a directory, along with their manifest
+    """
+    manifest = {"migration": current_migration(), "tables": {}}
+    for model in MODELS:
+        files, total = export_table(model, directory, rows_per_file)
+        manifest["tables"][model._meta.db_table] = {"files": files, "rows": total}
+        logger.info(f"Exported {total} rows from {model._meta.db_table}.")
+
+    with open(os.path.join(directory, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_manifest(directory):
+    with open(os.path.join(directory, MANIFEST)) as f:
+        return json.load(f)
+
+
+def copy_batch(cursor, model, batch):
+    """
+    Load a batch of rows with a single COPY statement on PostgreSQL
+    """
+    buffer = io.BytesIO()
+    pyarrow.csv.write_csv(
+        pa.Table.from_batches([batch]),
+        buffer,
+        # Only nulls are written unquoted, so they are not mixed up with empty strings
+        pyarrow.csv.WriteOptions(include_header=False, quoting_style="all_valid"),
+    )
+    buffer.seek(0)
+    columns = ", ".join(connection.ops.quote_name(name) for name in batch.schema.names)
+    cursor.copy_expert(
+        f"COPY {model._meta.db_table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer
+    )
+
+
+def insert_batch(cursor, model, batch):
+    """
+    Load a batch of rows with prepared INSERT statements on other database vendors
+    """
+    fields = {field.column: field for field in get_fields(model)}
+    fields = [fields[name] for name in batch.schema.names]
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    cursor.executemany(
+        f"INSERT INTO {model._meta.db_table} ({columns}) VALUES ({placeholders})",
+        [
+            [field.get_db_prep_value(row[field.column], connection) for field in fields]
+            for row in batch.to_pylist()
+        ],
+    )
+
+
+def import_table(model, directory, files):
+    """
+    Load the Parquet part files of a model table, returning the number of imported rows
+    """
+    load = copy_batch if connection.vendor == "postgresql" else insert_batch
+    total = 0
+    with connection.cursor() as cursor:
+        for name in files:
+            parquet = pq.ParquetFile(os.path.join(directory, name))
+            for batch in parquet.iter_batches(batch_size=settings.EXPORT_CHUNK_SIZE):
+                load(cursor, model, batch)
+                total += batch.num_rows
+
+        # Identifiers have been imported, so the next ones must be generated after them
+        for query in connection.ops.sequence_reset_sql(no_style(), [model]):
+            cursor.execute(query)
+    return total
+
+
+def import_tables(directory, manifest):
+    for model in MODELS:
+        table = manifest["tables"][model._meta.db_table]
+        total = import_table(model, directory, table["files"])
+        logger.info(f"Imported {total} rows in {model._meta.db_table}.")
@@ -1,6 +1,8 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from django.db.models import Count, Q
+
 from code_review_backend.issues.models import Diff, IssueLink
 
 
@@ -17,3 +19,29 @@ def detect_new_for_revision(diff: Diff, path: str, hash: str) -> bool:
         issue__path=path,
         issue__hash=hash,
     ).exists()
+
+
+def compare_diffs(diff: Diff, previous_diff: Diff) -> dict:
+    """
+    Compare the issues of a diff to the ones of a previous diff, using a single query
+    Returns the sets of hashes of unresolved issues (present on both diffs), closed
+    issues (only present on the previous diff) and new issues (only present on the diff)
+    """
+    rows = (
+        IssueLink.objects.filter(diff_id__in=(diff.id, previous_diff.id))
+        .values_list("issue__hash")
+        .annotate(
+            current=Count("id", filter=Q(diff_id=diff.id)),
+            previous=Count("id", filter=Q(diff_id=previous_diff.id)),
+        )
+        .order_by()
+    )
+    comparison = {"unresolved": set(), "closed": set(), "new": set()}
+    for hash, current, previous in rows:
+        if current and previous:
+            comparison["unresolved"].add(hash)
+        elif previous:
+            comparison["closed"].add(hash)
+        else:
+            comparison["new"].add(hash)
+    return comparison
@@ -0,0 +1,299 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Synthetic datasets, used to measure how the cost of endpoints grows with the data.
+"""
+
+import hashlib
+import itertools
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.utils import timezone
+
+from code_review_backend.issues.models import (
+    LEVEL_ERROR,
+    LEVEL_WARNING,
+    Diff,
+    Issue,
+    IssueLink,
+    IssueMessage,
+    Repository,
+    Revision,
+)
+
+ANALYZERS = ("clang-tidy", "mozlint", "infer")
+CHECKS = ("check-a", "check-b", "check-c", "check-d", "check-e")
+
+# Directory names used to build the synthetic source tree
+DIRECTORIES = (
+    "dom",
+    "gfx",
+    "js",
+    "layout",
+    "netwerk",
+    "toolkit",
+    "widget",
+    "media",
+    "src",
+    "base",
+    "components",
+    "tests",
+)
+EXTENSIONS = (".cpp", ".h", ".js", ".py", ".rs")
+
+
+@dataclass
+class Dataset:
+    repository: Repository
+    revisions: list
+    diffs: list
+    issues: list
+
+
+def issue_hash(*parts):
+    return hashlib.md5(":".join(map(str, parts)).encode()).hexdigest()
+
+
+def seed(size, slug="dataset"):
+    """
+    Create a repository with `size` revisions, each having a single diff with
+    `size` issues. Half of the issues of a diff are shared with the other diffs.
+    """
+    repository = Repository.objects.create(
+        slug=slug, url=f"https://hg.mozilla.org/{slug}"
+    )
+    # Phabricator identifiers are left empty, as they are unique across repositories
+    revisions = Revision.objects.bulk_create(
+        Revision(
+            title=f"Revision {index}",
+            bugzilla_id=index,
+            base_repository=repository,
+            head_repository=repository,
+            head_changeset=issue_hash(slug, "changeset", index)[:40],
+        )
+        for index in range(size)
+    )
+    diffs = Diff.objects.bulk_create(
+        Diff(
+            revision=revision,
+            repository=repository,
+            provider_id=f"PHID-DIFF-{slug}-{index}",
+            review_task_id=f"task-{slug}-{index}",
+            mercurial_hash=issue_hash(slug, "diff", index)[:40],
+        )
+        for index, revision in enumerate(revisions)
+    )
+
+    messages = IssueMessage.objects.resolve(
+        f"Message {index % 10}" for index in range(size)
+    )
+    issues = {}
+    links = []
+    for index, (revision, diff) in enumerate(zip(revisions, diffs)):
+        for position in range(size):
+            # Issues in the first half are found on every diff
+            key = position if position < size // 2 else (index, position)
+            if key not in issues:
+                issues[key] = Issue(
+                    hash=issue_hash(slug, key),
+                    path=f"dir-{position % 4}/sub-{position % 3}/file-{position}.cpp",
+                    level=LEVEL_ERROR if position % 3 == 0 else LEVEL_WARNING,
+                    analyzer=ANALYZERS[position % len(ANALYZERS)],
+                    analyzer_check=CHECKS[position % len(CHECKS)],
+                    message_id=messages[f"Message {position % 10}"],
+                )
+            links.append(
+                IssueLink(
+                    issue=issues[key],
+                    revision=revision,
+                    diff=diff,
+                    revision_created=revision.created,
+                    in_patch=position % 2 == 0,
+                    new_for_revision=position % 4 == 0,
+                    line=position + 1,
+                )
+            )
+    issues = Issue.objects.bulk_create(issues.values())
+    IssueLink.objects.bulk_create(links, batch_size=1000)
+
+    return Dataset(repository, revisions, diffs, issues)
+
+
+def zipf_weights(count):
+    """
+    Cumulated weights of a Zipf distribution: a few values are picked much more often
+    than others, as a few analyzers, checks and files account for most of the issues
+    """
+    return list(itertools.accumulate(1 / rank for rank in range(1, count + 1)))
+
+
+class Generator:
+    """
+    Create a large synthetic history of revisions on a repository, in batches.
+
+    Each revision has between `min_diffs` and `max_diffs` diffs, created over the
+    last `days` days. The number of issues per diff follows an exponential
+    distribution averaging `issues_per_diff`, on `analyzers` analyzers having
+    `checks` checks each, and `files` files of a source tree up to `depth`
+    directories deep. A share `recurring` of the issues of a diff are not new,
+    being found again across revisions (e.g. issues already on the repository).
+    """
+
+    def __init__(
+        self,
+        slug="synthetic",
+        revisions=1000,
+        min_diffs=1,
+        max_diffs=3,
+        issues_per_diff=20,
+        analyzers=8,
+        checks=20,
+        files=2000,
+        depth=4,
+        recurring=0.6,
+        days=60,
+        seed=0,
+        batch_size=500,
+    ):
+        self.slug = slug
+        self.revisions = revisions
+        self.min_diffs = min_diffs
+        self.max_diffs = max(min_diffs, max_diffs)
+        self.issues_per_diff = issues_per_diff
+        self.recurring = recurring
+        self.days = days
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+
+        self.analyzers = [f"analyzer-{index}" for index in range(analyzers)]
+        self.analyzer_weights = zipf_weights(analyzers)
+        self.checks = [f"check-{index}" for index in range(checks)]
+        self.check_weights = zipf_weights(checks)
+        self.files = [self.build_path(depth) for _ in range(files)]
+        self.file_weights = zipf_weights(files)
+
+        # Recurring issues, created the first time they are found
+        self.recurring_issues = {}
+        self.new_issues = 0
+
+    def build_path(self, depth):
+        directories = self.random.choices(DIRECTORIES, k=self.random.randint(1, depth))
+        name = f"file{self.random.randrange(10**6)}{self.random.choice(EXTENSIONS)}"
+        return "/".join([*directories, name])
+
+    def build_issue(self, key):
+        analyzer = self.random.choices(
+            self.analyzers, cum_weights=self.analyzer_weights
+        )[0]
+        check = self.random.choices(self.checks, cum_weights=self.check_weights)[0]
+        return Issue(
+            hash=issue_hash(self.slug, key),
+            path=self.random.choices(self.files, cum_weights=self.file_weights)[0],
+            # Errors are much less frequent than warnings
+            level=LEVEL_ERROR if self.random.random() < 0.1 else LEVEL_WARNING,
+            analyzer=analyzer,
+            analyzer_check=check,
+            message_id=self.messages[f"{analyzer} {check}"],
+        )
+
+    def generate(self):
+        """
+        Create the repository and its revisions, returning the number of created rows
+        """
+        repository = Repository.objects.create(
+            slug=self.slug, url=f"https://hg.mozilla.org/{self.slug}"
+        )
+        self.messages = IssueMessage.objects.resolve(
+            f"{analyzer} {check}"
+            for analyzer in self.analyzers
+            for check in self.checks
+        )
+        counts = {"Revision": 0, "Diff": 0, "Issue": 0, "IssueLink": 0}
+        for start in range(0, self.revisions, self.batch_size):
+            indexes = range(start, min(start + self.batch_size, self.revisions))
+            for model, count in self.generate_batch(repository, indexes).items():
+                counts[model] += count
+        return counts
+
+    def generate_batch(self, repository, indexes):
+        now = timezone.now()
+        revisions = Revision.objects.bulk_create(
+            Revision(
+                title=f"Synthetic revision {index}",
+                bugzilla_id=index,
+                base_repository=repository,
+                head_repository=repository,
+                head_changeset=issue_hash(self.slug, "changeset", index)[:40],
+            )
+            for index in indexes
+        )
+        # Revisions are spread over the period, the most recent ones last
+        for index, revision in zip(indexes, revisions):
+            revision.created = now - timedelta(
+                days=self.days * (1 - index / self.revisions)
+            )
+        Revision.objects.bulk_update(revisions, ["created"])
+
+        diffs = []
+        for index, revision in zip(indexes, revisions):
+            for position in range(self.random.randint(self.min_diffs, self.max_diffs)):
+                diffs.append(
+                    Diff(
+                        revision=revision,
+                        repository=repository,
+                        provider_id=f"PHID-DIFF-{self.slug}-{index}-{position}",
+                        review_task_id=issue_hash(self.slug, "task", index, position)[
+                            :30
+                        ],
+                        mercurial_hash=issue_hash(self.slug, "diff", index, position)[
+                            :40
+                        ],
+                    )
+                )
+        diffs = Diff.objects.bulk_create(diffs)
+        for diff in diffs:
+            diff.created = diff.revision.created
+        Diff.objects.bulk_update(diffs, ["created"])
+
+        issues, links = [], []
+        for diff in diffs:
+            keys = set()
+            for _ in range(int(self.random.expovariate(1 / self.issues_per_diff))):
+                if self.random.random() < self.recurring:
+                    key = self.random.randrange(self.revisions)
+                    if key not in self.recurring_issues:
+                        self.recurring_issues[key] = self.build_issue(key)
+                        issues.append(self.recurring_issues[key])
+                    issue = self.recurring_issues[key]
+                else:
+                    self.new_issues += 1
+                    issue = self.build_issue(("new", self.new_issues))
+                    issues.append(issue)
+                # An issue is only linked once to a diff
+                if issue.hash in keys:
+                    continue
+                keys.add(issue.hash)
+                links.append(
+                    IssueLink(
+                        issue=issue,
+                        revision=diff.revision,
+                        diff=diff,
+                        revision_created=diff.revision.created,
+                        in_patch=self.random.random() < 0.3,
+                        new_for_revision=self.random.random() < 0.2,
+                        line=self.random.randint(1, 2000),
+                    )
+                )
+        Issue.objects.bulk_create(issues, batch_size=self.batch_size)
+        IssueLink.objects.bulk_create(links, batch_size=self.batch_size)
+
+        return {
+            "Revision": len(revisions),
+            "Diff": len(diffs),
+            "Issue": len(issues),
+            "IssueLink": len(links),
+        }
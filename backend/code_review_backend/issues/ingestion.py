@@ -0,0 +1,194 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Creation of the issues sent in bulk for a revision, either directly by the bulk
+endpoint, or asynchronously by merging several queued requests in one transaction.
+"""
+
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from code_review_backend.issues import cache
+from code_review_backend.issues.models import (
+    BULK_DONE,
+    BULK_FAILED,
+    BULK_PENDING,
+    LEVEL_ERROR,
+    Issue,
+    IssueBulkRequest,
+    IssueLink,
+    IssueMessage,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@transaction.atomic
+def ingest(batches):
+    """
+    Create the issues & links of several batches at once, each batch being a tuple of
+    (revision, diff, validated issues). Issues shared between batches are only created once.
+    Returns for each batch the created issues, with the attributes of their links.
+    """
+    batches_links = []
+    new_issues = {}
+    for _, _, issues in batches:
+        # Separate attributes that are specific to the IssueLink M2M
+        link_attrs = defaultdict(list)
+        for issue in issues:
+            link_attrs[issue["hash"]].append(
+                {
+                    "new_for_revision": issue.pop(
+                        "issue_links__new_for_revision", None
+                    ),
+                    "in_patch": issue.pop("issue_links__in_patch", None),
+                    "line": issue.pop("issue_links__line", None),
+                    "nb_lines": issue.pop("issue_links__nb_lines", None),
+                    "char": issue.pop("issue_links__path", None),
+                }
+            )
+            new_issues.setdefault(issue["hash"], issue)
+        batches_links.append(link_attrs)
+
+    # Only create issues that do not exist yet, sharing their messages
+    messages = IssueMessage.objects.resolve(
+        issue.get("message_text") for issue in new_issues.values()
+    )
+    Issue.objects.bulk_create(
+        [
+            Issue(message_id=messages.get(values.pop("message_text", None)), **values)
+            for values in new_issues.values()
+        ],
+        ignore_conflicts=True,
+    )
+
+    # Retrieve issues to get existing IDs
+    hashes = set(new_issues.keys())
+    known_issues = {
+        i.hash: i
+        for i in Issue.objects.filter(hash__in=hashes).annotate(
+            message_text=F("message__text")
+        )
+    }
+
+    assert set(known_issues.keys()) == hashes, "Failed to create all issues"
+
+    # Create all links, using DB conflicts
+    IssueLink.objects.bulk_create(
+        [
+            IssueLink(
+                issue_id=known_issues[issue_hash].id,
+                diff=diff,
+                revision=revision,
+                revision_created=revision.created,
+                **link,
+            )
+            for (revision, diff, _), link_attrs in zip(batches, batches_links)
+            for issue_hash, links in link_attrs.items()
+            for link in links
+        ],
+        ignore_conflicts=True,
+    )
+
+    # Endpoint expects Issue with specific attributes for re-serialization of links
+    # TODO in treeherder: only expose hash & publishable in output
+    outputs = []
+    scopes = {cache.DIFFS, cache.STATS}
+    for (revision, diff, _), link_attrs in zip(batches, batches_links):
+        output = []
+        for issue_hash, links in link_attrs.items():
+            for link in links:
+                existing_issue = known_issues[issue_hash]
+
+                # Set attributes for re-serialization
+                output_link = {f"issue_links__{k}": v for k, v in link.items()}
+                output_link.update(vars(existing_issue))
+                output_link["publishable"] = (
+                    link["in_patch"] or existing_issue.level == LEVEL_ERROR
+                )
+
+                output.append(output_link)
+        outputs.append(output)
+
+        scopes.update(
+            {
+                cache.revision_scope(revision.id),
+                cache.repository_scope(revision.head_repository.slug),
+                *(cache.analyzer_scope(issue["analyzer"]) for issue in output),
+                *([cache.diff_scope(diff.provider_id)] if diff else []),
+            }
+        )
+
+    # Expire the cached responses listing these issues
+    cache.invalidate(*scopes)
+
+    return outputs
+
+
+def process_requests(requests):
+    """
+    Ingest queued requests in a single transaction, storing their results.
+    When the merged ingestion fails, requests are retried one by one so that
+    only the invalid ones are marked as failed.
+    """
+    # Avoid a circular import, serializers relying on the ingestion
+    from code_review_backend.issues.serializers import SingleIssueBulkSerializer
+
+    valid, batches = [], []
+    for request in requests:
+        serializer = SingleIssueBulkSerializer(data=request.payload, many=True)
+        if serializer.is_valid():
+            valid.append(request)
+            batches.append((request.revision, request.diff, serializer.validated_data))
+        else:
+            request.status = BULK_FAILED
+            request.error = str(serializer.errors)
+            request.save(update_fields=["status", "error", "updated"])
+
+    if not batches:
+        return
+
+    try:
+        with transaction.atomic():
+            outputs = ingest(batches)
+    except Exception as e:
+        if len(valid) <= 1:
+            for request in valid:
+                logger.error(f"Failed to ingest request {request.id}: {e}")
+                request.status = BULK_FAILED
+                request.error = str(e)
+                request.save(update_fields=["status", "error", "updated"])
+            return
+        for request in valid:
+            process_requests([request])
+        return
+
+    for request, output in zip(valid, outputs):
+        request.status = BULK_DONE
+        request.result = SingleIssueBulkSerializer(output, many=True).data
+        # The payload is not needed anymore
+        request.payload = []
+        request.save(update_fields=["status", "result", "payload", "updated"])
+
+
+@transaction.atomic
+def process_queue(batch_size):
+    """
+    Ingest the oldest pending requests, up to batch_size requests.
+    Rows are locked (skipping those already locked) so several workers can run
+    concurrently. Returns the number of processed requests.
+    """
+    requests = list(
+        IssueBulkRequest.objects.filter(status=BULK_PENDING)
+        .select_related("revision__head_repository", "diff")
+        .select_for_update(skip_locked=True, of=("self",))
+        .order_by("id")[:batch_size]
+    )
+    if requests:
+        process_requests(requests)
+    return len(requests)
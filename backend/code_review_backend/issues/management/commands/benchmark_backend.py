@@ -0,0 +1,286 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import hashlib
+import io
+import json
+import logging
+import statistics
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from code_review_backend.issues.datasets import Generator
+from code_review_backend.issues.models import Diff, Issue, IssueLink, Revision
+
+logger = logging.getLogger(__name__)
+
+REPORT_VERSION = 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the public endpoints, the bulk creation of issues and the cleanup "
+        "of old issues on synthetic datasets of several sizes, and write the results "
+        "in a JSON report that can be compared with a previous run. "
+        "Data is created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scales",
+            help="Comma separated numbers of revisions of the datasets",
+            default="100,1000",
+        )
+        parser.add_argument(
+            "--issues-per-diff",
+            type=int,
+            help="Average number of issues found on a diff",
+            default=20,
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            help="Number of times each request is made",
+            default=3,
+        )
+        parser.add_argument(
+            "--seed", type=int, help="Seed of the random generator", default=0
+        )
+        parser.add_argument(
+            "--output", help="Path of the JSON report", default="benchmark.json"
+        )
+        parser.add_argument(
+            "--baseline",
+            help="Path of the JSON report of a previous run, to compare durations",
+        )
+
+    def handle(self, *args, **options):
+        scales = [int(scale) for scale in options["scales"].split(",")]
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+
+        report = {
+            "version": REPORT_VERSION,
+            "created": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "django": django.get_version(),
+            "options": {
+                key: options[key] for key in ("issues_per_diff", "repeat", "seed")
+            },
+            "scales": {},
+        }
+        for scale in scales:
+            with transaction.atomic():
+                report["scales"][str(scale)] = self.benchmark(scale, options)
+                transaction.set_rollback(True)
+            # Responses cached on the rolled back data must not be served anymore
+            cache.clear()
+
+        with open(options["output"], "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Report written to {options['output']}.")
+
+        if baseline is not None:
+            self.compare(baseline, report)
+
+    def benchmark(self, scale, options):
+        slug = f"benchmark-{scale}"
+        start = time.perf_counter()
+        counts = Generator(
+            slug=slug,
+            revisions=scale,
+            issues_per_diff=options["issues_per_diff"],
+            seed=options["seed"],
+        ).generate()
+        generation = time.perf_counter() - start
+        logger.info(
+            f"{scale} revisions - generated "
+            + ", ".join(f"{count} {model}" for model, count in counts.items())
+            + f" in {generation:.1f}s."
+        )
+
+        self.client = Client()
+        self.client.force_login(User.objects.get_or_create(username="benchmark")[0])
+
+        results = {"rows": counts, "generation_s": round(generation, 3)}
+        results["endpoints"] = {
+            name: self.measure(scale, name, method, path, params, options["repeat"])
+            for name, (method, path, params) in self.build_requests(slug).items()
+        }
+        results["cleanup"] = self.measure_cleanup(scale)
+        return results
+
+    def build_requests(self, slug):
+        """
+        Requests made on each dataset, by name: the listings use the most recent
+        revision and diffs, and the most frequent analyzer check
+        """
+        revision = Revision.objects.filter(head_repository__slug=slug).latest("id")
+        diffs = list(revision.diffs.order_by("id"))
+        previous_diff = diffs[0]
+        diff = diffs[-1]
+        link = (
+            IssueLink.objects.filter(revision__head_repository__slug=slug)
+            .values("issue__analyzer", "issue__analyzer_check")
+            .annotate(total=Count("id"))
+            .order_by("-total")
+            .first()
+        )
+        analyzer, check = link["issue__analyzer"], link["issue__analyzer_check"]
+        directory = (
+            Issue.objects.filter(issue_links__revision=revision)
+            .values_list("path", flat=True)
+            .first()
+            or ""
+        ).partition("/")[0]
+
+        issues = [
+            {
+                "hash": hashlib.md5(f"{slug}-bulk-{index}".encode()).hexdigest(),
+                "analyzer": analyzer,
+                "check": check,
+                "level": "warning",
+                "path": f"{directory}/bulk-{index % 50}.cpp",
+                "line": index,
+                "message": f"Benchmark message {index % 20}",
+                "in_patch": index % 2 == 0,
+                "new_for_revision": True,
+            }
+            for index in range(200)
+        ]
+        return {
+            "repository-list": ("get", "/v1/repository/", {}),
+            "revision-detail": ("get", f"/v1/revision/{revision.id}/", {}),
+            "revision-details": (
+                "get",
+                f"/v1/revision/{revision.id}/details/",
+                {"issues": "true"},
+            ),
+            "revision-diffs-list": ("get", f"/v1/revision/{revision.id}/diffs/", {}),
+            "diffs-list": ("get", "/v1/diff/", {}),
+            "diffs-list-repository": ("get", "/v1/diff/", {"repository": slug}),
+            "diffs-list-search": ("get", "/v1/diff/", {"search": "synthetic"}),
+            "diffs-list-publishable": ("get", "/v1/diff/", {"issues": "publishable"}),
+            "diffs-keyset": ("get", "/v1/diff/", {"page_size": 100}),
+            "issues-list": ("get", f"/v1/diff/{diff.provider_id}/issues/", {}),
+            "diff-comparison": (
+                "get",
+                f"/v1/diff/{diff.provider_id}/compare/{previous_diff.provider_id}/",
+                {},
+            ),
+            "issue-checks-stats": ("get", "/v1/check/stats/", {}),
+            "issue-checks-stats-compact": ("get", "/v1/check/stats/compact/", {}),
+            "issue-checks-history": ("get", "/v1/check/history/", {}),
+            "issue-check-details": (
+                "get",
+                f"/v1/check/{slug}/{analyzer}/{check}/",
+                {"publishable": "all"},
+            ),
+            "repository-issues": ("get", f"/v1/issues/{slug}/", {}),
+            "repository-issues-export": ("get", f"/v1/issues/{slug}/export/", {}),
+            "revision-known-issues": (
+                "post",
+                f"/v1/revision/{revision.id}/known-issues/",
+                {},
+            ),
+            "repository-known-issues": (
+                "get",
+                f"/v1/issues/{slug}/known/",
+                {"path": diff.issues.values_list("path", flat=True).first()},
+            ),
+            "repository-directories": (
+                "get",
+                f"/v1/issues/{slug}/directories/",
+                {"path": directory},
+            ),
+            "revision-issues-bulk": (
+                "post",
+                f"/v1/revision/{revision.id}/issues/",
+                {"diff_provider_id": diff.provider_id, "issues": issues},
+            ),
+        }
+
+    def measure(self, scale, name, method, path, params, repeat):
+        durations = []
+        for _ in range(repeat):
+            # Measure the cost of building responses, not of the cache
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                if method == "post":
+                    response = self.client.post(
+                        path, params, content_type="application/json"
+                    )
+                else:
+                    response = self.client.get(path, params)
+                size = (
+                    sum(len(chunk) for chunk in response.streaming_content)
+                    if response.streaming
+                    else len(response.content)
+                )
+                durations.append(time.perf_counter() - start)
+
+        result = {
+            "method": method.upper(),
+            "path": path,
+            "status": response.status_code,
+            "median_ms": round(statistics.median(durations) * 1000, 2),
+            "min_ms": round(min(durations) * 1000, 2),
+            "max_ms": round(max(durations) * 1000, 2),
+            "queries": len(queries),
+            "size": size,
+        }
+        logger.info(
+            f"{scale} revisions - {name}: {result['median_ms']:.1f}ms, "
+            f"{result['queries']} queries, {size} bytes ({response.status_code})."
+        )
+        return result
+
+    def measure_cleanup(self, scale):
+        """
+        Remove the older half of the dataset, which is generated over 60 days.
+        Older revisions of the other repositories in the database are removed too.
+        """
+        revisions = Revision.objects.count()
+        start = time.perf_counter()
+        call_command("cleanup_issues", nb_days=30, sleep=0, stdout=io.StringIO())
+        duration = time.perf_counter() - start
+        deleted = revisions - Revision.objects.count()
+        logger.info(
+            f"{scale} revisions - cleanup: deleted {deleted} revisions "
+            f"in {duration:.2f}s."
+        )
+        return {
+            "seconds": round(duration, 3),
+            "revisions": deleted,
+            "diffs_left": Diff.objects.count(),
+        }
+
+    def compare(self, baseline, report):
+        for scale, results in report["scales"].items():
+            previous = baseline["scales"].get(scale)
+            if previous is None:
+                continue
+            for name, result in results["endpoints"].items():
+                before = previous["endpoints"].get(name)
+                if before is None or not before["median_ms"]:
+                    continue
+                ratio = result["median_ms"] / before["median_ms"]
+                logger.info(
+                    f"{scale} revisions - {name}: {before['median_ms']:.1f}ms -> "
+                    f"{result['median_ms']:.1f}ms ({ratio:.2f}x), "
+                    f"{before['queries']} -> {result['queries']} queries."
+                )
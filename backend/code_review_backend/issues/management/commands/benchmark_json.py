@@ -0,0 +1,152 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import contextlib
+import hashlib
+import io
+import logging
+import statistics
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.urls import resolve
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from code_review_backend.issues.models import Repository
+from code_review_backend.issues.parsers import ORJSONParser
+from code_review_backend.issues.renderers import ORJSONRenderer
+
+logger = logging.getLogger(__name__)
+
+IMPLEMENTATIONS = {
+    "json": (JSONRenderer, JSONParser),
+    "orjson": (ORJSONRenderer, ORJSONParser),
+}
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the share of JSON rendering and parsing in the time spent by the "
+        "bulk creation and list endpoints, using the standard library and orjson. "
+        "Data is created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--issues",
+            type=int,
+            help="Number of issues sent and listed in each request",
+            default=1000,
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            help="Number of requests made for each endpoint and implementation",
+            default=5,
+        )
+
+    def handle(self, *args, **options):
+        self.factory = APIRequestFactory()
+        self.user = User(username="benchmark")
+
+        with transaction.atomic():
+            repo = Repository.objects.create(
+                slug="benchmark-json", url="https://benchmark.test/json"
+            )
+            self.revision = repo.head_revisions.create(
+                title="Benchmark", base_repository=repo
+            )
+            for name, (renderer, parser) in IMPLEMENTATIONS.items():
+                with self.use_implementation(renderer, parser):
+                    self.benchmark(name, renderer(), parser(), options)
+            transaction.set_rollback(True)
+
+    def use_implementation(self, renderer, parser):
+        """
+        Views read the REST framework settings when they are imported, so their
+        renderer and parser classes are patched instead
+        """
+        stack = contextlib.ExitStack()
+        for path in (
+            f"/v1/revision/{self.revision.id}/issues/",
+            "/v1/diff/PHID-DIFF-benchmark/issues/",
+        ):
+            view = resolve(path).func.cls
+            stack.enter_context(mock.patch.object(view, "renderer_classes", [renderer]))
+            stack.enter_context(mock.patch.object(view, "parser_classes", [parser]))
+        return stack
+
+    def call(self, request, renderer):
+        match = resolve(request.path)
+        response = match.func(request, *match.args, **match.kwargs)
+        response.render()
+        if type(response.accepted_renderer) is not type(renderer):
+            raise CommandError(
+                f"{request.path} was rendered by {response.accepted_renderer}"
+            )
+        return response
+
+    def benchmark(self, name, renderer, parser, options):
+        timings = {"bulk": [], "list": []}
+        for run in range(options["repeat"]):
+            diff = self.revision.diffs.create(
+                provider_id=f"PHID-DIFF-{name}-{run}",
+                review_task_id=f"benchmark-{name}-{run}",
+                mercurial_hash="0" * 40,
+                repository=self.revision.head_repository,
+            )
+            payload = {
+                "diff_provider_id": diff.provider_id,
+                "issues": [
+                    {
+                        "hash": hashlib.md5(f"{name}-{run}-{i}".encode()).hexdigest(),
+                        "analyzer": "benchmark",
+                        "check": f"check-{i % 10}",
+                        "level": "warning",
+                        "path": f"dom/benchmark/file-{i % 100}.cpp",
+                        "line": i,
+                        "message": f"Benchmark message {i % 50}",
+                        "in_patch": bool(i % 2),
+                        "new_for_revision": True,
+                    }
+                    for i in range(options["issues"])
+                ],
+            }
+            request = self.factory.post(
+                f"/v1/revision/{self.revision.id}/issues/", payload, format="json"
+            )
+            force_authenticate(request, user=self.user)
+            body = request.body
+            _, total = timed(self.call, request, renderer)
+            _, parse = timed(parser.parse, io.BytesIO(body))
+            timings["bulk"].append((total, parse))
+
+            # A distinct query string skips the response cache
+            request = self.factory.get(
+                f"/v1/diff/{diff.provider_id}/issues/",
+                {"limit": options["issues"], "run": run},
+            )
+            response, total = timed(self.call, request, renderer)
+            _, render = timed(renderer.render, response.data, "application/json")
+            timings["list"].append((total, render))
+
+        for endpoint, values in timings.items():
+            total = statistics.median(t for t, _ in values)
+            serialization = statistics.median(s for _, s in values)
+            step = "parsing" if endpoint == "bulk" else "rendering"
+            logger.info(
+                f"{name} - {endpoint}: {total * 1000:.1f}ms per request, "
+                f"{step} {serialization * 1000:.1f}ms ({serialization / total:.1%})."
+            )
@@ -3,25 +3,32 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import logging
-import math
+import time
+import uuid
 from collections import defaultdict
 from datetime import timedelta
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
 
+from code_review_backend.issues import cache, partitions
 from code_review_backend.issues.models import (
+    CleanupCheckpoint,
     Diff,
+    DirectoryStats,
     Issue,
+    IssueBulkRequest,
     IssueLink,
+    IssueMessage,
+    KnownIssue,
     Repository,
     Revision,
 )
 
 logger = logging.getLogger(__name__)
 
-DEL_CHUNK_SIZE = 500
-
 
 class Command(BaseCommand):
     help = "Cleanup old issues from all repositories"
@@ -33,6 +40,40 @@ class Command(BaseCommand):
             help="Number of days the issues are old to select them for cleaning, defaults to 30 days (1 month)",
             default=30,
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Number of revisions deleted by the first batch, defaults to 500",
+            default=500,
+        )
+        parser.add_argument(
+            "--max-batch-size",
+            type=int,
+            help="Maximum number of revisions deleted by a batch, defaults to 5000",
+            default=5000,
+        )
+        parser.add_argument(
+            "--batch-time",
+            type=float,
+            help="Time budget of a batch in seconds, used to adapt the batch size, defaults to 1s",
+            default=1.0,
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            help="Pause between two batches in seconds, defaults to 0.5s",
+            default=0.5,
+        )
+        parser.add_argument(
+            "--max-duration",
+            type=float,
+            help="Stop after that number of seconds, the next run resumes from the saved progress",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the progress saved by an interrupted run",
+        )
 
     def cleanup_repositories(self):
         unused_repositories = Repository.objects.filter(
@@ -44,64 +85,200 @@ class Command(BaseCommand):
         if delete_count:
             logger.info(f"Deleted {delete_count} unused Repository.")
 
+    def drop_partitions(self, checkpoint, clean_until):
+        """
+        With the partitioned layout, drop whole partitions of old issue links.
+        Their revisions are then deleted by batches like the others, and the issues
+        left without any link are looked up by walking all the issues.
+        """
+        if partitions.drop_partitions(clean_until) is None:
+            return
+
+        # Restart the walk, as issues already checked may not have any link anymore
+        checkpoint.last_issue_id = uuid.UUID(int=0)
+        checkpoint.save()
+        cache.invalidate(cache.ALL)
+
+    def resume_checkpoint(self, clean_until, restart=False):
+        """
+        Load the checkpoint of an interrupted run, or start a new one.
+        The new checkpoint is only saved once a batch has been deleted.
+        """
+        checkpoint = CleanupCheckpoint.objects.order_by("-updated").first()
+        if checkpoint is not None:
+            if not restart:
+                logger.info(
+                    f"Resuming cleanup until {checkpoint.clean_until} "
+                    f"from revision {checkpoint.last_revision_id}."
+                )
+                return checkpoint
+            checkpoint.delete()
+        return CleanupCheckpoint(clean_until=clean_until)
+
+    @transaction.atomic
+    def delete_batch(self, checkpoint, batch_size):
+        """
+        Delete the next batch of old revisions, walking their ids.
+        Returns the number of rows deleted per model.
+        """
+        # The revisions the known issues of each repository come from are kept
+        revisions = Revision.objects.filter(
+            created__lte=checkpoint.clean_until
+        ).exclude(id__in=KnownIssue.objects.revisions())
+        if checkpoint.last_revision_id is not None:
+            revisions = revisions.filter(id__gt=checkpoint.last_revision_id)
+        rev_ids = list(
+            revisions.order_by("id").values_list("id", flat=True)[:batch_size]
+        )
+        if not rev_ids:
+            return None
+
+        # Store IDs of related Issues and their messages, to make their deletion faster later on
+        issues_ids, messages_ids = set(), set()
+        for issue_id, message_id in Issue.objects.filter(
+            issue_links__revision_id__in=rev_ids
+        ).values_list("id", "message_id"):
+            issues_ids.add(issue_id)
+            if message_id is not None:
+                messages_ids.add(message_id)
+
+        stats = {}
+
+        # Perform raw deletions to avoid Django performing lookups to IssueLink
+        # as the M2M is cleaned up first.
+        # Queued bulk requests, outdated known issues and their stats are not counted
+        requests_qs = IssueBulkRequest.objects.filter(revision_id__in=rev_ids)
+        requests_qs._raw_delete(requests_qs.db)
+        known_qs = KnownIssue.objects.filter(revision_id__in=rev_ids)
+        known_qs._raw_delete(known_qs.db)
+        directories_qs = DirectoryStats.objects.filter(revision_id__in=rev_ids)
+        directories_qs._raw_delete(directories_qs.db)
+        links_qs = IssueLink.objects.filter(revision_id__in=rev_ids)
+        stats["IssueLink"] = links_qs._raw_delete(links_qs.db)
+        diffs_qs = Diff.objects.filter(revision_id__in=rev_ids)
+        stats["Diff"] = diffs_qs._raw_delete(diffs_qs.db)
+
+        # Only delete issues that are not linked to a revision anymore
+        issues_qs = Issue.objects.filter(id__in=issues_ids, issue_links=None)
+        stats["Issue"] = issues_qs._raw_delete(issues_qs.db)
+
+        # Only delete messages that are not used by another issue
+        messages_qs = IssueMessage.objects.filter(id__in=messages_ids, issues=None)
+        stats["IssueMessage"] = messages_qs._raw_delete(messages_qs.db)
+
+        revisions_qs = Revision.objects.filter(id__in=rev_ids)
+        stats["Revision"] = revisions_qs._raw_delete(revisions_qs.db)
+
+        # Save progress along with the deletion
+        checkpoint.last_revision_id = rev_ids[-1]
+        checkpoint.save()
+
+        return len(rev_ids), stats
+
+    @transaction.atomic
+    def delete_orphan_issues(self, checkpoint, batch_size):
+        """
+        Delete the issues left without any link by dropped partitions from the next
+        batch of issues, walking their ids.
+        Returns the number of checked issues and the number of rows deleted per model.
+        """
+        rows = list(
+            Issue.objects.filter(id__gt=checkpoint.last_issue_id)
+            .order_by("id")
+            .values_list("id", "message_id")[:batch_size]
+        )
+        if not rows:
+            return None
+        issues_ids = [issue_id for issue_id, _ in rows]
+        messages_ids = {message_id for _, message_id in rows if message_id is not None}
+
+        stats = {}
+        issues_qs = Issue.objects.filter(id__in=issues_ids, issue_links=None)
+        stats["Issue"] = issues_qs._raw_delete(issues_qs.db)
+        messages_qs = IssueMessage.objects.filter(id__in=messages_ids, issues=None)
+        stats["IssueMessage"] = messages_qs._raw_delete(messages_qs.db)
+
+        checkpoint.last_issue_id = issues_ids[-1]
+        checkpoint.save()
+
+        return len(issues_ids), stats
+
     def handle(self, *args, **options):
         self.cleanup_repositories()
 
         clean_until = timezone.now() - timedelta(days=options["nb_days"])
 
-        rev_to_delete = Revision.objects.filter(
-            created__lte=clean_until,
-        )
-        total_rev_count = rev_to_delete.count()
-
-        if not total_rev_count:
-            logger.info("Didn't find any old revision to delete.")
-            return
+        checkpoint = self.resume_checkpoint(clean_until, options["restart"])
 
-        logger.info(f"Retrieved {total_rev_count} old revisions to be deleted.")
+        if settings.ISSUE_LINKS_PARTITIONED:
+            self.drop_partitions(checkpoint, clean_until)
 
+        max_batch_size = max(options["batch_size"], options["max_batch_size"])
+        max_duration = options["max_duration"]
         stats = defaultdict(int)
+        start = time.monotonic()
+        batch = 0
+        completed = True
+        # Old revisions are deleted first, then issues left without links
+        steps = [("revisions", self.delete_batch)]
+        if checkpoint.last_issue_id is not None:
+            steps.append(("issues", self.delete_orphan_issues))
+        for name, delete_batch in steps:
+            batch_size = options["batch_size"]
+            while completed:
+                if (
+                    max_duration is not None
+                    and time.monotonic() - start >= max_duration
+                ):
+                    completed = False
+                    break
+                batch_start = time.monotonic()
+                result = delete_batch(checkpoint, batch_size)
+                if result is None:
+                    break
+                elapsed = max(time.monotonic() - batch_start, 0.001)
+                batch += 1
 
-        iterations = math.ceil(total_rev_count / DEL_CHUNK_SIZE)
-        for i, start in enumerate(range(0, total_rev_count, DEL_CHUNK_SIZE), start=1):
-            logger.info(f"Page {i}/{iterations}.")
-            # First fetch revisions IDs in a first DB request
-            chunk_rev_ids = rev_to_delete.order_by("id")[
-                start : start + DEL_CHUNK_SIZE
-            ].values_list("id", flat=True)
-
-            # Store IDs of related Issues, to make issues deletion faster later on
-            chunk_issues_ids = list(
-                Issue.objects.filter(
-                    issue_links__revision_id__in=chunk_rev_ids
-                ).values_list("id", flat=True)
-            )
+                nb, batch_stats = result
+                rows = sum(batch_stats.values())
+                for key, n in batch_stats.items():
+                    stats[key] += n
+                if rows:
+                    cache.invalidate(cache.ALL)
+                verb = "deleted" if name == "revisions" else "checked"
+                logger.info(
+                    f"Batch {batch}: {verb} {nb} {name}, "
+                    f"{rows} rows in {elapsed:.2f}s ({rows / elapsed:.0f} rows/s)."
+                )
+
+                # A partial batch means there is nothing left to delete
+                if nb < batch_size:
+                    break
+
+                # Adapt the batch size so that a batch takes around the time budget,
+                # without changing it too abruptly after an unusually fast or slow batch
+                ratio = min(max(options["batch_time"] / elapsed, 0.5), 2)
+                batch_size = min(max(int(batch_size * ratio), 1), max_batch_size)
 
-            # Delete IssueLink for this chunk
-            links_qs = IssueLink.objects.filter(revision_id__in=chunk_rev_ids)
-            links_count = links_qs._raw_delete(links_qs.db)
-            stats["IssueLink"] += links_count
-
-            # Perform a raw deletion to avoid Django performing lookups to IssueLink
-            # as the M2M has already be cleaned up at this stage.
-            diffs_qs = Diff.objects.filter(revision__id__in=chunk_rev_ids)
-            diffs_count = diffs_qs._raw_delete(diffs_qs.db)
-            stats["Diff"] += diffs_count
-
-            # Only delete issues that are not linked to a revision anymore
-            issues_qs = Issue.objects.filter(
-                id__in=chunk_issues_ids,
-                issue_links=None,
+                # Leave some room to other queries between batches
+                time.sleep(options["sleep"])
+
+        if not completed:
+            progress = f"revision {checkpoint.last_revision_id}"
+            if checkpoint.last_issue_id is not None:
+                progress += f" and issue {checkpoint.last_issue_id}"
+            logger.info(
+                f"Stopping after the maximum duration, progress is saved at {progress}."
             )
-            # Perform a raw deletion to avoid Django performing lookups to IssueLink
-            # as the M2M has already be cleaned up at this stage.
-            issues_count = issues_qs._raw_delete(issues_qs.db)
-            stats["Issue"] += issues_count
+        elif checkpoint.pk is not None:
+            checkpoint.delete()
 
-        # Drop the revisions with a raw deletion to avoid Django performing lookups to IssueLink
-        # as the M2M has already be cleaned up at this stage.
-        rev_count = rev_to_delete._raw_delete(rev_to_delete.db)
-        stats["Revision"] += rev_count
+        if not stats:
+            if completed:
+                logger.info("Didn't find any old revision to delete.")
+            return
 
+        elapsed = max(time.monotonic() - start, 0.001)
+        rows = sum(stats.values())
         msg = ", ".join((f"{n} {key}" for key, n in stats.items()))
-        logger.info(f"Deleted {msg}.")
+        logger.info(f"Deleted {msg} in {elapsed:.2f}s ({rows / elapsed:.0f} rows/s).")
@@ -0,0 +1,48 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import logging
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from code_review_backend.issues import columnar
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Export issues, their links, diffs, revisions and repositories as Parquet files"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Empty directory to write the export into")
+        parser.add_argument(
+            "--rows-per-file",
+            type=int,
+            help="Number of rows stored in each part file, defaults to 1 million",
+            default=1_000_000,
+        )
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        if os.path.exists(output) and os.listdir(output):
+            raise CommandError(f"Output directory {output} is not empty.")
+        os.makedirs(output, exist_ok=True)
+
+        # The isolation level can only be set when starting a new transaction
+        snapshot = connection.vendor == "postgresql" and not connection.in_atomic_block
+        with transaction.atomic():
+            if snapshot:
+                # All tables are read from the same snapshot, so exported rows are consistent
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY"
+                    )
+            manifest = columnar.export_tables(output, options["rows_per_file"])
+
+        total = sum(table["rows"] for table in manifest["tables"].values())
+        logger.info(f"Exported {total} rows in {output}.")
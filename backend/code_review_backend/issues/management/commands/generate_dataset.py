@@ -0,0 +1,112 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from code_review_backend.issues.datasets import Generator
+from code_review_backend.issues.models import Repository
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic history of revisions, diffs and issues on a new "
+        "repository, to reproduce locally the behaviour of a production database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "slug",
+            nargs="?",
+            help="Slug of the repository to create",
+            default="synthetic",
+        )
+        parser.add_argument(
+            "--revisions", type=int, help="Number of revisions", default=1000
+        )
+        parser.add_argument(
+            "--diffs",
+            help="Minimum and maximum number of diffs per revision, defaults to 1-3",
+            default="1-3",
+        )
+        parser.add_argument(
+            "--issues-per-diff",
+            type=int,
+            help="Average number of issues found on a diff",
+            default=20,
+        )
+        parser.add_argument(
+            "--analyzers", type=int, help="Number of analyzers", default=8
+        )
+        parser.add_argument(
+            "--checks", type=int, help="Number of checks per analyzer", default=20
+        )
+        parser.add_argument(
+            "--files",
+            type=int,
+            help="Number of files of the source tree with issues",
+            default=2000,
+        )
+        parser.add_argument(
+            "--depth",
+            type=int,
+            help="Maximum number of directories of a file path",
+            default=4,
+        )
+        parser.add_argument(
+            "--recurring",
+            type=float,
+            help="Share of the issues of a diff found again across revisions",
+            default=0.6,
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Number of days over which the revisions are created",
+            default=60,
+        )
+        parser.add_argument(
+            "--seed", type=int, help="Seed of the random generator", default=0
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Number of revisions created at once",
+            default=500,
+        )
+
+    def handle(self, *args, **options):
+        if Repository.objects.filter(slug=options["slug"]).exists():
+            raise CommandError(f"Repository {options['slug']} already exists")
+        try:
+            min_diffs, max_diffs = map(int, options["diffs"].split("-"))
+        except ValueError:
+            raise CommandError("Diffs must be a range, e.g. 1-3")
+
+        generator = Generator(
+            slug=options["slug"],
+            revisions=options["revisions"],
+            min_diffs=min_diffs,
+            max_diffs=max_diffs,
+            issues_per_diff=options["issues_per_diff"],
+            analyzers=options["analyzers"],
+            checks=options["checks"],
+            files=options["files"],
+            depth=options["depth"],
+            recurring=options["recurring"],
+            days=options["days"],
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+        )
+        start = time.monotonic()
+        with transaction.atomic():
+            counts = generator.generate()
+        elapsed = time.monotonic() - start
+        msg = ", ".join(f"{count} {model}" for model, count in counts.items())
+        logger.info(f"Created {msg} in {elapsed:.1f}s.")
@@ -0,0 +1,47 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from code_review_backend.issues import cache, columnar
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import issues exported as Parquet files by export_issues in an empty database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="Directory holding the export")
+
+    def handle(self, *args, **options):
+        try:
+            manifest = columnar.load_manifest(options["input"])
+        except FileNotFoundError:
+            raise CommandError(f"No export found in {options['input']}.")
+
+        migration = columnar.current_migration()
+        if manifest["migration"] != migration:
+            raise CommandError(
+                f"Export was made at migration {manifest['migration']}, "
+                f"but the database uses {migration}."
+            )
+
+        non_empty = [
+            model._meta.db_table for model in columnar.MODELS if model.objects.exists()
+        ]
+        if non_empty:
+            raise CommandError(f"Tables {', '.join(non_empty)} must be empty.")
+
+        with transaction.atomic():
+            columnar.import_tables(options["input"], manifest)
+            cache.invalidate(cache.ALL)
+
+        total = sum(table["rows"] for table in manifest["tables"].values())
+        logger.info(f"Imported {total} rows from {options['input']}.")
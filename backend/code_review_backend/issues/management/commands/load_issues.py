@@ -14,8 +14,14 @@ from django.core.management.base import BaseCommand
 from django.db import transaction
 from requests.exceptions import HTTPError
 
+from code_review_backend.issues import cache
 from code_review_backend.issues.compare import detect_new_for_revision
-from code_review_backend.issues.models import Issue, IssueLink, Repository
+from code_review_backend.issues.models import (
+    Issue,
+    IssueLink,
+    IssueMessage,
+    Repository,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -72,6 +78,9 @@ class Command(BaseCommand):
         # Remove all issues from diff
         diff.issues.all().delete()
 
+        # Messages are shared between issues
+        messages = IssueMessage.objects.resolve(i.get("message") for i in issues)
+
         # Build all issues for that diff, in a single DB call
         created_issues = [
             Issue.objects.get_or_create(
@@ -80,7 +89,7 @@ class Command(BaseCommand):
                     "path": i["path"],
                     "level": i.get("level", "warning"),
                     "analyzer_check": i.get("kind") or i.get("check"),
-                    "message": i.get("message"),
+                    "message_id": messages.get(i.get("message")),
                     "analyzer": i["analyzer"],
                 },
             )
@@ -94,6 +103,7 @@ class Command(BaseCommand):
                     issue=issue_db,
                     diff=diff,
                     revision_id=diff.revision_id,
+                    revision_created=diff.revision.created,
                     new_for_revision=detect_new_for_revision(
                         diff, path=issue_db.path, hash=issue_db.hash
                     ),
@@ -105,6 +115,7 @@ class Command(BaseCommand):
             ],
             ignore_conflicts=True,
         )
+        cache.invalidate(cache.ALL)
         return created_issues
 
     def load_tasks(self, environment, chunk=200):
@@ -0,0 +1,47 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from code_review_backend.issues import partitions
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Create the monthly partitions of issue links on PostgreSQL"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--setup",
+            action="store_true",
+            default=False,
+            help="Convert the issue links table to the partitioned layout when needed",
+        )
+        parser.add_argument(
+            "--months",
+            type=int,
+            help="Number of monthly partitions to create ahead, defaults to 3 months",
+            default=3,
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Partitioned issue links require PostgreSQL.")
+
+        if not partitions.is_partitioned():
+            if not options["setup"]:
+                raise CommandError(
+                    "Issue links are not partitioned, use --setup to convert the table."
+                )
+            partitions.setup_partitions()
+
+        created = partitions.create_partitions(options["months"])
+        if created:
+            logger.info(f"Created partitions {', '.join(created)}.")
+        else:
+            logger.info("All partitions already exist.")
@@ -0,0 +1,72 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import logging
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from code_review_backend.issues import ingestion
+from code_review_backend.issues.models import BULK_PENDING, IssueBulkRequest
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Create the issues queued by the asynchronous mode of the bulk endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Number of queued requests ingested in a single transaction, defaults to 20",
+            default=20,
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            help="Seconds to wait when the queue is empty, defaults to 1 second",
+            default=1.0,
+        )
+        parser.add_argument(
+            "--retention",
+            type=int,
+            help="Hours during which processed requests can be followed, defaults to 24 hours",
+            default=24,
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            default=False,
+            help="Stop once the queue is empty instead of waiting for new requests",
+        )
+
+    def purge(self, retention):
+        """
+        Delete the processed requests that clients will not follow anymore
+        """
+        deleted, _ = (
+            IssueBulkRequest.objects.exclude(status=BULK_PENDING)
+            .filter(updated__lt=timezone.now() - timedelta(hours=retention))
+            .delete()
+        )
+        if deleted:
+            logger.info(f"Deleted {deleted} processed requests.")
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.monotonic()
+            processed = ingestion.process_queue(options["batch_size"])
+            if processed:
+                logger.info(
+                    f"Processed {processed} requests in {time.monotonic() - start:.2f}s."
+                )
+                continue
+
+            self.purge(options["retention"])
+            if options["once"]:
+                break
+            time.sleep(options["sleep"])
@@ -0,0 +1,54 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from code_review_backend.issues import cache
+from code_review_backend.issues.models import KnownIssue, Repository, Revision
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the known issues of repositories from their last revision with issues, "
+        "as the bot does when ingesting a revision"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "repositories",
+            nargs="*",
+            help="Slugs of the repositories to refresh",
+            default=["mozilla-central", "autoland"],
+        )
+
+    def handle(self, *args, **options):
+        for slug in options["repositories"]:
+            try:
+                repository = Repository.objects.get(slug=slug)
+            except Repository.DoesNotExist:
+                raise CommandError(f"No repository matches the slug {slug}")
+
+            revision = (
+                Revision.objects.filter(
+                    head_repository=repository, issue_links__isnull=False
+                )
+                .order_by("-created")
+                .first()
+            )
+            if revision is None:
+                logger.info(f"No revision with issues found on {slug}.")
+                continue
+
+            total = KnownIssue.objects.refresh(revision)
+            if total is None:
+                logger.info(f"Known issues on {slug} come from a more recent revision.")
+                continue
+            cache.invalidate(cache.repository_scope(slug))
+            logger.info(
+                f"Refreshed {total} known issues on {slug} from revision {revision.id}."
+            )
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("issues", "0017_diff_auto_pk"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="issue",
+            index=models.Index(
+                fields=["created"], name="issues_issu_created_f5f46a_idx"
+            ),
+        ),
+    ]
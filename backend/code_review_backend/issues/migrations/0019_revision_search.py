@@ -0,0 +1,125 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import logging
+
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Coalesce, Concat, Lower
+
+logger = logging.getLogger(__name__)
+
+# The FTS5 table mirrors Revision.search_text, and is kept up to date by triggers
+# Note that triggers are lost when Django remakes the revision table on SQLite,
+# so they need to be created again by any migration altering that table.
+SQLITE_CREATE_SEARCH = (
+    """CREATE VIRTUAL TABLE issues_revision_search USING fts5(
+        search_text,
+        content='issues_revision',
+        content_rowid='id',
+        tokenize='trigram'
+    );""",
+    """CREATE TRIGGER issues_revision_search_insert AFTER INSERT ON issues_revision BEGIN
+        INSERT INTO issues_revision_search(rowid, search_text) VALUES (new.id, new.search_text);
+    END;""",
+    """CREATE TRIGGER issues_revision_search_delete AFTER DELETE ON issues_revision BEGIN
+        INSERT INTO issues_revision_search(issues_revision_search, rowid, search_text)
+        VALUES ('delete', old.id, old.search_text);
+    END;""",
+    """CREATE TRIGGER issues_revision_search_update AFTER UPDATE ON issues_revision BEGIN
+        INSERT INTO issues_revision_search(issues_revision_search, rowid, search_text)
+        VALUES ('delete', old.id, old.search_text);
+        INSERT INTO issues_revision_search(rowid, search_text) VALUES (new.id, new.search_text);
+    END;""",
+    "INSERT INTO issues_revision_search(issues_revision_search) VALUES ('rebuild');",
+)
+
+SQLITE_DROP_SEARCH = (
+    "DROP TRIGGER IF EXISTS issues_revision_search_insert;",
+    "DROP TRIGGER IF EXISTS issues_revision_search_delete;",
+    "DROP TRIGGER IF EXISTS issues_revision_search_update;",
+    "DROP TABLE IF EXISTS issues_revision_search;",
+)
+
+POSTGRES_CREATE_SEARCH = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm;",
+    "CREATE INDEX revision_search_trgm_idx ON issues_revision USING gin (search_text gin_trgm_ops);",
+)
+
+POSTGRES_DROP_SEARCH = ("DROP INDEX IF EXISTS revision_search_trgm_idx;",)
+
+
+def _update_search_text(apps, schema_editor):
+    """
+    Build the search text of existing revisions, as done in Revision.save()
+    """
+    Revision = apps.get_model("issues", "Revision")
+    Revision.objects.update(
+        search_text=Lower(
+            Concat(
+                Coalesce(Cast("provider_id", CharField()), Value("")),
+                Value(" "),
+                Coalesce(Cast("bugzilla_id", CharField()), Value("")),
+                Value(" "),
+                "title",
+                output_field=CharField(),
+            )
+        )
+    )
+
+
+def _create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        queries = SQLITE_CREATE_SEARCH
+    elif vendor == "postgresql":
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+            )
+            if cursor.fetchone() is None:
+                # Search still works without the index, using a sequential scan
+                logger.warning(
+                    "The pg_trgm extension is not available, skipping revisions search index."
+                )
+                return
+        queries = POSTGRES_CREATE_SEARCH
+    else:
+        return
+    for query in queries:
+        schema_editor.execute(query)
+
+
+def _drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        queries = SQLITE_DROP_SEARCH
+    elif vendor == "postgresql":
+        queries = POSTGRES_DROP_SEARCH
+    else:
+        return
+    for query in queries:
+        schema_editor.execute(query)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("issues", "0018_issue_created_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="revision",
+            name="search_text",
+            field=models.CharField(default="", editable=False, max_length=300),
+        ),
+        migrations.RunPython(
+            _update_search_text,
+            reverse_code=migrations.RunPython.noop,
+        ),
+        migrations.RunPython(
+            _create_search_index,
+            reverse_code=_drop_search_index,
+        ),
+    ]
@@ -0,0 +1,37 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def _update_revision_created(apps, schema_editor):
+    """
+    Copy the creation date of the revision on all existing links
+    """
+    IssueLink = apps.get_model("issues", "IssueLink")
+    Revision = apps.get_model("issues", "Revision")
+    IssueLink.objects.update(
+        revision_created=Subquery(
+            Revision.objects.filter(id=OuterRef("revision_id")).values("created")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("issues", "0019_revision_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="issuelink",
+            name="revision_created",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(
+            _update_revision_created,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,24 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("issues", "0020_issuelink_revision_created"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CleanupCheckpoint",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("clean_until", models.DateTimeField()),
+                ("last_revision_id", models.PositiveIntegerField(null=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
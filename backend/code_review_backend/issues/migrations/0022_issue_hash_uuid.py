@@ -0,0 +1,23 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("issues", "0021_cleanup_checkpoint"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="issue",
+            name="issue_hash_idx",
+        ),
+        migrations.AlterField(
+            model_name="issue",
+            name="hash",
+            field=models.UUIDField(unique=True),
+        ),
+    ]
@@ -0,0 +1,113 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import hashlib
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 1000
+
+# Hashes are computed as in IssueMessage.build_hash
+POSTGRES_INTERN_MESSAGES = (
+    """INSERT INTO issues_issuemessage (hash, text)
+    SELECT DISTINCT md5(message_text)::uuid, message_text
+    FROM issues_issue WHERE message_text IS NOT NULL
+    ON CONFLICT (hash) DO NOTHING;""",
+    """UPDATE issues_issue AS i SET message_id = m.id
+    FROM issues_issuemessage AS m
+    WHERE i.message_text IS NOT NULL AND m.hash = md5(i.message_text)::uuid;""",
+)
+
+
+def _intern_messages(apps, schema_editor):
+    """
+    Store each distinct message once, and reference it from the issues
+    """
+    if schema_editor.connection.vendor == "postgresql":
+        for query in POSTGRES_INTERN_MESSAGES:
+            schema_editor.execute(query)
+        return
+
+    Issue = apps.get_model("issues", "Issue")
+    IssueMessage = apps.get_model("issues", "IssueMessage")
+    issues = Issue.objects.filter(message_text__isnull=False).order_by("id")
+    last_id = None
+    while True:
+        batch = issues if last_id is None else issues.filter(id__gt=last_id)
+        batch = list(batch.values_list("id", "message_text")[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        hashes = {
+            text: uuid.UUID(hashlib.md5(text.encode("utf-8")).hexdigest())
+            for _, text in batch
+        }
+        IssueMessage.objects.bulk_create(
+            [IssueMessage(hash=hash, text=text) for text, hash in hashes.items()],
+            ignore_conflicts=True,
+        )
+        ids = dict(
+            IssueMessage.objects.filter(hash__in=hashes.values()).values_list(
+                "hash", "id"
+            )
+        )
+        Issue.objects.bulk_update(
+            [Issue(id=id, message_id=ids[hashes[text]]) for id, text in batch],
+            ["message"],
+        )
+
+
+def _restore_messages(apps, schema_editor):
+    Issue = apps.get_model("issues", "Issue")
+    IssueMessage = apps.get_model("issues", "IssueMessage")
+    Issue.objects.filter(message__isnull=False).update(
+        message_text=Subquery(
+            IssueMessage.objects.filter(id=OuterRef("message_id")).values("text")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("issues", "0022_issue_hash_uuid"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IssueMessage",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("hash", models.UUIDField(unique=True)),
+                ("text", models.TextField()),
+            ],
+        ),
+        migrations.RenameField(
+            model_name="issue",
+            old_name="message",
+            new_name="message_text",
+        ),
+        migrations.AddField(
+            model_name="issue",
+            name="message",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="issues",
+                to="issues.issuemessage",
+            ),
+        ),
+        migrations.RunPython(
+            _intern_messages,
+            reverse_code=_restore_messages,
+        ),
+        migrations.RemoveField(
+            model_name="issue",
+            name="message_text",
+        ),
+    ]
@@ -0,0 +1,55 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("issues", "0025_known_issue"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DirectoryStats",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("path", models.CharField(blank=True, max_length=250)),
+                ("parent", models.CharField(max_length=250, null=True)),
+                ("analyzer", models.CharField(max_length=50)),
+                ("analyzer_check", models.CharField(max_length=250, null=True)),
+                ("total", models.PositiveIntegerField()),
+                ("errors", models.PositiveIntegerField()),
+                (
+                    "repository",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="directory_stats",
+                        to="issues.repository",
+                    ),
+                ),
+                (
+                    "revision",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="directory_stats",
+                        to="issues.revision",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["repository", "path"],
+                        name="issues_dire_reposit_049fcb_idx",
+                    ),
+                    models.Index(
+                        fields=["repository", "parent"],
+                        name="issues_dire_reposit_2ae713_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
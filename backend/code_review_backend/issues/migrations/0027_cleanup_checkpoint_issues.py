@@ -0,0 +1,24 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("issues", "0026_directory_stats"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="cleanupcheckpoint",
+            name="last_revision_id",
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="cleanupcheckpoint",
+            name="last_issue_id",
+            field=models.UUIDField(null=True),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Coalesce, Concat, Lower
+
+# The search index is built on the column replaced here
+revision_search = import_module(
+    "code_review_backend.issues.migrations.0019_revision_search"
+)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("issues", "0027_cleanup_checkpoint_issues"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            revision_search._drop_search_index,
+            reverse_code=revision_search._create_search_index,
+        ),
+        # A column cannot be altered into a generated one
+        migrations.RunPython(
+            migrations.RunPython.noop,
+            reverse_code=revision_search._update_search_text,
+        ),
+        migrations.RemoveField(
+            model_name="revision",
+            name="search_text",
+        ),
+        migrations.AddField(
+            model_name="revision",
+            name="search_text",
+            field=models.GeneratedField(
+                expression=Lower(
+                    Concat(
+                        Coalesce(Cast("provider_id", CharField()), Value("")),
+                        Value(" "),
+                        Coalesce(Cast("bugzilla_id", CharField()), Value("")),
+                        Value(" "),
+                        "title",
+                        output_field=CharField(),
+                    )
+                ),
+                output_field=models.CharField(max_length=300),
+                db_persist=True,
+            ),
+        ),
+        migrations.RunPython(
+            revision_search._create_search_index,
+            reverse_code=revision_search._drop_search_index,
+        ),
+    ]
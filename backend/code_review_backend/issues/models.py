@@ -2,12 +2,15 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import hashlib
 import urllib.parse
 import uuid
 
 from django.conf import settings
-from django.db import models
-from django.db.models import Q
+from django.db import connections, models, transaction
+from django.db.models import CharField, Count, OuterRef, Q, Subquery, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Coalesce, Concat, Lower
 
 LEVEL_WARNING = "warning"
 LEVEL_ERROR = "error"
@@ -20,6 +23,15 @@ PROVIDERS = (
     (PROVIDER_GITHUB, "Github"),
 )
 
+BULK_PENDING = "pending"
+BULK_DONE = "done"
+BULK_FAILED = "failed"
+BULK_STATUSES = (
+    (BULK_PENDING, "Pending"),
+    (BULK_DONE, "Done"),
+    (BULK_FAILED, "Failed"),
+)
+
 
 class Repository(models.Model):
     id = models.AutoField(primary_key=True)
@@ -38,6 +50,28 @@ class Repository(models.Model):
         return self.slug
 
 
+class RevisionQuerySet(models.QuerySet):
+    def search(self, query):
+        """
+        Filter revisions whose identifiers or title contain the query, using
+        the search index built on `search_text` (see migrations 0019 and 0028)
+        """
+        query = query.strip().lower()
+        if connections[self.db].vendor == "sqlite" and len(query) >= 3:
+            # The FTS5 trigram tokenizer supports substring matching through
+            # a phrase query, but it needs at least 3 characters
+            phrase = '"{}"'.format(query.replace('"', '""'))
+            return self.filter(
+                id__in=RawSQL(
+                    "SELECT rowid FROM issues_revision_search WHERE issues_revision_search MATCH %s",
+                    (phrase,),
+                )
+            )
+
+        # On PostgreSQL, LIKE queries are served by a trigram GIN index
+        return self.filter(search_text__contains=query)
+
+
 class Revision(models.Model):
     id = models.BigAutoField(primary_key=True)
 
@@ -79,6 +113,25 @@ class Revision(models.Model):
     title = models.CharField(max_length=250)
     bugzilla_id = models.PositiveIntegerField(null=True)
 
+    # Lower case identifiers and title, indexed to search revisions.
+    # Generated by the database, so bulk creations and updates keep it up to date
+    search_text = models.GeneratedField(
+        expression=Lower(
+            Concat(
+                Coalesce(Cast("provider_id", CharField()), Value("")),
+                Value(" "),
+                Coalesce(Cast("bugzilla_id", CharField()), Value("")),
+                Value(" "),
+                "title",
+                output_field=CharField(),
+            )
+        ),
+        output_field=models.CharField(max_length=300),
+        db_persist=True,
+    )
+
+    objects = RevisionQuerySet.as_manager()
+
     class Meta:
         ordering = ("provider", "provider_id", "id")
 
@@ -98,18 +151,49 @@ class Revision(models.Model):
 
     @property
     def url(self):
-        if self.provider_id is None:
+        # Only load the base repository when it is needed
+        github = self.provider == PROVIDER_GITHUB and self.provider_id is not None
+        return self.build_url(
+            self.provider,
+            self.provider_id,
+            self.base_repository.url if github else None,
+        )
+
+    @staticmethod
+    def build_url(provider, provider_id, base_repository_url):
+        if provider_id is None:
             return
 
-        if self.provider == PROVIDER_PHABRICATOR:
+        if provider == PROVIDER_PHABRICATOR:
             parser = urllib.parse.urlparse(settings.PHABRICATOR_HOST)
-            return f"{parser.scheme}://{parser.netloc}/D{self.provider_id}"
-        elif self.provider == PROVIDER_GITHUB:
-            return f"{self.base_repository.url}/issues/{self.provider_id}"
+            return f"{parser.scheme}://{parser.netloc}/D{provider_id}"
+        elif provider == PROVIDER_GITHUB:
+            return f"{base_repository_url}/issues/{provider_id}"
         else:
             raise NotImplementedError
 
 
+class DiffQuerySet(models.QuerySet):
+    def with_counters(self):
+        """
+        Annotate diffs with the number of their issues, by level and publication state
+        """
+        return self.annotate(
+            nb_issues=Count("issue_links"),
+            nb_errors=Count(
+                "issue_links", filter=Q(issue_links__issue__level=LEVEL_ERROR)
+            ),
+            nb_warnings=Count(
+                "issue_links", filter=Q(issue_links__issue__level=LEVEL_WARNING)
+            ),
+            nb_issues_publishable=Count(
+                "issue_links",
+                filter=Q(issue_links__in_patch=True)
+                | Q(issue_links__issue__level=LEVEL_ERROR),
+            ),
+        )
+
+
 class Diff(models.Model):
     """Reference of a specific code patch (diff) in Phabricator or Github.
     A revision can be linked to multiple successive diffs, or none in case of a repository push.
@@ -135,6 +219,8 @@ class Diff(models.Model):
         Repository, related_name="diffs", on_delete=models.CASCADE
     )
 
+    objects = DiffQuerySet.as_manager()
+
     def __str__(self):
         return f"Diff {self.provider_id}"
 
@@ -179,6 +265,10 @@ class IssueLink(models.Model):
     nb_lines = models.PositiveIntegerField(null=True)
     char = models.PositiveIntegerField(null=True)
 
+    # Creation date of the revision, used as partition key
+    # when the partitioned layout is enabled on PostgreSQL
+    revision_created = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         constraints = [
             # Two constraints are required as Null values are not compared for unicity
@@ -194,12 +284,54 @@ class IssueLink(models.Model):
             ),
         ]
 
+    def save(self, *args, **kwargs):
+        if self.revision_created is None:
+            self.revision_created = self.revision.created
+        super().save(*args, **kwargs)
+
     @property
     def publishable(self):
         """Is that issue publishable on Phabricator to developers"""
         return self.in_patch is True or self.issue.level == LEVEL_ERROR
 
 
+class IssueMessageQuerySet(models.QuerySet):
+    def resolve(self, texts):
+        """
+        Get or create the messages for some texts in two queries.
+        Returns a mapping of text to message ID.
+        """
+        messages = {
+            text: IssueMessage.build_hash(text)
+            for text in set(texts)
+            if text is not None
+        }
+        if not messages:
+            return {}
+        self.bulk_create(
+            [IssueMessage(hash=hash, text=text) for text, hash in messages.items()],
+            ignore_conflicts=True,
+        )
+        ids = dict(self.filter(hash__in=messages.values()).values_list("hash", "id"))
+        return {text: ids[hash] for text, hash in messages.items()}
+
+
+class IssueMessage(models.Model):
+    """A message shared by all the issues reporting the same text"""
+
+    id = models.BigAutoField(primary_key=True)
+
+    # MD5 hash of the text, to look messages up without comparing their full text
+    hash = models.UUIDField(unique=True)
+    text = models.TextField()
+
+    objects = IssueMessageQuerySet.as_manager()
+
+    @staticmethod
+    def build_hash(text):
+        return uuid.UUID(hashlib.md5(text.encode("utf-8")).hexdigest())
+
+
 class Issue(models.Model):
     """An issue detected on a Phabricator patch"""
 
@@ -220,11 +352,18 @@ class Issue(models.Model):
     path = models.CharField(max_length=250)
     level = models.CharField(max_length=20, choices=ISSUE_LEVELS)
     analyzer_check = models.CharField(max_length=250, null=True)
-    message = models.TextField(null=True)
+    message = models.ForeignKey(
+        "issues.IssueMessage",
+        on_delete=models.PROTECT,
+        related_name="issues",
+        null=True,
+        blank=True,
+    )
     analyzer = models.CharField(max_length=50)
 
-    # Calculated hash identifying issue
-    hash = models.CharField(max_length=32, unique=True)
+    # Calculated MD5 hash identifying issue, exposed as hexadecimal in the API
+    # and stored as 16 bytes (native uuid type on PostgreSQL)
+    hash = models.UUIDField(unique=True)
 
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
@@ -232,6 +371,224 @@ class Issue(models.Model):
     class Meta:
         ordering = ("created",)
         indexes = (
-            models.Index(fields=["hash"], name="issue_hash_idx"),
             models.Index(fields=["path"]),
+            models.Index(fields=["created"]),
         )
+
+
+class CleanupCheckpoint(models.Model):
+    """Progress of a cleanup_issues run, so that an interrupted run can be resumed"""
+
+    id = models.AutoField(primary_key=True)
+
+    # Revisions created before that date are being deleted
+    clean_until = models.DateTimeField()
+
+    # Revisions are deleted by ascending id, up to that one
+    last_revision_id = models.PositiveBigIntegerField(null=True)
+
+    # Issues left without links by dropped partitions are deleted by ascending id,
+    # up to that one. Null when no partition has been dropped.
+    last_issue_id = models.UUIDField(null=True)
+
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+
+class IssueBulkRequest(models.Model):
+    """
+    Issues sent to the bulk creation endpoint in asynchronous mode,
+    waiting to be ingested by the process_issues_queue worker
+    """
+
+    id = models.BigAutoField(primary_key=True)
+
+    revision = models.ForeignKey(
+        Revision, on_delete=models.CASCADE, related_name="issue_bulk_requests"
+    )
+    diff = models.ForeignKey(
+        Diff,
+        on_delete=models.CASCADE,
+        related_name="issue_bulk_requests",
+        null=True,
+        blank=True,
+    )
+
+    # Issues as sent by the client, validated again by the worker
+    payload = models.JSONField()
+
+    status = models.CharField(
+        max_length=20, choices=BULK_STATUSES, default=BULK_PENDING
+    )
+    # Created issues, as they would have been returned by the synchronous mode
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = (models.Index(fields=["status", "id"]),)
+
+
+class KnownIssueQuerySet(models.QuerySet):
+    def revision_of(self, repository):
+        """
+        Subquery of the revision the known issues of a repository come from, null
+        when it has no known issues. The repository is usually an OuterRef.
+        """
+        return Subquery(self.filter(repository=repository).values("revision_id")[:1])
+
+    def revisions(self):
+        """
+        Ids of the revisions the known issues of each repository come from
+        """
+        return (
+            Repository.objects.annotate(known_revision=self.revision_of(OuterRef("pk")))
+            .filter(known_revision__isnull=False)
+            .values("known_revision")
+        )
+
+    @transaction.atomic
+    def refresh(self, revision):
+        """
+        Replace the known issues of the revision's head repository by the issues
+        detected on that revision, unless a more recent revision is already used.
+        Returns the number of known issues, or None when the revision is outdated.
+        """
+        # Lock the repository so concurrent refreshes are applied one after the other
+        repository = Repository.objects.select_for_update().get(
+            id=revision.head_repository_id
+        )
+        if self.filter(
+            repository=repository, revision__created__gt=revision.created
+        ).exists():
+            return None
+
+        self.filter(repository=repository).delete()
+        DirectoryStats.objects.filter(repository=repository).delete()
+        rows = (
+            IssueLink.objects.filter(revision=revision)
+            .values_list(
+                "issue__path",
+                "issue__hash",
+                "issue__analyzer",
+                "issue__analyzer_check",
+                "issue__level",
+            )
+            .distinct()
+        )
+
+        known_issues, directories = [], {}
+        for path, hash, analyzer, check, level in rows.iterator():
+            known_issues.append(
+                KnownIssue(
+                    repository=repository, revision=revision, path=path, hash=hash
+                )
+            )
+            # Count the issue in every directory containing its path
+            for directory in DirectoryStats.directories(path):
+                counts = directories.setdefault(
+                    (directory, analyzer, check), {"total": 0, "errors": 0}
+                )
+                counts["total"] += 1
+                counts["errors"] += level == LEVEL_ERROR
+
+        self.bulk_create(known_issues, batch_size=1000)
+        DirectoryStats.objects.bulk_create(
+            (
+                DirectoryStats(
+                    repository=repository,
+                    revision=revision,
+                    path=directory,
+                    parent=DirectoryStats.parent_of(directory),
+                    analyzer=analyzer,
+                    analyzer_check=check,
+                    **counts,
+                )
+                for (directory, analyzer, check), counts in directories.items()
+            ),
+            batch_size=1000,
+        )
+        return len(known_issues)
+
+
+class KnownIssue(models.Model):
+    """
+    Issues currently known on a repository, as detected on its last ingested revision.
+    Maintained by KnownIssue.objects.refresh() so that the known issues of a path are
+    found with a single index lookup, whatever the size of the history.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+
+    repository = models.ForeignKey(
+        Repository, on_delete=models.CASCADE, related_name="known_issues"
+    )
+    # The revision those issues were detected on
+    revision = models.ForeignKey(
+        Revision, on_delete=models.CASCADE, related_name="known_issues"
+    )
+
+    # Copied from the issue, to be looked up without a join
+    path = models.CharField(max_length=250)
+    hash = models.UUIDField()
+
+    objects = KnownIssueQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["repository", "path", "hash"],
+                name="known_issue_unique_repository_path_hash",
+            )
+        ]
+
+
+class DirectoryStats(models.Model):
+    """
+    Number of known issues under each directory of a repository, by analyzer and check.
+    Rebuilt along the known issues, so that a directory and its subdirectories are
+    listed with a single index lookup, whatever their depth or number of issues.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+
+    repository = models.ForeignKey(
+        Repository, on_delete=models.CASCADE, related_name="directory_stats"
+    )
+    # The revision those issues were detected on
+    revision = models.ForeignKey(
+        Revision, on_delete=models.CASCADE, related_name="directory_stats"
+    )
+
+    # Directory without trailing slash, empty for the root of the repository
+    path = models.CharField(max_length=250, blank=True)
+    # Directory containing that directory, null for the root of the repository
+    parent = models.CharField(max_length=250, null=True)
+
+    analyzer = models.CharField(max_length=50)
+    analyzer_check = models.CharField(max_length=250, null=True)
+
+    total = models.PositiveIntegerField()
+    errors = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = (
+            models.Index(fields=["repository", "path"]),
+            models.Index(fields=["repository", "parent"]),
+        )
+
+    @staticmethod
+    def directories(path):
+        """
+        List the directories containing a file path, from the root of the repository
+        """
+        parts = [part for part in path.split("/") if part][:-1]
+        return ["/".join(parts[:depth]) for depth in range(len(parts) + 1)]
+
+    @staticmethod
+    def parent_of(directory):
+        if not directory:
+            return None
+        return directory.rpartition("/")[0]
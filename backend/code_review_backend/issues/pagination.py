@@ -0,0 +1,145 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+
+
+def estimate_count(queryset):
+    """
+    Estimate the number of rows of a queryset from the PostgreSQL planner statistics:
+    the size of the table when the queryset reads a single table without any filter,
+    the rows planned by EXPLAIN otherwise (e.g. with joins, DISTINCT or GROUP BY).
+    Returns None when no estimate is available.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+
+    query = queryset.query
+    if (
+        not query.where
+        and len(query.alias_map) <= 1
+        and not query.distinct
+        and query.group_by is None
+        and not query.combinator
+    ):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            (reltuples,) = cursor.fetchone()
+        # The table has never been analyzed
+        return int(reltuples) if reltuples >= 0 else None
+
+    plan = json.loads(queryset.explain(format="json"))
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination using an estimate of the total count on large listings,
+    where an exact COUNT(*) costs as much as fetching the page.
+    Listings estimated below PAGINATION_ESTIMATE_THRESHOLD rows are counted exactly,
+    as they are cheap to count and their estimates are the least accurate.
+    """
+
+    def get_count(self, queryset):
+        estimate = estimate_count(queryset)
+        self.count_estimated = (
+            estimate is not None and estimate >= settings.PAGINATION_ESTIMATE_THRESHOLD
+        )
+        if self.count_estimated:
+            return estimate
+        return super().get_count(queryset)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "count": self.count,
+                "count_estimated": self.count_estimated,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["count_estimated"] = {
+            "type": "boolean",
+            "example": False,
+        }
+        return response_schema
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor based pagination, walking an indexed column instead of using deep OFFSETs
+    and without counting the whole queryset on each page.
+
+    Clients opt in by sending a `page_size` or `cursor` query parameter (e.g. the bot),
+    other requests fall back to the default limit/offset pagination, so that the
+    frontend still gets a total count.
+    """
+
+    page_size_query_param = "page_size"
+
+    # Pagination used by requests that do not opt in
+    fallback_class = LimitOffsetPagination
+
+    def __init__(self):
+        self.max_page_size = settings.MAX_PAGE_SIZE
+        self.fallback = None
+
+    def use_cursor(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.use_cursor(request):
+            self.fallback = self.fallback_class()
+            return self.fallback.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.fallback is not None:
+            return self.fallback.to_html()
+        return super().to_html()
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(
+            view
+        ) + self.fallback_class().get_schema_operation_parameters(view)
+
+
+class DiffPagination(KeysetPagination):
+    ordering = "-id"
+    fallback_class = EstimatedCountPagination
+
+
+class IssuePagination(KeysetPagination):
+    # Issues listed on a diff are unique per link, not per issue
+    ordering = "link_id"
+
+
+class IssueHashPagination(KeysetPagination):
+    ordering = "id"
+
+
+class IssueCheckPagination(KeysetPagination):
+    ordering = "-created"
+    fallback_class = EstimatedCountPagination
@@ -0,0 +1,211 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Optional PostgreSQL layout where IssueLink rows are stored in monthly partitions,
+using the creation date of their revision as partition key.
+Old data can then be removed by dropping whole partitions instead of deleting rows.
+"""
+
+import logging
+import re
+from datetime import datetime, timezone
+
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+TABLE = "issues_issuelink"
+LEGACY_PARTITION = f"{TABLE}_legacy"
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+# Partial unique indexes from IssueLink.Meta.constraints, extended with the partition key
+UNIQUE_INDEXES = {
+    "issue_link_unique_revision": (
+        '(issue_id, revision_id, line, nb_lines, "char", revision_created) WHERE diff_id IS NULL'
+    ),
+    "issue_link_unique_diff": (
+        '(issue_id, revision_id, diff_id, line, nb_lines, "char", revision_created) WHERE diff_id IS NOT NULL'
+    ),
+}
+
+REGEX_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+def month_start(date, delta=0):
+    """
+    First day of the month of a date, shifted by a number of months
+    """
+    month = date.year * 12 + date.month - 1 + delta
+    return datetime(month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def is_partitioned():
+    """
+    Check if the IssueLink table uses the partitioned layout
+    """
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """
+    List IssueLink partitions as tuples of (name, upper bound), sorted by upper bound.
+    The default partition has no upper bound.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i
+            INNER JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass""",
+            [TABLE],
+        )
+        partitions = []
+        for name, bound in cursor.fetchall():
+            match = REGEX_UPPER_BOUND.search(bound)
+            partitions.append(
+                (name, datetime.fromisoformat(match.group(1)) if match else None)
+            )
+    return sorted(partitions, key=lambda p: (p[1] is None, p[1]))
+
+
+@transaction.atomic
+def create_partitions(months):
+    """
+    Create monthly partitions from the current month, for a number of months.
+    Months already covered by a partition are skipped.
+    Links of those months caught by the default partition are moved to their partition.
+    Returns the names of the created partitions.
+    """
+    now = datetime.now(timezone.utc)
+    bounds = [upper for _, upper in list_partitions() if upper is not None]
+    covered_until = max(bounds) if bounds else None
+    created = []
+    with connection.cursor() as cursor:
+        for delta in range(months):
+            lower, upper = month_start(now, delta), month_start(now, delta + 1)
+            if covered_until is not None and lower < covered_until:
+                continue
+            name = f"{TABLE}_p{lower:%Y%m}"
+            # A partition cannot be created while the default partition holds rows
+            # of its range: they are moved to a new table, attached afterwards
+            cursor.execute(
+                f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            )
+            cursor.execute(
+                f"""WITH moved AS (
+                    DELETE FROM {DEFAULT_PARTITION}
+                    WHERE revision_created >= %s AND revision_created < %s
+                    RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved""",
+                [lower, upper],
+            )
+            cursor.execute(
+                f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                [lower, upper],
+            )
+            created.append(name)
+    return created
+
+
+@transaction.atomic
+def setup_partitions():
+    """
+    Convert the IssueLink table into a table partitioned by revision creation date.
+    Existing rows are kept in a single legacy partition, holding all links until the
+    end of the current month, so no data needs to be copied.
+    """
+    boundary = month_start(datetime.now(timezone.utc), 1)
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY_PARTITION}")
+        # The partition will use the primary key of the partitioned table instead
+        cursor.execute(f"ALTER TABLE {LEGACY_PARTITION} DROP CONSTRAINT {TABLE}_pkey")
+        for index in UNIQUE_INDEXES:
+            cursor.execute(f"ALTER INDEX {index} RENAME TO {index}_legacy")
+
+        # The partition key must be set on all existing links
+        cursor.execute(
+            f"""UPDATE {LEGACY_PARTITION} AS l SET revision_created = r.created
+            FROM issues_revision AS r
+            WHERE r.id = l.revision_id AND l.revision_created IS NULL"""
+        )
+        cursor.execute(
+            f"ALTER TABLE {LEGACY_PARTITION} ALTER COLUMN revision_created SET NOT NULL"
+        )
+
+        # Ids are generated by the partitioned table from now on, starting after
+        # the last id handed out by the legacy sequence
+        cursor.execute(f"SELECT coalesce(max(id), 0) FROM {LEGACY_PARTITION}")
+        (last_id,) = cursor.fetchone()
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [LEGACY_PARTITION])
+        (sequence,) = cursor.fetchone()
+        if sequence is not None:
+            cursor.execute(f"SELECT last_value FROM {sequence}")
+            last_id = max(last_id, cursor.fetchone()[0])
+        # A partition cannot have its own identity
+        cursor.execute(
+            f"ALTER TABLE {LEGACY_PARTITION} ALTER COLUMN id DROP IDENTITY IF EXISTS"
+        )
+        cursor.execute(f"ALTER TABLE {LEGACY_PARTITION} ALTER COLUMN id DROP DEFAULT")
+
+        # Build the partitioned table with the same columns, indexes and foreign keys
+        cursor.execute(
+            f"""CREATE TABLE {TABLE} (LIKE {LEGACY_PARTITION} INCLUDING CONSTRAINTS)
+            PARTITION BY RANGE (revision_created)"""
+        )
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY"
+        )
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), %s, %s)",
+            [TABLE, max(last_id, 1), last_id > 0],
+        )
+        cursor.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, revision_created)")
+        for index, definition in UNIQUE_INDEXES.items():
+            cursor.execute(f"CREATE UNIQUE INDEX {index} ON {TABLE} {definition}")
+        for column, target in (
+            ("revision_id", "issues_revision"),
+            ("issue_id", "issues_issue"),
+            ("diff_id", "issues_diff"),
+        ):
+            cursor.execute(f"CREATE INDEX ON {TABLE} ({column})")
+            cursor.execute(
+                f"""ALTER TABLE {TABLE} ADD FOREIGN KEY ({column}) REFERENCES {target} (id)
+                DEFERRABLE INITIALLY DEFERRED"""
+            )
+
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ATTACH PARTITION {LEGACY_PARTITION} FOR VALUES FROM (MINVALUE) TO (%s)",
+            [boundary],
+        )
+
+        # Catch links whose month partition has not been created yet
+        cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT")
+
+    logger.info(f"Partitioned {TABLE}, existing links are stored until {boundary}.")
+
+
+def drop_partitions(until):
+    """
+    Detach and drop all partitions that only hold links of revisions created before a date.
+    Returns the upper bound of the most recent dropped partition.
+    """
+    boundary = None
+    with connection.cursor() as cursor:
+        for name, upper in list_partitions():
+            if upper is None or upper > until:
+                continue
+            cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+            cursor.execute(f"DROP TABLE {name}")
+            logger.info(f"Dropped partition {name}.")
+            boundary = upper
+    return boundary
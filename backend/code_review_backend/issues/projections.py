@@ -0,0 +1,186 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Lightweight projections of value rows into the JSON payloads of list endpoints.
+
+They produce the same output as the serializers declared on the views, without
+instantiating fields for every row: hyperlinks are built from URL templates
+computed once per request, and values are mapped directly from the rows.
+"""
+
+from django.urls import reverse
+from rest_framework import serializers
+
+from code_review_backend.issues.models import Revision
+
+
+class URLTemplate:
+    """
+    Absolute URL of a view with a single keyword argument, reversed only once
+    """
+
+    # Accepted by both numeric and slug URL patterns
+    SENTINEL = "81726354453627180"
+
+    def __init__(self, request, view_name, kwarg):
+        url = request.build_absolute_uri(
+            reverse(view_name, kwargs={kwarg: self.SENTINEL})
+        )
+        self.prefix, self.suffix = url.split(self.SENTINEL)
+
+    def format(self, value):
+        return f"{self.prefix}{value}{self.suffix}"
+
+
+def nullable_bool(value):
+    return None if value is None else bool(value)
+
+
+class Projection:
+    """
+    Base projection, restricting a queryset to the values needed by the payload
+    """
+
+    # Values needed from the queryset, or None when it already returns value rows
+    values = None
+
+    def __init__(self, request):
+        self.request = request
+
+    def prepare(self, queryset):
+        if self.values is None:
+            return queryset
+        # Related objects are not needed anymore
+        return queryset.prefetch_related(None).values(*self.values)
+
+    def project(self, rows):
+        return [self.project_row(row) for row in rows]
+
+    def project_row(self, row):
+        raise NotImplementedError
+
+
+class IssueProjection(Projection):
+    """
+    Same output as IssueSerializer, from the value rows of IssueViewSet
+    """
+
+    def project_row(self, row):
+        return {
+            "id": str(row["id"]),
+            "hash": row["hash"].hex,
+            "analyzer": row["analyzer"],
+            "path": row["path"],
+            "level": row["level"],
+            "check": row["analyzer_check"],
+            "message": row["message_text"],
+            "publishable": nullable_bool(row["publishable"]),
+            "in_patch": nullable_bool(row["issue_links__in_patch"]),
+            "new_for_revision": nullable_bool(row["issue_links__new_for_revision"]),
+            "line": row["issue_links__line"],
+            "nb_lines": row["issue_links__nb_lines"],
+            "char": row["issue_links__char"],
+        }
+
+    def project_link(self, link):
+        """
+        Project an issue link, with its issue and message selected, and
+        annotated with the publishable state of the rows of IssueViewSet
+        """
+        issue = link.issue
+        return self.project_row(
+            {
+                "id": issue.id,
+                "hash": issue.hash,
+                "analyzer": issue.analyzer,
+                "path": issue.path,
+                "level": issue.level,
+                "analyzer_check": issue.analyzer_check,
+                "message_text": issue.message.text if issue.message else None,
+                "publishable": link.listed_publishable,
+                "issue_links__in_patch": link.in_patch,
+                "issue_links__new_for_revision": link.new_for_revision,
+                "issue_links__line": link.line,
+                "issue_links__nb_lines": link.nb_lines,
+                "issue_links__char": link.char,
+            }
+        )
+
+
+class DiffProjection(Projection):
+    """
+    Same output as DiffFullSerializer, from the annotated queryset of DiffViewSet
+    """
+
+    values = (
+        "id",
+        "provider_id",
+        "review_task_id",
+        "mercurial_hash",
+        "created",
+        "nb_issues",
+        "nb_issues_publishable",
+        "nb_warnings",
+        "nb_errors",
+        "repository_id",
+        "repository__slug",
+        "repository__url",
+        "revision_id",
+        "revision__base_repository__url",
+        "revision__head_repository__url",
+        "revision__base_changeset",
+        "revision__head_changeset",
+        "revision__provider",
+        "revision__provider_id",
+        "revision__title",
+        "revision__bugzilla_id",
+    )
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.diffs_url = URLTemplate(request, "revision-diffs-list", "revision_id")
+        self.issues_bulk_url = URLTemplate(
+            request, "revision-issues-bulk", "revision_id"
+        )
+        self.issues_url = URLTemplate(request, "issues-list", "diff_provider_id")
+        self.created = serializers.DateTimeField()
+
+    def project_row(self, row):
+        revision_id = row["revision_id"]
+        return {
+            "id": row["id"],
+            "provider_id": row["provider_id"],
+            "revision": {
+                "id": revision_id,
+                "base_repository": row["revision__base_repository__url"],
+                "head_repository": row["revision__head_repository__url"],
+                "base_changeset": row["revision__base_changeset"],
+                "head_changeset": row["revision__head_changeset"],
+                "provider": row["revision__provider"],
+                "provider_id": row["revision__provider_id"],
+                "title": row["revision__title"],
+                "bugzilla_id": row["revision__bugzilla_id"],
+                "diffs_url": self.diffs_url.format(revision_id),
+                "issues_bulk_url": self.issues_bulk_url.format(revision_id),
+                "url": Revision.build_url(
+                    row["revision__provider"],
+                    row["revision__provider_id"],
+                    row["revision__base_repository__url"],
+                ),
+            },
+            "review_task_id": row["review_task_id"],
+            "repository": {
+                "id": row["repository_id"],
+                "slug": row["repository__slug"],
+                "url": row["repository__url"],
+            },
+            "mercurial_hash": row["mercurial_hash"],
+            "issues_url": self.issues_url.format(row["provider_id"]),
+            "nb_issues": row["nb_issues"],
+            "nb_issues_publishable": row["nb_issues_publishable"],
+            "nb_warnings": row["nb_warnings"],
+            "nb_errors": row["nb_errors"],
+            "created": self.created.to_representation(row["created"]),
+        }
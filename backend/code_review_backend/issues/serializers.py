@@ -2,18 +2,17 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
-from collections import defaultdict
 from urllib.parse import urlparse
 
 from django.conf import settings
-from django.db import transaction
+from django.urls import reverse
 from rest_framework import serializers
 
+from code_review_backend.issues.ingestion import ingest
 from code_review_backend.issues.models import (
-    LEVEL_ERROR,
     Diff,
     Issue,
-    IssueLink,
+    IssueBulkRequest,
     Repository,
     Revision,
 )
@@ -206,6 +205,28 @@ class DiffFullSerializer(serializers.ModelSerializer):
         )
 
 
+class DiffCountersSerializer(DiffFullSerializer):
+    """
+    Serialize a Diff with its issues counters, in the details of its revision
+    """
+
+    class Meta(DiffFullSerializer.Meta):
+        fields = tuple(
+            field for field in DiffFullSerializer.Meta.fields if field != "revision"
+        )
+
+
+class RevisionDetailsSerializer(RevisionSerializer):
+    """
+    Serialize a Revision along with all its diffs
+    """
+
+    diffs = DiffCountersSerializer(many=True, read_only=True)
+
+    class Meta(RevisionSerializer.Meta):
+        fields = RevisionSerializer.Meta.fields + ("diffs",)
+
+
 class IssueSerializer(serializers.ModelSerializer):
     """
     Serialize an Issue in a Diff
@@ -213,6 +234,10 @@ class IssueSerializer(serializers.ModelSerializer):
 
     publishable = serializers.BooleanField(read_only=True)
     check = serializers.CharField(source="analyzer_check", required=False)
+    # Messages are stored in their own table, querysets annotate their text
+    message = serializers.CharField(
+        source="message_text", allow_null=True, required=False
+    )
     in_patch = serializers.BooleanField(
         source="issue_links__in_patch", allow_null=True, required=False
     )
@@ -248,6 +273,8 @@ class IssueSerializer(serializers.ModelSerializer):
             "nb_lines",
             "char",
         )
+        # Hashes are stored as UUIDs, but exposed as MD5 hexadecimal digests
+        extra_kwargs = {"hash": {"format": "hex"}}
 
 
 class IssueHashSerializer(serializers.ModelSerializer):
@@ -262,11 +289,15 @@ class IssueHashSerializer(serializers.ModelSerializer):
             "hash",
         )
         read_only_fields = ("id", "hash")
+        extra_kwargs = {"hash": {"format": "hex"}}
 
 
 class SingleIssueBulkSerializer(IssueSerializer):
     # Make hash non unique to avoid validation checks
-    hash = serializers.CharField(max_length=32)
+    hash = serializers.UUIDField(
+        format="hex",
+        error_messages={"invalid": "Must be a MD5 hexadecimal digest."},
+    )
 
 
 class IssueBulkSerializer(serializers.Serializer):
@@ -286,70 +317,34 @@ class IssueBulkSerializer(serializers.Serializer):
             return
         self.fields["diff_provider_id"].queryset = self.context["revision"].diffs.all()
 
-    @transaction.atomic
     def create(self, validated_data):
         diff = validated_data.get("diff_provider_id", None)
-        link_attrs = defaultdict(list)
-        # Separate attributes that are specific to the IssueLink M2M
-        for issue in validated_data["issues"]:
-            link_attrs[issue["hash"]].append(
-                {
-                    "new_for_revision": issue.pop(
-                        "issue_links__new_for_revision", None
-                    ),
-                    "in_patch": issue.pop("issue_links__in_patch", None),
-                    "line": issue.pop("issue_links__line", None),
-                    "nb_lines": issue.pop("issue_links__nb_lines", None),
-                    "char": issue.pop("issue_links__path", None),
-                }
-            )
-        # Only create issues that do not exist yet
-        Issue.objects.bulk_create(
-            [Issue(**values) for values in validated_data["issues"]],
-            ignore_conflicts=True,
-        )
+        (output,) = ingest([(self.context["revision"], diff, validated_data["issues"])])
+        return {
+            "diff_provider_id": diff,
+            "issues": output,
+        }
 
-        # Retrieve issues to get existing IDs
-        hashes = set(link_attrs.keys())
-        known_issues = {i.hash: i for i in Issue.objects.filter(hash__in=hashes)}
-
-        assert set(known_issues.keys()) == hashes, "Failed to create all issues"
-
-        # Create all links, using DB conflicts
-        links = IssueLink.objects.bulk_create(
-            [
-                IssueLink(
-                    issue_id=known_issues[issue_hash].id,
-                    diff=diff,
-                    revision=self.context["revision"],
-                    **link,
-                )
-                for issue_hash, links in link_attrs.items()
-                for link in links
-            ],
-            ignore_conflicts=True,
-        )
 
-        # Endpoint expects Issue with specific attributes for re-serialization of links
-        # TODO in treeherder: only expose hash & publishable in output
-        output = []
-        for issue_hash, links in link_attrs.items():
-            for link in links:
-                existing_issue = known_issues[issue_hash]
+class IssueBulkRequestSerializer(serializers.ModelSerializer):
+    """
+    Serialize the status of issues queued for an asynchronous bulk creation,
+    along with the created issues once done
+    """
 
-                # Set attributes for re-serialization
-                output_link = {f"issue_links__{k}": v for k, v in link.items()}
-                output_link.update(vars(existing_issue))
-                output_link["publishable"] = (
-                    link["in_patch"] or existing_issue.level == LEVEL_ERROR
-                )
+    url = serializers.SerializerMethodField()
+    issues = serializers.JSONField(source="result", read_only=True)
 
-                output.append(output_link)
+    class Meta:
+        model = IssueBulkRequest
+        fields = ("id", "url", "status", "issues", "error")
 
-        return {
-            "diff_provider_id": diff,
-            "issues": output,
-        }
+    def get_url(self, obj):
+        url = reverse(
+            "revision-issues-bulk-status",
+            kwargs={"revision_id": obj.revision_id, "pk": obj.id},
+        )
+        return self.context["request"].build_absolute_uri(url)
 
 
 class IssueCheckSerializer(IssueSerializer):
@@ -360,8 +355,7 @@ class IssueCheckSerializer(IssueSerializer):
 
     diffs = DiffLightSerializer(many=True)
 
-    class Meta:
-        model = Issue
+    class Meta(IssueSerializer.Meta):
         fields = IssueSerializer.Meta.fields + ("diffs",)
 
 
@@ -0,0 +1,18 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from django.test import override_settings
+
+
+def shared_cache():
+    """
+    Cache API responses as with a shared backend: tests run in a single process,
+    so the local memory cache sees every invalidation
+    """
+    return override_settings(
+        API_CACHE_ENABLED=True,
+        CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        },
+    )
@@ -0,0 +1,79 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from code_review_backend.issues.datasets import seed
+
+# Sizes of the datasets each endpoint is measured on, e.g. "2,10,50" to check
+# locally how endpoints scale on larger datasets
+SIZES = tuple(
+    int(size) for size in os.environ.get("QUERY_BUDGET_SIZES", "2,10").split(",")
+)
+
+# Latency budgets are multiplied by this factor, for slower environments
+LATENCY_FACTOR = float(os.environ.get("QUERY_BUDGET_LATENCY_FACTOR", 1))
+
+
+class QueryBudgetTestCase(APITestCase):
+    """
+    Check the cost of endpoints on synthetic datasets of growing size: the number
+    of queries must not depend on the size of the dataset, and both the number of
+    queries and the duration of a request must stay within a budget.
+    """
+
+    def measure(self, make_request, size):
+        """
+        Run a request against a dataset of the given size, rolled back afterwards.
+        Returns the number of queries and the duration of the request.
+        """
+        with transaction.atomic():
+            dataset = seed(size, slug=f"budget-{size}")
+            # Responses of the previous dataset must not be served
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = make_request(dataset)
+                duration = time.perf_counter() - start
+            transaction.set_rollback(True)
+        # Nor be served to other tests once the dataset is rolled back
+        cache.clear()
+
+        self.assertLess(
+            response.status_code, 400, f"Request failed on a dataset of size {size}"
+        )
+        return len(queries), duration
+
+    def assertQueryBudget(self, make_request, max_queries, max_seconds=1):
+        """
+        Measure a request built by make_request(dataset) on every dataset size
+        """
+        measures = {size: self.measure(make_request, size) for size in SIZES}
+        queries = {size: count for size, (count, _) in measures.items()}
+        self.assertEqual(
+            len(set(queries.values())),
+            1,
+            f"Number of queries by dataset size grows with the data: {queries}",
+        )
+        self.assertLessEqual(
+            max(queries.values()),
+            max_queries,
+            f"Number of queries by dataset size exceeds the budget: {queries}",
+        )
+
+        durations = {
+            size: round(duration, 3) for size, (_, duration) in measures.items()
+        }
+        self.assertLessEqual(
+            max(durations.values()),
+            max_seconds * LATENCY_FACTOR,
+            f"Duration by dataset size exceeds the budget: {durations}",
+        )
+        return measures
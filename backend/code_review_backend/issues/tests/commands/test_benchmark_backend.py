@@ -0,0 +1,57 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from code_review_backend.issues.models import Issue, Revision
+
+
+class BenchmarkBackendCommandTestCase(TestCase):
+    def test_benchmark(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "report.json")
+            with self.assertLogs():
+                call_command(
+                    "benchmark_backend",
+                    "--scales=4,8",
+                    "--repeat=1",
+                    "--issues-per-diff=3",
+                    f"--output={output}",
+                )
+            with open(output) as f:
+                report = json.load(f)
+
+            # A report can be compared with a previous one
+            with self.assertLogs() as mock_log:
+                call_command(
+                    "benchmark_backend",
+                    "--scales=4",
+                    "--repeat=1",
+                    "--issues-per-diff=3",
+                    f"--output={output}",
+                    f"--baseline={output}",
+                )
+            self.assertTrue(
+                any("diffs-list: " in line and "x)" in line for line in mock_log.output)
+            )
+
+        self.assertEqual(report["version"], 1)
+        self.assertEqual(list(report["scales"]), ["4", "8"])
+        results = report["scales"]["8"]
+        self.assertEqual(results["rows"]["Revision"], 8)
+        self.assertIn("diffs-list", results["endpoints"])
+        for name, result in results["endpoints"].items():
+            self.assertLess(result["status"], 400, name)
+            self.assertGreater(result["queries"], 0, name)
+        self.assertEqual(results["endpoints"]["revision-issues-bulk"]["status"], 201)
+        self.assertIn("seconds", results["cleanup"])
+
+        # Benchmark data is not kept
+        self.assertFalse(Revision.objects.exists())
+        self.assertFalse(Issue.objects.exists())
@@ -0,0 +1,25 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from code_review_backend.issues.models import Issue, Revision
+
+
+class BenchmarkJSONCommandTestCase(TestCase):
+    def test_benchmark(self):
+        with self.assertLogs() as mock_log:
+            call_command("benchmark_json", "--issues=3", "--repeat=2")
+
+        self.assertListEqual(
+            [line.split(":")[2].split(" - ")[0] for line in mock_log.output],
+            ["json", "json", "orjson", "orjson"],
+        )
+        self.assertIn("bulk: ", mock_log.output[0])
+        self.assertIn("list: ", mock_log.output[3])
+
+        # Benchmark data is not kept
+        self.assertFalse(Revision.objects.exists())
+        self.assertFalse(Issue.objects.exists())
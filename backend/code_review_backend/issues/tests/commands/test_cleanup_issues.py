@@ -2,8 +2,10 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import itertools
 import uuid
 from datetime import timedelta
+from unittest.mock import patch
 
 from django.core.management import call_command
 from django.db.models import Count
@@ -12,9 +14,12 @@ from django.utils import timezone
 
 from code_review_backend.issues.models import (
     LEVEL_ERROR,
+    CleanupCheckpoint,
     Diff,
     Issue,
     IssueLink,
+    IssueMessage,
+    KnownIssue,
     Repository,
     Revision,
 )
@@ -22,12 +27,13 @@ from code_review_backend.issues.models import (
 LOG_PREFIX = "INFO:code_review_backend.issues.management.commands.cleanup_issues:"
 
 
-def build_issue(path, revisions=[]):
+def build_issue(path, revisions=[], message=None):
+    messages = IssueMessage.objects.resolve([message])
     issue, _ = Issue.objects.get_or_create(
         path=path,
         level=LEVEL_ERROR,
         analyzer="analyzer",
-        defaults={"hash": uuid.uuid4().hex},
+        defaults={"hash": uuid.uuid4().hex, "message_id": messages.get(message)},
     )
     for rev in revisions:
         issue.issue_links.create(revision=rev)
@@ -38,6 +44,14 @@ class CleanupIssuesCommandTestCase(TestCase):
     def setUp(self):
         super().setUp()
 
+        # Each clock read lasts one second, and batches do not really sleep
+        patcher = patch(
+            "code_review_backend.issues.management.commands.cleanup_issues.time"
+        )
+        self.mock_time = patcher.start()
+        self.mock_time.monotonic.side_effect = itertools.count()
+        self.addCleanup(patcher.stop)
+
         (
             self.moz_central,
             self.autoland,
@@ -71,9 +85,9 @@ class CleanupIssuesCommandTestCase(TestCase):
             rev.created = timezone.now() - timedelta(days=days_ago)
             rev.save(update_fields=["created"])
 
-        # Two issues are linked to the first revision via a diff
-        build_issue("path1", [rev_1])
-        build_issue("path2", [rev_1])
+        # Two issues are linked to the first revision via a diff, sharing a message
+        build_issue("path1", [rev_1], "Old message")
+        build_issue("path2", [rev_1], "Old message")
         diff = rev_1.diffs.create(
             id=1337,
             review_task_id="Task",
@@ -83,11 +97,11 @@ class CleanupIssuesCommandTestCase(TestCase):
         IssueLink.objects.filter(revision=rev_1).update(diff=diff)
 
         # Two issues are linked to the second revision
-        build_issue("path3", [rev_2])
+        build_issue("path3", [rev_2], "Recent message")
         build_issue("path4", [rev_2])
 
         # Two issues are linked to both the second and the third revisions
-        build_issue("path5", [rev_1, rev_3])
+        build_issue("path5", [rev_1, rev_3], "Recent message")
         build_issue("path6", [rev_1, rev_3])
 
     def test_cleanup_issues_no_issue(self):
@@ -95,7 +109,7 @@ class CleanupIssuesCommandTestCase(TestCase):
             id__in=(self.moz_central.id, self.autoland.id, self.test_repo.id)
         ).delete()
         with self.assertLogs() as mock_log:
-            with self.assertNumQueries(2):
+            with self.assertNumQueries(5):
                 call_command("cleanup_issues", "--nb-days", "40")
 
         self.assertEqual(
@@ -111,7 +125,7 @@ class CleanupIssuesCommandTestCase(TestCase):
         ).delete()
         self.assertEqual(Issue.objects.count(), 6)
         with self.assertLogs() as mock_log:
-            with self.assertNumQueries(7):
+            with self.assertNumQueries(16):
                 call_command("cleanup_issues")
 
         self.assertEqual(Issue.objects.count(), 4)
@@ -127,9 +141,8 @@ class CleanupIssuesCommandTestCase(TestCase):
         self.assertListEqual(
             mock_log.output,
             [
-                f"{LOG_PREFIX}Retrieved 1 old revisions to be deleted.",
-                f"{LOG_PREFIX}Page 1/1.",
-                f"{LOG_PREFIX}Deleted 4 IssueLink, 1 Diff, 2 Issue, 1 Revision.",
+                f"{LOG_PREFIX}Batch 1: deleted 1 revisions, 9 rows in 1.00s (9 rows/s).",
+                f"{LOG_PREFIX}Deleted 4 IssueLink, 1 Diff, 2 Issue, 1 IssueMessage, 1 Revision in 3.00s (3 rows/s).",
             ],
         )
 
@@ -139,7 +152,7 @@ class CleanupIssuesCommandTestCase(TestCase):
         ).delete()
         self.assertEqual(Issue.objects.count(), 6)
         with self.assertLogs() as mock_log:
-            with self.assertNumQueries(7):
+            with self.assertNumQueries(16):
                 call_command("cleanup_issues", "--nb-days", "4")
 
         self.assertEqual(Issue.objects.count(), 2)
@@ -147,13 +160,17 @@ class CleanupIssuesCommandTestCase(TestCase):
             list(Issue.objects.values_list("path", flat=True)),
             ["path5", "path6"],
         )
+        # The message is still used by an issue that has not been deleted
+        self.assertListEqual(
+            list(IssueMessage.objects.values_list("text", flat=True)),
+            ["Recent message"],
+        )
 
         self.assertEqual(
             mock_log.output,
             [
-                f"{LOG_PREFIX}Retrieved 2 old revisions to be deleted.",
-                f"{LOG_PREFIX}Page 1/1.",
-                f"{LOG_PREFIX}Deleted 6 IssueLink, 1 Diff, 4 Issue, 2 Revision.",
+                f"{LOG_PREFIX}Batch 1: deleted 2 revisions, 14 rows in 1.00s (14 rows/s).",
+                f"{LOG_PREFIX}Deleted 6 IssueLink, 1 Diff, 4 Issue, 1 IssueMessage, 2 Revision in 3.00s (5 rows/s).",
             ],
         )
 
@@ -175,16 +192,15 @@ class CleanupIssuesCommandTestCase(TestCase):
 
         self.assertEqual(Issue.objects.count(), 6)
         with self.assertLogs() as mock_log:
-            with self.assertNumQueries(7):
+            with self.assertNumQueries(16):
                 call_command("cleanup_issues", "--nb-days", "4")
         self.assertEqual(Issue.objects.count(), 2)
         self.assertEqual(
             mock_log.output,
             [
                 f"{LOG_PREFIX}Deleted 2 unused Repository.",
-                f"{LOG_PREFIX}Retrieved 2 old revisions to be deleted.",
-                f"{LOG_PREFIX}Page 1/1.",
-                f"{LOG_PREFIX}Deleted 6 IssueLink, 1 Diff, 4 Issue, 2 Revision.",
+                f"{LOG_PREFIX}Batch 1: deleted 2 revisions, 14 rows in 1.00s (14 rows/s).",
+                f"{LOG_PREFIX}Deleted 6 IssueLink, 1 Diff, 4 Issue, 1 IssueMessage, 2 Revision in 3.00s (5 rows/s).",
             ],
         )
         self.assertListEqual(
@@ -199,3 +215,121 @@ class CleanupIssuesCommandTestCase(TestCase):
                 ("test", 1),
             ],
         )
+
+    def test_cleanup_issues_adaptive_batches(self):
+        with self.assertLogs() as mock_log:
+            call_command(
+                "cleanup_issues",
+                "--nb-days",
+                "4",
+                "--batch-size",
+                "1",
+                "--batch-time",
+                "2",
+            )
+
+        # The first batch took half of the time budget, so the next one is twice larger
+        self.assertEqual(
+            mock_log.output,
+            [
+                f"{LOG_PREFIX}Deleted 2 unused Repository.",
+                f"{LOG_PREFIX}Batch 1: deleted 1 revisions, 9 rows in 1.00s (9 rows/s).",
+                f"{LOG_PREFIX}Batch 2: deleted 1 revisions, 5 rows in 1.00s (5 rows/s).",
+                f"{LOG_PREFIX}Deleted 6 IssueLink, 1 Diff, 4 Issue, 1 IssueMessage, 2 Revision in 5.00s (3 rows/s).",
+            ],
+        )
+        self.mock_time.sleep.assert_called_once_with(0.5)
+        self.assertEqual(Issue.objects.count(), 2)
+        self.assertFalse(CleanupCheckpoint.objects.exists())
+
+    def test_cleanup_issues_resume(self):
+        with self.assertLogs() as mock_log:
+            call_command(
+                "cleanup_issues",
+                "--nb-days",
+                "4",
+                "--batch-size",
+                "1",
+                "--max-duration",
+                "3",
+            )
+
+        self.assertEqual(
+            mock_log.output,
+            [
+                f"{LOG_PREFIX}Deleted 2 unused Repository.",
+                f"{LOG_PREFIX}Batch 1: deleted 1 revisions, 9 rows in 1.00s (9 rows/s).",
+                f"{LOG_PREFIX}Stopping after the maximum duration, progress is saved at revision 0.",
+                f"{LOG_PREFIX}Deleted 4 IssueLink, 1 Diff, 2 Issue, 1 IssueMessage, 1 Revision in 5.00s (2 rows/s).",
+            ],
+        )
+        checkpoint = CleanupCheckpoint.objects.get()
+        self.assertEqual(checkpoint.last_revision_id, 0)
+        self.assertListEqual(
+            list(Revision.objects.order_by("id").values_list("id", flat=True)), [1, 2]
+        )
+
+        # The next run resumes with the same cleanup date, even with a different delay
+        with self.assertLogs() as mock_log:
+            call_command("cleanup_issues", "--nb-days", "40")
+
+        self.assertEqual(
+            mock_log.output,
+            [
+                f"{LOG_PREFIX}Deleted 1 unused Repository.",
+                f"{LOG_PREFIX}Resuming cleanup until {checkpoint.clean_until} from revision 0.",
+                f"{LOG_PREFIX}Batch 1: deleted 1 revisions, 5 rows in 1.00s (5 rows/s).",
+                f"{LOG_PREFIX}Deleted 2 IssueLink, 0 Diff, 2 Issue, 0 IssueMessage, 1 Revision in 3.00s (2 rows/s).",
+            ],
+        )
+        self.assertListEqual(
+            list(Issue.objects.values_list("path", flat=True)), ["path5", "path6"]
+        )
+        self.assertFalse(CleanupCheckpoint.objects.exists())
+
+    def test_cleanup_issues_keeps_known_issues(self):
+        Repository.objects.exclude(
+            id__in=(self.moz_central.id, self.autoland.id, self.test_repo.id)
+        ).delete()
+        rev_1 = Revision.objects.get(id=0)
+        self.assertEqual(KnownIssue.objects.refresh(rev_1), 4)
+
+        # The revision the known issues of mozilla-central come from is kept
+        with self.assertLogs() as mock_log:
+            call_command("cleanup_issues")
+        self.assertEqual(
+            mock_log.output,
+            [f"{LOG_PREFIX}Didn't find any old revision to delete."],
+        )
+        self.assertEqual(Issue.objects.count(), 6)
+        self.assertEqual(KnownIssue.objects.filter(revision=rev_1).count(), 4)
+        self.assertTrue(Diff.objects.filter(revision=rev_1).exists())
+
+    def test_cleanup_issues_orphans(self):
+        Repository.objects.exclude(
+            id__in=(self.moz_central.id, self.autoland.id, self.test_repo.id)
+        ).delete()
+        # Links of the first two issues have been dropped with their partition
+        IssueLink.objects.filter(issue__path__in=("path1", "path2")).delete()
+        checkpoint = CleanupCheckpoint.objects.create(
+            clean_until=timezone.now() - timedelta(days=40),
+            last_revision_id=2**40,
+            last_issue_id=uuid.UUID(int=0),
+        )
+
+        with self.assertLogs() as mock_log:
+            call_command("cleanup_issues", "--batch-size", "10")
+
+        self.assertEqual(
+            mock_log.output,
+            [
+                f"{LOG_PREFIX}Resuming cleanup until {checkpoint.clean_until} from revision {2**40}.",
+                f"{LOG_PREFIX}Batch 1: checked 6 issues, 3 rows in 1.00s (3 rows/s).",
+                f"{LOG_PREFIX}Deleted 2 Issue, 1 IssueMessage in 4.00s (1 rows/s).",
+            ],
+        )
+        self.assertListEqual(
+            list(Issue.objects.order_by("path").values_list("path", flat=True)),
+            ["path3", "path4", "path5", "path6"],
+        )
+        self.assertFalse(CleanupCheckpoint.objects.exists())
@@ -0,0 +1,119 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import os
+import tempfile
+import uuid
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from code_review_backend.issues.columnar import MODELS
+from code_review_backend.issues.models import (
+    LEVEL_ERROR,
+    LEVEL_WARNING,
+    Issue,
+    IssueLink,
+    IssueMessage,
+    Repository,
+)
+
+
+def dump_tables():
+    return {
+        model._meta.db_table: list(model.objects.order_by("pk").values())
+        for model in MODELS
+    }
+
+
+class ExportImportIssuesCommandTestCase(TestCase):
+    def setUp(self):
+        self.output = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output.cleanup)
+
+        repo = Repository.objects.create(
+            slug="mozilla-central", url="https://hg.mozilla.org/mozilla-central"
+        )
+        revision = repo.head_revisions.create(
+            provider_id=1234, title="Revision", base_repository=repo, bugzilla_id=42
+        )
+        diff = revision.diffs.create(
+            provider_id="PHID-DIFF-1",
+            review_task_id="task",
+            mercurial_hash="a" * 40,
+            repository=repo,
+        )
+        messages = IssueMessage.objects.resolve(["Some message"])
+        for index, level in enumerate((LEVEL_ERROR, LEVEL_WARNING, LEVEL_WARNING)):
+            issue = Issue.objects.create(
+                path=f"path/{index}.cpp",
+                level=level,
+                analyzer="analyzer",
+                analyzer_check=None if index else "check",
+                message_id=messages["Some message"] if index else None,
+                hash=uuid.uuid4().hex,
+            )
+            revision.issue_links.create(
+                issue=issue, diff=diff if index else None, line=index, char=0
+            )
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_export_import(self):
+        expected = dump_tables()
+
+        with self.assertLogs() as mock_log:
+            call_command("export_issues", self.output.name, "--rows-per-file=2")
+        self.assertEqual(
+            mock_log.output[-1],
+            "INFO:code_review_backend.issues.management.commands.export_issues:"
+            f"Exported 12 rows in {self.output.name}.",
+        )
+
+        # Tables with more rows than the limit are split in several files
+        with open(os.path.join(self.output.name, "manifest.json")) as f:
+            manifest = json.load(f)
+        self.assertEqual(
+            manifest["tables"]["issues_issue"],
+            {
+                "files": [
+                    "issues_issue/part-00000.parquet",
+                    "issues_issue/part-00001.parquet",
+                ],
+                "rows": 3,
+            },
+        )
+
+        for model in reversed(MODELS):
+            model.objects.all().delete()
+
+        with self.assertLogs():
+            call_command("import_issues", self.output.name)
+        self.assertEqual(dump_tables(), expected)
+
+        # New rows get identifiers after the imported ones
+        link = IssueLink.objects.create(
+            issue=Issue.objects.first(),
+            revision_id=expected["issues_revision"][0]["id"],
+        )
+        self.assertGreater(
+            link.id, max(row["id"] for row in expected["issues_issuelink"])
+        )
+
+    def test_import_requires_empty_tables(self):
+        with self.assertLogs():
+            call_command("export_issues", self.output.name)
+
+        with self.assertRaisesMessage(
+            CommandError, "Tables issues_repository, issues_revision"
+        ):
+            call_command("import_issues", self.output.name)
+
+    def test_export_requires_empty_directory(self):
+        with self.assertLogs():
+            call_command("export_issues", self.output.name)
+
+        with self.assertRaisesMessage(CommandError, "is not empty"):
+            call_command("export_issues", self.output.name)
@@ -0,0 +1,51 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from code_review_backend.issues.models import Diff, Issue, IssueLink, Revision
+
+
+class GenerateDatasetCommandTestCase(TestCase):
+    def test_generate(self):
+        with self.assertLogs() as mock_log:
+            call_command(
+                "generate_dataset",
+                "synthetic",
+                "--revisions=20",
+                "--diffs=2-2",
+                "--issues-per-diff=5",
+                "--analyzers=2",
+                "--days=10",
+                "--batch-size=7",
+            )
+
+        revisions = Revision.objects.filter(head_repository__slug="synthetic")
+        self.assertEqual(revisions.count(), 20)
+        self.assertEqual(Diff.objects.filter(revision__in=revisions).count(), 40)
+        self.assertEqual(
+            set(Issue.objects.values_list("analyzer", flat=True)),
+            {"analyzer-0", "analyzer-1"},
+        )
+        self.assertEqual(
+            mock_log.output,
+            [
+                "INFO:code_review_backend.issues.management.commands.generate_dataset:"
+                f"Created 20 Revision, 40 Diff, {Issue.objects.count()} Issue, "
+                f"{IssueLink.objects.count()} IssueLink in "
+                + mock_log.output[0].rsplit(" in ")[1]
+            ],
+        )
+
+        # Revisions are spread over the period, diffs are created with their revision
+        oldest, newest = revisions.order_by("id")[0], revisions.order_by("-id")[0]
+        self.assertEqual((newest.created - oldest.created).days, 9)
+        self.assertEqual(
+            set(newest.diffs.values_list("created", flat=True)), {newest.created}
+        )
+
+        with self.assertRaisesMessage(CommandError, "already exists"):
+            call_command("generate_dataset", "synthetic")
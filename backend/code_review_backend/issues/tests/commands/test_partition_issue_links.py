@@ -0,0 +1,155 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+import uuid
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from code_review_backend.issues import partitions
+from code_review_backend.issues.models import (
+    LEVEL_ERROR,
+    CleanupCheckpoint,
+    Issue,
+    IssueLink,
+    Repository,
+    Revision,
+)
+
+
+@unittest.skipUnless(
+    connection.vendor == "postgresql", "Partitioned layout requires PostgreSQL"
+)
+class PartitionIssueLinksCommandTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.repo = Repository.objects.create(
+            slug="mozilla-central", url="https://hg.mozilla.org/mozilla-central"
+        )
+        self.revision = Revision.objects.create(
+            title="Revision", base_repository=self.repo, head_repository=self.repo
+        )
+        for path in ("path1", "path2"):
+            self.build_link(path, self.revision)
+
+    def build_link(self, path, revision):
+        issue = Issue.objects.create(
+            path=path, level=LEVEL_ERROR, analyzer="analyzer", hash=uuid.uuid4().hex
+        )
+        return IssueLink.objects.create(issue=issue, revision=revision)
+
+    def test_requires_setup(self):
+        with self.assertRaisesMessage(CommandError, "use --setup"):
+            call_command("partition_issue_links")
+
+    def test_setup(self):
+        # Pending foreign key checks would prevent altering the table
+        connection.check_constraints()
+        with self.assertLogs() as mock_log:
+            call_command("partition_issue_links", "--setup")
+
+        self.assertTrue(partitions.is_partitioned())
+        now = datetime.now()
+        month = now.year * 12 + now.month - 1
+        self.assertListEqual(
+            [name for name, _ in partitions.list_partitions()],
+            [
+                "issues_issuelink_legacy",
+                *(
+                    f"issues_issuelink_p{m // 12}{m % 12 + 1:02}"
+                    for m in range(month + 1, month + 3)
+                ),
+                "issues_issuelink_default",
+            ],
+        )
+        self.assertEqual(len(mock_log.output), 2)
+
+        # Existing links are kept, and new ones can be created after them
+        self.assertEqual(IssueLink.objects.count(), 2)
+        last_id = max(IssueLink.objects.values_list("id", flat=True))
+        link = self.build_link("path3", self.revision)
+        self.assertEqual(self.revision.issues.count(), 3)
+        self.assertGreater(link.id, last_id)
+
+        # Only the partitioned table generates ids
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_get_serial_sequence(%s, 'id')",
+                ["issues_issuelink_legacy"],
+            )
+            self.assertEqual(cursor.fetchone(), (None,))
+
+        # Running the command again does not create any partition
+        with self.assertLogs() as mock_log:
+            call_command("partition_issue_links")
+        self.assertEqual(
+            mock_log.output,
+            [
+                "INFO:code_review_backend.issues.management.commands.partition_issue_links:"
+                "All partitions already exist."
+            ],
+        )
+
+    def test_move_default_rows(self):
+        connection.check_constraints()
+        call_command("partition_issue_links", "--setup")
+
+        # That revision is stored in the default partition, out of the created ranges
+        later = Revision.objects.create(
+            title="Later", base_repository=self.repo, head_repository=self.repo
+        )
+        later.created = timezone.now() + timedelta(days=120)
+        later.save(update_fields=["created"])
+        link = self.build_link("path3", later)
+
+        # Its link is moved once the partition of its month is created
+        connection.check_constraints()
+        call_command("partition_issue_links", "--months", "6")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT tableoid::regclass::text FROM issues_issuelink WHERE id = %s",
+                [link.id],
+            )
+            self.assertEqual(
+                cursor.fetchone(),
+                (f"issues_issuelink_p{partitions.month_start(later.created):%Y%m}",),
+            )
+        self.assertEqual(later.issues.count(), 1)
+
+    @override_settings(ISSUE_LINKS_PARTITIONED=True)
+    def test_cleanup_drops_partitions(self):
+        connection.check_constraints()
+        call_command("partition_issue_links", "--setup")
+
+        # That revision is stored in the default partition, out of the created ranges
+        future = Revision.objects.create(
+            title="Future", base_repository=self.repo, head_repository=self.repo
+        )
+        future.created = timezone.now() + timedelta(days=365)
+        future.save(update_fields=["created"])
+        self.build_link("path4", future)
+
+        connection.check_constraints()
+        with patch("django.utils.timezone.now") as mock_now:
+            mock_now.return_value = datetime.now(tz=dt_timezone.utc) + timedelta(
+                days=200
+            )
+            call_command("cleanup_issues")
+
+        self.assertListEqual(
+            [name for name, _ in partitions.list_partitions()],
+            ["issues_issuelink_default"],
+        )
+        self.assertListEqual(list(Revision.objects.all()), [future])
+        self.assertListEqual(
+            list(Issue.objects.values_list("path", flat=True)), ["path4"]
+        )
+        self.assertFalse(CleanupCheckpoint.objects.exists())
@@ -0,0 +1,151 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import hashlib
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from code_review_backend.issues.models import (
+    BULK_DONE,
+    BULK_FAILED,
+    BULK_PENDING,
+    Issue,
+    IssueBulkRequest,
+    IssueLink,
+    Repository,
+)
+
+
+def build_issue(name, **kwargs):
+    return {
+        "hash": hashlib.md5(name.encode()).hexdigest(),
+        "analyzer": "analyzer",
+        "level": "warning",
+        "path": f"path/{name}.cpp",
+        "line": 1,
+        "message": f"Message for {name}",
+        "in_patch": True,
+        "new_for_revision": True,
+        **kwargs,
+    }
+
+
+class ProcessIssuesQueueCommandTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="crash_user")
+        repo = Repository.objects.create(slug="myrepo", url="http://repo.test/myrepo")
+        self.revisions = [
+            repo.head_revisions.create(
+                provider_id=index, title=f"Revision {index}", base_repository=repo
+            )
+            for index in range(2)
+        ]
+        self.diffs = [
+            revision.diffs.create(
+                provider_id=f"PHID-DIFF-{revision.provider_id}",
+                review_task_id=f"task-{revision.provider_id}",
+                mercurial_hash="0" * 40,
+                repository=repo,
+            )
+            for revision in self.revisions
+        ]
+
+    def post(self, revision, diff, issues, **headers):
+        self.client.force_authenticate(user=self.user)
+        return self.client.post(
+            f"/v1/revision/{revision.id}/issues/",
+            {"diff_provider_id": diff.provider_id, "issues": issues},
+            format="json",
+            headers=headers,
+        )
+
+    def test_process_queue(self):
+        shared = build_issue("shared")
+        payloads = [
+            [build_issue("first"), shared],
+            [build_issue("second", level="error", in_patch=False), shared],
+        ]
+        urls = []
+        for revision, diff, issues in zip(self.revisions, self.diffs, payloads):
+            response = self.post(revision, diff, issues, Prefer="respond-async")
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            urls.append(response["Location"])
+
+        with self.assertLogs() as mock_log:
+            call_command("process_issues_queue", "--once")
+        self.assertEqual(
+            mock_log.output[0].split(" in ")[0],
+            "INFO:code_review_backend.issues.management.commands.process_issues_queue:"
+            "Processed 2 requests",
+        )
+
+        # Both requests were created in the same transaction, sharing an issue
+        self.assertEqual(Issue.objects.count(), 3)
+        self.assertEqual(IssueLink.objects.count(), 4)
+        self.assertFalse(IssueBulkRequest.objects.exclude(status=BULK_DONE).exists())
+
+        # The results are the ones of the synchronous endpoint
+        for revision, diff, issues, url in zip(
+            self.revisions, self.diffs, payloads, urls
+        ):
+            response = self.client.get(url)
+            self.assertEqual(response.json()["status"], BULK_DONE)
+            async_issues = response.json()["issues"]
+            IssueLink.objects.filter(revision=revision).delete()
+            response = self.post(revision, diff, issues)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertListEqual(response.json()["issues"], async_issues)
+
+    def test_process_queue_failure(self):
+        response = self.post(
+            self.revisions[0],
+            self.diffs[0],
+            [build_issue("valid")],
+            Prefer="respond-async",
+        )
+        valid = IssueBulkRequest.objects.get(id=response.json()["id"])
+        # Payloads are validated again by the worker
+        invalid = IssueBulkRequest.objects.create(
+            revision=self.revisions[1], payload=[{"hash": "invalid"}]
+        )
+
+        with self.assertLogs():
+            call_command("process_issues_queue", "--once")
+
+        valid.refresh_from_db()
+        self.assertEqual(valid.status, BULK_DONE)
+        self.assertEqual(valid.payload, [])
+        invalid.refresh_from_db()
+        self.assertEqual(invalid.status, BULK_FAILED)
+        self.assertIn("hash", invalid.error)
+        self.assertEqual(Issue.objects.count(), 1)
+
+    def test_purge(self):
+        requests = [
+            IssueBulkRequest.objects.create(
+                revision=self.revisions[0], payload=[], status=request_status
+            )
+            for request_status in (BULK_PENDING, BULK_DONE, BULK_FAILED, BULK_DONE)
+        ]
+        # The old pending request is processed before the purge, and kept
+        IssueBulkRequest.objects.filter(id__lte=requests[2].id).update(
+            updated=timezone.now() - timedelta(hours=25)
+        )
+
+        with self.assertLogs() as mock_log:
+            call_command("process_issues_queue", "--once")
+        self.assertEqual(
+            mock_log.output[-1],
+            "INFO:code_review_backend.issues.management.commands.process_issues_queue:"
+            "Deleted 2 processed requests.",
+        )
+        self.assertListEqual(
+            list(IssueBulkRequest.objects.order_by("id").values_list("id", flat=True)),
+            [requests[0].id, requests[3].id],
+        )
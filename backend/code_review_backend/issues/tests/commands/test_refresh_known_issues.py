@@ -0,0 +1,63 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import hashlib
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from code_review_backend.issues.models import (
+    LEVEL_WARNING,
+    Issue,
+    KnownIssue,
+    Repository,
+)
+
+
+class RefreshKnownIssuesCommandTestCase(TestCase):
+    def setUp(self):
+        self.repo = Repository.objects.create(
+            slug="mozilla-central", url="https://hg.mozilla.org/mozilla-central"
+        )
+        Repository.objects.create(
+            slug="autoland", url="https://hg.mozilla.org/integration/autoland"
+        )
+        self.revisions = [
+            self.repo.head_revisions.create(
+                provider_id=index, title=f"Revision {index}", base_repository=self.repo
+            )
+            for index in range(3)
+        ]
+        for index, revision in enumerate(self.revisions[:2]):
+            issue = Issue.objects.create(
+                path=f"path/{index}.cpp",
+                level=LEVEL_WARNING,
+                hash=hashlib.md5(str(index).encode()).hexdigest(),
+            )
+            revision.issue_links.create(issue=issue)
+
+    def test_refresh(self):
+        with self.assertLogs() as mock_log:
+            call_command("refresh_known_issues")
+
+        # The last revision with issues is used
+        self.assertEqual(
+            mock_log.output,
+            [
+                "INFO:code_review_backend.issues.management.commands.refresh_known_issues:"
+                f"Refreshed 1 known issues on mozilla-central from revision {self.revisions[1].id}.",
+                "INFO:code_review_backend.issues.management.commands.refresh_known_issues:"
+                "No revision with issues found on autoland.",
+            ],
+        )
+        self.assertListEqual(
+            list(KnownIssue.objects.values_list("repository", "revision", "path")),
+            [(self.repo.id, self.revisions[1].id, "path/1.cpp")],
+        )
+
+    def test_unknown_repository(self):
+        with self.assertRaisesMessage(
+            CommandError, "No repository matches the slug unknown"
+        ):
+            call_command("refresh_known_issues", "unknown")
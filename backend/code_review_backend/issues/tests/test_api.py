@@ -2,6 +2,7 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import hashlib
 import unittest
 
 from django.contrib.auth.models import User
@@ -11,11 +12,17 @@ from rest_framework.test import APITestCase
 from code_review_backend.issues.models import (
     Diff,
     Issue,
+    IssueBulkRequest,
     IssueLink,
+    IssueMessage,
     Repository,
     Revision,
 )
 
+SOME_HASH = hashlib.md5(b"some issue").hexdigest()
+ANOTHER_HASH = hashlib.md5(b"another issue").hexdigest()
+THIRD_HASH = hashlib.md5(b"a third issue").hexdigest()
+
 
 class CreationAPITestCase(APITestCase):
     def setUp(self):
@@ -195,7 +202,7 @@ class CreationAPITestCase(APITestCase):
         Check we can create a issue through the API
         """
         data = {
-            "hash": "somemd5hash",
+            "hash": SOME_HASH,
             "line": 1,
             "analyzer": "remote-flake8",
             "level": "error",
@@ -243,7 +250,7 @@ class CreationAPITestCase(APITestCase):
         data = {
             "issues": [
                 {
-                    "hash": "somemd5hash",
+                    "hash": SOME_HASH,
                     "line": 1,
                     "analyzer": "remote-flake8",
                     "level": "error",
@@ -252,7 +259,7 @@ class CreationAPITestCase(APITestCase):
                     "new_for_revision": False,
                 },
                 {
-                    "hash": "anothermd5hash",
+                    "hash": ANOTHER_HASH,
                     "line": 2,
                     "analyzer": "test",
                     "level": "warning",
@@ -291,7 +298,7 @@ class CreationAPITestCase(APITestCase):
                         "analyzer": "remote-flake8",
                         "char": None,
                         "check": None,
-                        "hash": "somemd5hash",
+                        "hash": SOME_HASH,
                         "id": str(issues[0].id),
                         "in_patch": True,
                         "level": "error",
@@ -306,7 +313,7 @@ class CreationAPITestCase(APITestCase):
                         "analyzer": "test",
                         "char": None,
                         "check": None,
-                        "hash": "anothermd5hash",
+                        "hash": ANOTHER_HASH,
                         "id": str(issues[1].id),
                         "in_patch": False,
                         "level": "warning",
@@ -333,6 +340,48 @@ class CreationAPITestCase(APITestCase):
         self.assertEqual(link.new_for_revision, None)
         self.assertEqual(link.line, 2)
 
+    def test_create_issue_bulk_shared_message(self):
+        """
+        Issues reporting the same message share a single stored message
+        """
+        data = {
+            "issues": [
+                {
+                    "hash": hash,
+                    "line": 1,
+                    "analyzer": "remote-flake8",
+                    "level": "error",
+                    "path": path,
+                    "message": "E501 line too long",
+                }
+                for hash, path in ((SOME_HASH, "a.py"), (ANOTHER_HASH, "b.py"))
+            ]
+        }
+
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(8):
+            response = self.client.post(
+                f"/v1/revision/{self.revision.id}/issues/", data, format="json"
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertListEqual(
+            [issue["message"] for issue in response.json()["issues"]],
+            ["E501 line too long", "E501 line too long"],
+        )
+
+        message = IssueMessage.objects.get()
+        self.assertEqual(message.text, "E501 line too long")
+        self.assertEqual(message.issues.count(), 2)
+
+        # A known message is reused by new issues
+        data["issues"][0]["hash"] = THIRD_HASH
+        response = self.client.post(
+            f"/v1/revision/{self.revision.id}/issues/", data, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(IssueMessage.objects.count(), 1)
+        self.assertEqual(message.issues.count(), 3)
+
     def test_create_issue_bulk_with_diff(self):
         """
         Check we can create issues on a revision with a reference to a diff
@@ -341,7 +390,7 @@ class CreationAPITestCase(APITestCase):
             "diff_provider_id": "PHID-DIFF-1234",
             "issues": [
                 {
-                    "hash": "somemd5hash",
+                    "hash": SOME_HASH,
                     "line": 1,
                     "analyzer": "remote-flake8",
                     "level": "error",
@@ -370,7 +419,7 @@ class CreationAPITestCase(APITestCase):
                         "analyzer": "remote-flake8",
                         "char": None,
                         "check": None,
-                        "hash": "somemd5hash",
+                        "hash": SOME_HASH,
                         "id": str(issue.id),
                         "in_patch": True,
                         "level": "error",
@@ -393,6 +442,71 @@ class CreationAPITestCase(APITestCase):
         self.assertFalse(link.new_for_revision)
         self.assertEqual(link.line, 1)
 
+    def test_create_issue_bulk_async(self):
+        """
+        Check issues are queued when the client prefers an asynchronous response
+        """
+        data = {
+            "diff_provider_id": "PHID-DIFF-1234",
+            "issues": [
+                {
+                    "hash": SOME_HASH,
+                    "line": 1,
+                    "analyzer": "remote-flake8",
+                    "level": "error",
+                    "path": "path/to/file.py",
+                    "in_patch": True,
+                    "new_for_revision": False,
+                }
+            ],
+        }
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            f"/v1/revision/{self.revision.id}/issues/",
+            data,
+            format="json",
+            headers={"Prefer": "respond-async"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        bulk_request = IssueBulkRequest.objects.get()
+        url = f"http://testserver/v1/revision/{self.revision.id}/issues/{bulk_request.id}/"
+        self.assertEqual(response["Location"], url)
+        self.assertDictEqual(
+            response.json(),
+            {
+                "id": bulk_request.id,
+                "url": url,
+                "status": "pending",
+                "issues": None,
+                "error": None,
+            },
+        )
+        self.assertEqual(bulk_request.diff, self.diff)
+        self.assertFalse(Issue.objects.exists())
+
+        # Invalid payloads are still rejected by the endpoint
+        data["issues"][0]["hash"] = "invalid"
+        response = self.client.post(
+            f"/v1/revision/{self.revision.id}/issues/",
+            data,
+            format="json",
+            headers={"Prefer": "respond-async"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(IssueBulkRequest.objects.count(), 1)
+
+        # The status is available for its revision only
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["status"], "pending")
+        response = self.client.get(f"/v1/revision/0/issues/{bulk_request.id}/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # And requires the same authentication as the creation
+        self.client.logout()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
     # This test is currently expected to fail due to the unique
     # constraints on IssueLink not respecting the NULL values unicity
     # So we end up with duplicate IssueLinks being created when NULL values
@@ -405,7 +519,7 @@ class CreationAPITestCase(APITestCase):
         payload_1 = {
             "issues": [
                 {
-                    "hash": "somemd5hash",
+                    "hash": SOME_HASH,
                     "line": 1,
                     "analyzer": "remote-flake8",
                     "level": "error",
@@ -414,7 +528,7 @@ class CreationAPITestCase(APITestCase):
                     "new_for_revision": False,
                 },
                 {
-                    "hash": "anothermd5hash",
+                    "hash": ANOTHER_HASH,
                     "line": 2,
                     "analyzer": "test",
                     "level": "warning",
@@ -427,7 +541,7 @@ class CreationAPITestCase(APITestCase):
         payload_2 = {
             "issues": [
                 {
-                    "hash": "somemd5hash",
+                    "hash": SOME_HASH,
                     "line": 1,
                     "analyzer": "remote-flake8",
                     "level": "error",
@@ -436,7 +550,7 @@ class CreationAPITestCase(APITestCase):
                     "new_for_revision": False,
                 },
                 {
-                    "hash": "athirdmd5hash",
+                    "hash": THIRD_HASH,
                     "line": 3,
                     "analyzer": "remote-flake8",
                     "level": "error",
@@ -456,7 +570,7 @@ class CreationAPITestCase(APITestCase):
             self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertCountEqual(
             [issue["hash"] for issue in response.json()["issues"]],
-            ["somemd5hash", "anothermd5hash"],
+            [SOME_HASH, ANOTHER_HASH],
         )
 
         issues = list(Issue.objects.order_by("created"))
@@ -469,14 +583,14 @@ class CreationAPITestCase(APITestCase):
             self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertCountEqual(
             [issue["hash"] for issue in response.json()["issues"]],
-            ["somemd5hash", "athirdmd5hash"],
+            [SOME_HASH, THIRD_HASH],
         )
         new_issues = list(Issue.objects.order_by("created"))
         self.assertEqual(len(new_issues), 3)
         self.assertListEqual([i.id for i in issues], [i.id for i in new_issues[:2]])
         self.assertListEqual(
-            [i.hash for i in new_issues],
-            ["somemd5hash", "anothermd5hash", "athirdmd5hash"],
+            [i.hash.hex for i in new_issues],
+            [SOME_HASH, ANOTHER_HASH, THIRD_HASH],
         )
 
         # Calling again with the same payload should give the same result
@@ -487,29 +601,32 @@ class CreationAPITestCase(APITestCase):
             self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertCountEqual(
             [issue["hash"] for issue in response.json()["issues"]],
-            ["somemd5hash", "athirdmd5hash"],
+            [SOME_HASH, THIRD_HASH],
         )
         self.assertListEqual(
-            list(
-                IssueLink.objects.order_by("issue__created").values_list(
+            [
+                hash.hex
+                for hash in IssueLink.objects.order_by("issue__created").values_list(
                     "issue__hash", flat=True
                 )
-            ),
-            ["somemd5hash", "anothermd5hash", "athirdmd5hash"],
+            ],
+            [SOME_HASH, ANOTHER_HASH, THIRD_HASH],
         )
 
         # And we still have the same issues in DB
-        new_issues = list(
-            Issue.objects.order_by("created").values_list("hash", flat=True)
-        )
-        self.assertEqual(new_issues, ["somemd5hash", "anothermd5hash", "athirdmd5hash"])
+        new_issues = [
+            hash.hex
+            for hash in Issue.objects.order_by("created").values_list("hash", flat=True)
+        ]
+        self.assertEqual(new_issues, [SOME_HASH, ANOTHER_HASH, THIRD_HASH])
         self.assertListEqual(
-            list(
-                IssueLink.objects.order_by("issue__created").values_list(
+            [
+                hash.hex
+                for hash in IssueLink.objects.order_by("issue__created").values_list(
                     "issue__hash", flat=True
                 )
-            ),
-            ["somemd5hash", "anothermd5hash", "athirdmd5hash"],
+            ],
+            [SOME_HASH, ANOTHER_HASH, THIRD_HASH],
         )
 
     def test_create_issue_bulk_duplicate(self):
@@ -519,7 +636,7 @@ class CreationAPITestCase(APITestCase):
         payload = {
             "issues": [
                 {
-                    "hash": "somemd5hash",
+                    "hash": SOME_HASH,
                     "line": 1,
                     "analyzer": "remote-flake8",
                     "level": "error",
@@ -528,7 +645,7 @@ class CreationAPITestCase(APITestCase):
                     "new_for_revision": False,
                 },
                 {
-                    "hash": "somemd5hash",
+                    "hash": SOME_HASH,
                     "line": 1,
                     "analyzer": "remote-flake8",
                     "level": "error",
@@ -563,7 +680,7 @@ class CreationAPITestCase(APITestCase):
                         "analyzer": "remote-flake8",
                         "char": None,
                         "check": None,
-                        "hash": "somemd5hash",
+                        "hash": SOME_HASH,
                         "id": str(issues[0].id),
                         "in_patch": True,
                         "level": "error",
@@ -578,12 +695,38 @@ class CreationAPITestCase(APITestCase):
             },
         )
 
+    def test_create_issue_bulk_invalid_hash(self):
+        """
+        Issue hashes must be MD5 hexadecimal digests
+        """
+        payload = {
+            "issues": [
+                {
+                    "hash": "notanmd5hash",
+                    "line": 1,
+                    "analyzer": "remote-flake8",
+                    "level": "error",
+                    "path": "path/to/file.py",
+                },
+            ]
+        }
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            f"/v1/revision/{self.revision.id}/issues/", payload, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertDictEqual(
+            response.json(),
+            {"issues": [{"hash": ["Must be a MD5 hexadecimal digest."]}]},
+        )
+        self.assertFalse(Issue.objects.exists())
+
     def test_create_issue_bulk_multiple_issue_reference(self):
         """
         The same issue can be referred multiple times (e.g. different line, new_for_revision, in_patch, char…)
         """
         base_issue = {
-            "hash": "somemd5hash",
+            "hash": SOME_HASH,
             "line": 1,
             "nb_lines": 2,
             "analyzer": "remote-flake8",
@@ -639,11 +782,11 @@ class CreationAPITestCase(APITestCase):
                 for d in response.json()["issues"]
             ],
             [
-                ("somemd5hash", 1, 2, False, False),
-                ("somemd5hash", 2, 2, False, False),
-                ("somemd5hash", 1, 3, False, False),
-                ("somemd5hash", 1, 2, True, False),
-                ("somemd5hash", 1, 2, False, True),
+                (SOME_HASH, 1, 2, False, False),
+                (SOME_HASH, 2, 2, False, False),
+                (SOME_HASH, 1, 3, False, False),
+                (SOME_HASH, 1, 2, True, False),
+                (SOME_HASH, 1, 2, False, True),
             ],
         )
 
@@ -683,3 +826,24 @@ class CreationAPITestCase(APITestCase):
                 f"/v1/revision/{self.revision.id}/issues/", payload, format="json"
             )
             self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_list_diff_issues_keyset(self):
+        """
+        Issues of a diff can be listed by following cursors, one item per issue link
+        """
+        issue = Issue.objects.create(hash="a" * 32, path="some_path", level="error")
+        links = [
+            self.revision.issue_links.create(diff=self.diff, issue=issue, line=line)
+            for line in (10, 20, 30)
+        ]
+
+        lines = []
+        url = "/v1/diff/PHID-DIFF-1234/issues/?page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.json()
+            self.assertNotIn("count", data)
+            lines += [item["line"] for item in data["results"]]
+            url = data["next"]
+        self.assertListEqual(lines, [link.line for link in links])
@@ -0,0 +1,181 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import hashlib
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from code_review_backend.issues import cache as issues_cache
+from code_review_backend.issues.models import Issue, Repository
+from code_review_backend.issues.tests import shared_cache
+
+
+@shared_cache()
+class CacheAPITestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="crash_user")
+        self.repo = Repository.objects.create(
+            slug="myrepo", url="http://repo.test/myrepo"
+        )
+        self.revision = self.repo.head_revisions.create(
+            provider="phabricator",
+            provider_id=456,
+            title="Bug XXX - Yet Another bug",
+            base_repository=self.repo,
+        )
+        self.diffs = [
+            self.revision.diffs.create(
+                provider_id=f"PHID-DIFF-{i}",
+                review_task_id=f"task-{i}",
+                mercurial_hash=hashlib.sha1(f"hg {i}".encode()).hexdigest(),
+                repository=self.repo,
+            )
+            for i in range(2)
+        ]
+
+    def create_issues(self, diff, *paths):
+        self.client.force_authenticate(user=self.user)
+        # Invalidation is only applied once the ingestion transaction is committed
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f"/v1/revision/{self.revision.id}/issues/",
+                {
+                    "diff_provider_id": diff.provider_id,
+                    "issues": [
+                        {
+                            "hash": hashlib.md5(path.encode()).hexdigest(),
+                            "line": 1,
+                            "analyzer": "analyzer-X",
+                            "check": "check-1",
+                            "level": "error",
+                            "path": path,
+                        }
+                        for path in paths
+                    ],
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def list_paths(self, diff):
+        response = self.client.get(f"/v1/diff/{diff.provider_id}/issues/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [issue["path"] for issue in response.json()["results"]]
+
+    def test_cached_stats(self):
+        self.create_issues(self.diffs[0], "a.py")
+        response = self.client.get("/v1/check/stats/")
+        self.assertEqual(response.json()["results"][0]["total"], 1)
+
+        # The response is served from the cache
+        with self.assertNumQueries(0):
+            response = self.client.get("/v1/check/stats/")
+        self.assertEqual(response.json()["results"][0]["total"], 1)
+
+        # Ingesting new issues refreshes the statistics
+        self.create_issues(self.diffs[1], "b.py")
+        response = self.client.get("/v1/check/stats/")
+        self.assertEqual(response.json()["results"][0]["total"], 2)
+
+    def test_diff_issues_invalidation(self):
+        self.create_issues(self.diffs[0], "a.py")
+        self.assertEqual(self.list_paths(self.diffs[0]), ["a.py"])
+        self.assertEqual(self.list_paths(self.diffs[1]), [])
+
+        # Issues of another diff do not expire the cached issues of the first one
+        self.create_issues(self.diffs[1], "b.py")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.list_paths(self.diffs[0]), ["a.py"])
+        self.assertEqual(self.list_paths(self.diffs[1]), ["b.py"])
+
+        self.create_issues(self.diffs[0], "c.py")
+        self.assertEqual(self.list_paths(self.diffs[0]), ["a.py", "c.py"])
+
+    def test_cleanup_invalidation(self):
+        self.create_issues(self.diffs[0], "a.py")
+        self.assertEqual(self.list_paths(self.diffs[0]), ["a.py"])
+
+        self.revision.created = timezone.now() - timedelta(days=60)
+        self.revision.save(update_fields=["created"])
+        with self.assertLogs(), self.captureOnCommitCallbacks(execute=True):
+            call_command("cleanup_issues")
+
+        response = self.client.get(f"/v1/diff/{self.diffs[0].provider_id}/issues/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get("/v1/check/stats/")
+        self.assertEqual(response.json()["results"], [])
+
+    def test_diff_issues_etag(self):
+        self.create_issues(self.diffs[0], "a.py")
+        url = f"/v1/diff/{self.diffs[0].provider_id}/issues/"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        etag = response["ETag"]
+
+        # Revalidation does not need any query nor the cached data
+        with (
+            self.assertNumQueries(0),
+            patch("code_review_backend.issues.cache.get_data") as mock_get,
+        ):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        mock_get.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+        # The ETag changes once new issues are published on the diff
+        self.create_issues(self.diffs[0], "b.py")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.json()["results"]), 2)
+
+    def test_disabled_without_shared_cache(self):
+        self.create_issues(self.diffs[0], "a.py")
+        with self.settings(API_CACHE_ENABLED=False):
+            response = self.client.get(f"/v1/diff/{self.diffs[0].provider_id}/issues/")
+            self.assertNotIn("ETag", response)
+            self.assertEqual(self.list_paths(self.diffs[0]), ["a.py"])
+
+            # Writes of other processes could not invalidate a local cache
+            Issue.objects.update(path="b.py")
+            self.assertEqual(self.list_paths(self.diffs[0]), ["b.py"])
+
+    def test_wildcard_etag(self):
+        self.create_issues(self.diffs[0], "a.py")
+        response = self.client.get(
+            f"/v1/diff/{self.diffs[0].provider_id}/issues/", HTTP_IF_NONE_MATCH="*"
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # A missing resource does not match the wildcard
+        response = self.client.get(
+            "/v1/diff/PHID-DIFF-missing/issues/", HTTP_IF_NONE_MATCH="*"
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get("/v1/revision/9999/", HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_issue_retrieve_invalidation(self):
+        self.create_issues(self.diffs[0], "a.py")
+        issue = Issue.objects.get()
+        url = f"/v1/diff/{self.diffs[0].provider_id}/issues/{issue.id}/"
+        self.assertEqual(self.client.get(url).json()["path"], "a.py")
+
+        # A retrieved issue is cached with the issues of its diff
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json()["path"], "a.py")
+        Issue.objects.update(path="b.py")
+        with self.captureOnCommitCallbacks(execute=True):
+            issues_cache.invalidate(issues_cache.diff_scope(self.diffs[0].provider_id))
+        self.assertEqual(self.client.get(url).json()["path"], "b.py")
@@ -4,11 +4,13 @@
 
 import hashlib
 import random
+import uuid
 
 from django.contrib.auth.models import User
+from rest_framework import status
 from rest_framework.test import APITestCase
 
-from code_review_backend.issues.compare import detect_new_for_revision
+from code_review_backend.issues.compare import compare_diffs, detect_new_for_revision
 from code_review_backend.issues.models import Diff, Issue, Repository
 
 
@@ -91,3 +93,32 @@ class CompareAPITestCase(APITestCase):
         # But adding an issue with a different hash on second diff will be set as new
         issue = self.build_issue(2, 12345)
         self.assertTrue(detect_new_for_revision(second_diff, issue.path, issue.hash))
+
+    def test_compare_diffs(self):
+        """
+        Check the comparison of the issues of two diffs
+        """
+        # Issue 1 is found twice on the second diff, and issue 2 is fixed
+        self.build_issue(2, 0)
+        self.build_issue(2, 1)
+        self.build_issue(2, 1)
+        self.build_issue(2, 3)
+
+        with self.assertNumQueries(2):
+            response = self.client.get("/v1/diff/PHID-DIFF-2/compare/PHID-DIFF-1/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertDictEqual(
+            response.json(),
+            {
+                "unresolved": sorted([self.build_hash(0), self.build_hash(1)]),
+                "closed": [self.build_hash(2)],
+                "new": [self.build_hash(3)],
+            },
+        )
+        self.assertEqual(
+            compare_diffs(Diff.objects.get(pk=2), Diff.objects.get(pk=1))["closed"],
+            {uuid.UUID(self.build_hash(2))},
+        )
+
+        response = self.client.get("/v1/diff/PHID-DIFF-2/compare/PHID-DIFF-404/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
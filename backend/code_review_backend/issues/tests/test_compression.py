@@ -0,0 +1,91 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import gzip
+import hashlib
+import json
+
+import brotli
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from code_review_backend.issues.models import LEVEL_WARNING, Issue, Repository
+from code_review_backend.issues.tests import shared_cache
+
+
+@shared_cache()
+class CompressionTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        repo = Repository.objects.create(slug="myrepo", url="http://repo.test/myrepo")
+        revision = repo.head_revisions.create(
+            provider_id=1, title="Revision", base_repository=repo
+        )
+        self.diff = revision.diffs.create(
+            provider_id="PHID-DIFF-1",
+            review_task_id="task",
+            mercurial_hash="a" * 40,
+            repository=repo,
+        )
+        for i in range(50):
+            issue = Issue.objects.create(
+                path=f"dom/some/path/{i}.cpp",
+                level=LEVEL_WARNING,
+                analyzer="analyzer",
+                hash=hashlib.md5(str(i).encode()).hexdigest(),
+            )
+            revision.issue_links.create(issue=issue, diff=self.diff, line=i)
+        self.url = f"/v1/diff/{self.diff.provider_id}/issues/"
+
+    def test_gzip(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(
+            len(json.loads(gzip.decompress(response.content))["results"]), 50
+        )
+
+    def test_brotli(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(response["Content-Length"], str(len(response.content)))
+        content = brotli.decompress(response.content)
+        self.assertLess(len(response.content), len(content) / 5)
+        self.assertEqual(len(json.loads(content)["results"]), 50)
+
+        # Random padding varies the size of the same compressed response
+        sizes = {
+            len(self.client.get(self.url, HTTP_ACCEPT_ENCODING="br").content)
+            for _ in range(10)
+        }
+        self.assertGreater(len(sizes), 1)
+
+        # The compressed response can still be revalidated with its weak ETag
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+        response = self.client.get(
+            self.url, HTTP_ACCEPT_ENCODING="br", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_brotli_streaming(self):
+        response = self.client.get(
+            "/v1/issues/myrepo/export/", HTTP_ACCEPT_ENCODING="br"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Encoding"], "br")
+        lines = brotli.decompress(b"".join(response.streaming_content)).splitlines()
+        self.assertEqual(len(lines), 50)
+
+    @override_settings(COMPRESSION_MIN_SIZE=100_000)
+    def test_small_response(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(len(response.json()["results"]), 50)
@@ -3,13 +3,18 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import hashlib
+import unittest
 from datetime import datetime
+from unittest.mock import patch
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from code_review_backend.issues.models import Diff, Repository
+from code_review_backend.issues.models import Diff, Repository, Revision
+from code_review_backend.issues.pagination import estimate_count
 
 
 class DiffAPITestCase(APITestCase):
@@ -62,6 +67,7 @@ class DiffAPITestCase(APITestCase):
             response.json(),
             {
                 "count": 3,
+                "count_estimated": False,
                 "next": None,
                 "previous": None,
                 "results": [
@@ -203,6 +209,60 @@ class DiffAPITestCase(APITestCase):
             ["PHID-DIFF-3", "PHID-DIFF-1"],
         )
 
+        # Partial title, case insensitive
+        response = self.client.get("/v1/diff/?search=VISION 2")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [d["provider_id"] for d in response.json()["results"]], ["PHID-DIFF-2"]
+        )
+
+        # Short queries, in revision provider id or diff id
+        response = self.client.get("/v1/diff/?search=2")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [d["provider_id"] for d in response.json()["results"]], ["PHID-DIFF-2"]
+        )
+        response = self.client.get("/v1/diff/?search=3")
+        self.assertEqual(
+            [d["provider_id"] for d in response.json()["results"]], ["PHID-DIFF-3"]
+        )
+
+        # Diff ids are matched partially too
+        Diff.objects.create(
+            id=1234,
+            provider_id="PHID-DIFF-1234",
+            revision_id=1,
+            review_task_id="task-1234",
+            mercurial_hash=hashlib.sha1(b"hg 1234").hexdigest(),
+            repository=self.repo_try,
+        )
+        response = self.client.get("/v1/diff/?search=23")
+        self.assertEqual(
+            [d["provider_id"] for d in response.json()["results"]], ["PHID-DIFF-1234"]
+        )
+
+    def test_search_updated_revision(self):
+        """
+        Check the search index follows revision updates
+        """
+        revision = Revision.objects.get(id=2)
+        revision.title = "Bug 1234 - Updated title"
+        revision.save()
+
+        response = self.client.get("/v1/diff/?search=updated")
+        self.assertEqual(
+            [d["provider_id"] for d in response.json()["results"]], ["PHID-DIFF-2"]
+        )
+        response = self.client.get("/v1/diff/?search=revision 2")
+        self.assertEqual(response.json()["count"], 0)
+
+        # Bulk updates do not call Revision.save()
+        Revision.objects.filter(id=2).update(title="Bug 1234 - Bulk title")
+        response = self.client.get("/v1/diff/?search=bulk")
+        self.assertEqual(
+            [d["provider_id"] for d in response.json()["results"]], ["PHID-DIFF-2"]
+        )
+
     def test_filter_issues(self):
         """
         Check we can filter by issues present or not
@@ -221,3 +281,67 @@ class DiffAPITestCase(APITestCase):
         response = self.client.get("/v1/diff/?issues=any")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.json()["count"], 0)
+
+    def test_list_diffs_keyset(self):
+        """
+        Check diffs can be listed by following cursors, without any count
+        """
+        response = self.client.get("/v1/diff/?page_size=2")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertNotIn("count", data)
+        self.assertIsNone(data["previous"])
+        self.assertEqual(
+            [d["provider_id"] for d in data["results"]],
+            ["PHID-DIFF-3", "PHID-DIFF-2"],
+        )
+
+        response = self.client.get(data["next"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertIsNone(data["next"])
+        self.assertEqual([d["provider_id"] for d in data["results"]], ["PHID-DIFF-1"])
+
+        # Page size is limited by the settings
+        cache.clear()
+        with self.settings(MAX_PAGE_SIZE=1):
+            response = self.client.get("/v1/diff/?page_size=2")
+        self.assertEqual(len(response.json()["results"]), 1)
+
+    @unittest.skipUnless(
+        connection.vendor == "postgresql", "Count estimates require PostgreSQL"
+    )
+    def test_list_diffs_estimated_count(self):
+        """
+        Check large listings use the planner estimate instead of counting all rows
+        """
+        with self.settings(PAGINATION_ESTIMATE_THRESHOLD=0):
+            with self.assertNumQueries(2):
+                # Estimate then fetch the page, without any COUNT(*)
+                response = self.client.get("/v1/diff/", {"limit": 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertTrue(data["count_estimated"])
+        self.assertIsInstance(data["count"], int)
+        self.assertEqual([d["provider_id"] for d in data["results"]], ["PHID-DIFF-3"])
+
+    @unittest.skipUnless(
+        connection.vendor == "postgresql", "Count estimates require PostgreSQL"
+    )
+    def test_estimate_count(self):
+        """
+        Check the size of the table is only used for queries reading that table alone
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE issues_diff")
+        self.assertEqual(estimate_count(Diff.objects.all()), 3)
+
+        # Diffs of 2 revisions, the planner estimating their distinct values
+        self.assertEqual(
+            estimate_count(Diff.objects.values("revision_id").distinct()), 2
+        )
+        # Other queries are planned, even without any filter
+        with patch("django.db.models.query.QuerySet.explain") as mock_explain:
+            mock_explain.return_value = '[{"Plan": {"Plan Rows": 2}}]'
+            self.assertEqual(estimate_count(Diff.objects.values("issue_links__id")), 2)
+            self.assertEqual(estimate_count(Diff.objects.with_counters()), 2)
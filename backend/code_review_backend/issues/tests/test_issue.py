@@ -2,10 +2,14 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import gzip
+import hashlib
+import json
 from datetime import datetime
 from unittest.mock import patch
 
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 
@@ -13,9 +17,13 @@ from code_review_backend.issues.models import (
     LEVEL_ERROR,
     LEVEL_WARNING,
     Issue,
+    KnownIssue,
     Repository,
 )
 
+ERR_HASH = hashlib.md5(b"issue_err").hexdigest()
+WARN_HASH = hashlib.md5(b"issue_warn").hexdigest()
+
 
 class IssueTestCase(TestCase):
     def setUp(self):
@@ -39,10 +47,10 @@ class IssueTestCase(TestCase):
             )
 
         self.err_issue = Issue.objects.create(
-            path="some/file", level=LEVEL_ERROR, hash="issue_err"
+            path="some/file", level=LEVEL_ERROR, hash=ERR_HASH
         )
         self.warn_issue = Issue.objects.create(
-            path="some/other/file", level=LEVEL_WARNING, hash="issue_warn"
+            path="some/other/file", level=LEVEL_WARNING, hash=WARN_HASH
         )
 
         self.err_link = self.revision.issue_links.create(issue=self.err_issue, line=12)
@@ -116,12 +124,34 @@ class IssueTestCase(TestCase):
                 "next": None,
                 "previous": None,
                 "results": [
-                    {"id": str(self.err_issue.id), "hash": "issue_err"},
-                    {"id": str(self.warn_issue.id), "hash": "issue_warn"},
+                    {"id": str(self.err_issue.id), "hash": ERR_HASH},
+                    {"id": str(self.warn_issue.id), "hash": WARN_HASH},
                 ],
             },
         )
 
+    def test_list_repository_issues_keyset(self):
+        issues = sorted([self.err_issue, self.warn_issue], key=lambda i: i.id)
+        url = reverse("repository-issues", kwargs={"repo_slug": "repo_slug"})
+
+        # No count is performed using the keyset pagination
+        with self.assertNumQueries(3):
+            response = self.client.get(url + "?page_size=1")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertNotIn("count", data)
+        self.assertEqual(
+            data["results"], [{"id": str(issues[0].id), "hash": issues[0].hash}]
+        )
+
+        response = self.client.get(data["next"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertIsNone(data["next"])
+        self.assertEqual(
+            data["results"], [{"id": str(issues[1].id), "hash": issues[1].hash}]
+        )
+
     def test_list_repository_issues_revision_filter(self):
         """
         Primarily filter issues depending on an existing revision
@@ -138,7 +168,7 @@ class IssueTestCase(TestCase):
         self.assertEqual(
             data["results"],
             [
-                {"id": str(self.warn_issue.id), "hash": "issue_warn"},
+                {"id": str(self.warn_issue.id), "hash": WARN_HASH},
             ],
         )
 
@@ -158,7 +188,7 @@ class IssueTestCase(TestCase):
         self.assertEqual(
             data["results"],
             [
-                {"id": str(self.warn_issue.id), "hash": "issue_warn"},
+                {"id": str(self.warn_issue.id), "hash": WARN_HASH},
             ],
         )
 
@@ -176,8 +206,8 @@ class IssueTestCase(TestCase):
                 "next": None,
                 "previous": None,
                 "results": [
-                    {"id": str(self.err_issue.id), "hash": "issue_err"},
-                    {"id": str(self.warn_issue.id), "hash": "issue_warn"},
+                    {"id": str(self.err_issue.id), "hash": ERR_HASH},
+                    {"id": str(self.warn_issue.id), "hash": WARN_HASH},
                 ],
             },
         )
@@ -211,3 +241,168 @@ class IssueTestCase(TestCase):
         data = response.json()
         self.assertEqual(data["count"], 0)
         self.assertEqual(data["results"], [])
+
+    @override_settings(EXPORT_CHUNK_SIZE=1)
+    def test_export_repository_issues(self):
+        self.err_issue.analyzer_check = "some-check"
+        self.err_issue.save()
+        url = reverse("repository-issues-export", kwargs={"repo_slug": "repo_slug"})
+        response = self.client.get(url + "?path=some/file")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertNotIn("Content-Encoding", response)
+        content = b"".join(response.streaming_content)
+        self.assertTrue(content.endswith(b"\n"))
+        self.assertEqual(
+            json.loads(content),
+            {
+                "id": str(self.err_issue.id),
+                "hash": ERR_HASH,
+                "analyzer": "",
+                "analyzer_check": "some-check",
+                "path": "some/file",
+                "level": "error",
+                "created": self.err_issue.created.isoformat(),
+                "message": None,
+            },
+        )
+
+    def test_export_repository_issues_gzip(self):
+        url = reverse("repository-issues-export", kwargs={"repo_slug": "repo_slug"})
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        lines = gzip.decompress(b"".join(response.streaming_content)).splitlines()
+        self.assertEqual(
+            [json.loads(line)["hash"] for line in lines], [ERR_HASH, WARN_HASH]
+        )
+
+    def test_export_repository_issues_wrong_values(self):
+        response = self.client.get(
+            reverse("repository-issues-export", kwargs={"repo_slug": "no"})
+            + "?date=yesterday"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.json(),
+            {
+                "repo_slug": [
+                    "invalid repo_slug path argument - No repository match this slug"
+                ],
+                "date": ["invalid date - should be YYYY-MM-DD"],
+            },
+        )
+
+    def test_known_issues(self):
+        known_url = reverse(
+            "repository-known-issues", kwargs={"repo_slug": "repo_slug"}
+        )
+        self.assertEqual(
+            self.client.get(known_url).json(),
+            {"path": None, "revision": None, "hashes": []},
+        )
+
+        # Only authenticated clients can refresh the known issues
+        refresh_url = reverse(
+            "revision-known-issues", kwargs={"revision_id": self.old_revision.id}
+        )
+        response = self.client.post(refresh_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_login(User.objects.create(username="ingestion"))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(refresh_url)
+        self.assertEqual(response.json(), {"refreshed": True, "known_issues": 1})
+        self.assertEqual(
+            self.client.get(known_url).json(),
+            {"path": None, "revision": self.old_revision.id, "hashes": [WARN_HASH]},
+        )
+
+        # The issues of the most recent revision replace the previous ones
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse(
+                    "revision-known-issues", kwargs={"revision_id": self.revision.id}
+                )
+            )
+        self.assertEqual(response.json(), {"refreshed": True, "known_issues": 2})
+        self.assertEqual(
+            self.client.get(known_url).json(),
+            {
+                "path": None,
+                "revision": self.revision.id,
+                "hashes": [ERR_HASH, WARN_HASH],
+            },
+        )
+
+        # An older revision does not replace them
+        response = self.client.post(refresh_url)
+        self.assertEqual(response.json(), {"refreshed": False, "known_issues": None})
+        self.assertEqual(
+            KnownIssue.objects.filter(revision=self.revision).count(),
+            KnownIssue.objects.count(),
+        )
+
+        # Issues of a path are listed with a single query, once the repository is found
+        self.client.logout()
+        with self.assertNumQueries(2):
+            response = self.client.get(known_url, {"path": "some/file"})
+        self.assertEqual(
+            response.json(),
+            {"path": "some/file", "revision": self.revision.id, "hashes": [ERR_HASH]},
+        )
+
+        response = self.client.get(
+            reverse("repository-known-issues", kwargs={"repo_slug": "unknown"})
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_directory_stats(self):
+        self.client.force_login(User.objects.create(username="ingestion"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse(
+                    "revision-known-issues", kwargs={"revision_id": self.revision.id}
+                )
+            )
+        self.client.logout()
+
+        url = reverse("repository-directories", kwargs={"repo_slug": "repo_slug"})
+        check = {"analyzer": "", "check": None}
+        self.assertEqual(
+            self.client.get(url).json(),
+            {
+                "path": "",
+                "checks": [{**check, "total": 2, "errors": 1}],
+                "directories": [{"path": "some", **check, "total": 2, "errors": 1}],
+            },
+        )
+
+        # Each level is listed with a single query, once the repository is found
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {"path": "some/"})
+        self.assertEqual(
+            response.json(),
+            {
+                "path": "some",
+                "checks": [{**check, "total": 2, "errors": 1}],
+                "directories": [
+                    {"path": "some/other", **check, "total": 1, "errors": 0}
+                ],
+            },
+        )
+        self.assertEqual(
+            self.client.get(url, {"path": "some/other"}).json(),
+            {
+                "path": "some/other",
+                "checks": [{**check, "total": 1, "errors": 0}],
+                "directories": [],
+            },
+        )
+
+        response = self.client.get(
+            reverse("repository-directories", kwargs={"repo_slug": "unknown"})
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
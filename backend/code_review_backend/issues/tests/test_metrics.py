@@ -0,0 +1,88 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from code_review_backend.app.metrics import registry
+from code_review_backend.issues.models import Repository
+
+
+class RequestMetricsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        Repository.objects.create(slug="myrepo", url="http://repo.test/myrepo")
+
+    def test_histograms(self):
+        with self.assertLogs("request.metrics") as logs:
+            response = self.client.get("/v1/repository/")
+        self.assertEqual(response.status_code, 200)
+
+        (record,) = logs.records
+        self.assertEqual(record.view, "repository-list")
+        self.assertEqual(record.status, 200)
+        # The count and the page of repositories
+        self.assertEqual(record.queries, 2)
+        self.assertEqual(record.size, len(response.content))
+
+        histograms = registry.histograms
+        self.assertEqual(histograms["request_queries"]["repository-list"].sum, 2)
+        self.assertEqual(
+            histograms["response_size_bytes"]["repository-list"].sum,
+            len(response.content),
+        )
+        self.assertEqual(
+            histograms["request_serialization_seconds"]["repository-list"].count, 1
+        )
+
+        with override_settings(METRICS_TOKEN="secret"):
+            response = self.client.get(
+                "/__metrics__", HTTP_AUTHORIZATION="Bearer secret"
+            )
+        self.assertEqual(response.status_code, 200)
+        lines = response.content.decode().splitlines()
+        self.assertIn("# TYPE request_queries histogram", lines)
+        self.assertIn('request_queries_bucket{view="repository-list",le="1"} 0', lines)
+        self.assertIn('request_queries_bucket{view="repository-list",le="2"} 1', lines)
+        self.assertIn(
+            'request_queries_bucket{view="repository-list",le="+Inf"} 1', lines
+        )
+        self.assertIn('request_queries_count{view="repository-list"} 1', lines)
+
+    def test_metrics_authentication(self):
+        # The endpoint is disabled without a token
+        self.assertEqual(self.client.get("/__metrics__").status_code, 404)
+
+        with override_settings(METRICS_TOKEN="secret"):
+            self.assertEqual(self.client.get("/__metrics__").status_code, 403)
+            response = self.client.get(
+                "/__metrics__", HTTP_AUTHORIZATION="Bearer another"
+            )
+            self.assertEqual(response.status_code, 403)
+
+    def test_slow_queries(self):
+        # Slow query log is disabled by default
+        with self.assertNoLogs("request.slow_query"):
+            self.client.get("/v1/repository/")
+
+        cache.clear()
+        with override_settings(SLOW_QUERY_THRESHOLD=-1, SLOW_QUERY_MAX_EXPLAINED=1):
+            with self.assertLogs("request.slow_query", level="WARNING") as logs:
+                self.client.get("/v1/repository/")
+        (record,) = logs.records
+        self.assertEqual(record.view, "repository-list")
+        self.assertIn("issues_repository", record.sql)
+        self.assertIsNotNone(record.plan)
+
+    def test_slow_queries_parameters(self):
+        # Values searched by users are neither logged with the query nor its plan
+        with override_settings(SLOW_QUERY_THRESHOLD=-1, SLOW_QUERY_MAX_EXPLAINED=10):
+            with self.assertLogs("request.slow_query", level="WARNING") as logs:
+                self.client.get("/v1/diff/", {"search": "secret-needle"})
+        self.assertTrue(logs.records)
+        for record in logs.records:
+            self.assertNotIn("secret-needle", record.sql)
+            self.assertNotIn("secret-needle", record.plan or "")
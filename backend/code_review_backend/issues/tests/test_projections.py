@@ -0,0 +1,108 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import hashlib
+
+from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from code_review_backend.issues.api import DiffViewSet, IssueViewSet
+from code_review_backend.issues.models import (
+    LEVEL_ERROR,
+    LEVEL_WARNING,
+    PROVIDER_GITHUB,
+    Issue,
+    IssueMessage,
+    Repository,
+)
+from code_review_backend.issues.projections import DiffProjection, IssueProjection
+from code_review_backend.issues.serializers import DiffFullSerializer, IssueSerializer
+
+
+class ProjectionTestCase(TestCase):
+    """
+    Projections must produce the same payloads as the serializers they replace
+    """
+
+    def setUp(self):
+        self.request = Request(APIRequestFactory().get("/v1/diff/"))
+        repo = Repository.objects.create(
+            slug="myrepo", url="https://github.com/owner/myrepo"
+        )
+        revisions = [
+            repo.head_revisions.create(
+                provider_id=12, title="Phabricator", base_repository=repo
+            ),
+            repo.head_revisions.create(
+                provider=PROVIDER_GITHUB,
+                provider_id=34,
+                title="Github",
+                base_repository=repo,
+                bugzilla_id=5678,
+                head_changeset="a" * 40,
+            ),
+            repo.head_revisions.create(title="Decision task", base_repository=repo),
+        ]
+        self.diffs = [
+            revision.diffs.create(
+                provider_id=f"PHID-DIFF-{index}",
+                review_task_id=f"task-{index}",
+                mercurial_hash=hashlib.sha1(str(index).encode()).hexdigest(),
+                repository=repo,
+            )
+            for index, revision in enumerate(revisions)
+        ]
+
+        messages = IssueMessage.objects.resolve(["Message ✓"])
+        for index, (level, in_patch) in enumerate(
+            [
+                (LEVEL_ERROR, True),
+                (LEVEL_ERROR, None),
+                (LEVEL_WARNING, False),
+                (LEVEL_WARNING, True),
+            ]
+        ):
+            issue = Issue.objects.create(
+                path=f"path/{index}",
+                level=level,
+                analyzer="analyzer",
+                analyzer_check="check" if index % 2 else None,
+                message_id=messages["Message ✓"] if index % 2 else None,
+                hash=hashlib.md5(str(index).encode()).hexdigest(),
+            )
+            revisions[0].issue_links.create(
+                issue=issue,
+                diff=self.diffs[0],
+                in_patch=in_patch,
+                new_for_revision=in_patch,
+                line=index or None,
+                nb_lines=2,
+            )
+
+    def get_queryset(self, viewset, **kwargs):
+        view = viewset(request=self.request, kwargs=kwargs, format_kwarg=None)
+        return view.filter_queryset(view.get_queryset())
+
+    def test_diffs(self):
+        queryset = self.get_queryset(DiffViewSet)
+        projection = DiffProjection(self.request)
+        self.assertEqual(
+            projection.project(projection.prepare(queryset)),
+            DiffFullSerializer(
+                queryset, many=True, context={"request": self.request}
+            ).data,
+        )
+
+    def test_issues(self):
+        queryset = self.get_queryset(
+            IssueViewSet, diff_provider_id=self.diffs[0].provider_id
+        )
+        projection = IssueProjection(self.request)
+        self.assertEqual(
+            projection.project(projection.prepare(queryset)),
+            IssueSerializer(
+                queryset, many=True, context={"request": self.request}
+            ).data,
+        )
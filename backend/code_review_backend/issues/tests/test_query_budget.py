@@ -0,0 +1,78 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import hashlib
+
+from django.contrib.auth.models import User
+
+from code_review_backend.issues.datasets import ANALYZERS, CHECKS
+from code_review_backend.issues.tests.budget import QueryBudgetTestCase
+
+
+class EndpointsQueryBudgetTestCase(QueryBudgetTestCase):
+    """
+    Budgets are the number of queries on PostgreSQL, where paginated listings
+    also estimate their total count
+    """
+
+    def test_list_diffs(self):
+        self.assertQueryBudget(lambda dataset: self.client.get("/v1/diff/"), 3)
+
+    def test_list_diff_issues(self):
+        self.assertQueryBudget(
+            lambda dataset: self.client.get(
+                f"/v1/diff/{dataset.diffs[0].provider_id}/issues/"
+            ),
+            3,
+        )
+
+    def test_revision_details(self):
+        self.assertQueryBudget(
+            lambda dataset: self.client.get(
+                f"/v1/revision/{dataset.revisions[0].id}/details/", {"issues": "true"}
+            ),
+            3,
+        )
+
+    def test_check_details(self):
+        self.assertQueryBudget(
+            lambda dataset: self.client.get(
+                f"/v1/check/{dataset.repository.slug}/{ANALYZERS[0]}/{CHECKS[0]}/",
+                {"publishable": "all"},
+            ),
+            4,
+        )
+
+    def test_check_stats(self):
+        self.assertQueryBudget(lambda dataset: self.client.get("/v1/check/stats/"), 2)
+        self.assertQueryBudget(
+            lambda dataset: self.client.get("/v1/check/stats/compact/"), 1
+        )
+
+    def test_create_issues_bulk(self):
+        def create_issues(dataset):
+            diff = dataset.diffs[0]
+            # As many new issues as there are issues on each diff of the dataset
+            issues = [
+                {
+                    "hash": hashlib.md5(f"new-{index}".encode()).hexdigest(),
+                    "analyzer": ANALYZERS[index % len(ANALYZERS)],
+                    "check": CHECKS[index % len(CHECKS)],
+                    "level": "warning",
+                    "path": f"dir/file-{index}.cpp",
+                    "line": index,
+                    "message": f"New message {index}",
+                    "in_patch": True,
+                    "new_for_revision": True,
+                }
+                for index in range(len(dataset.diffs))
+            ]
+            return self.client.post(
+                f"/v1/revision/{diff.revision_id}/issues/",
+                {"diff_provider_id": diff.provider_id, "issues": issues},
+                format="json",
+            )
+
+        self.client.force_authenticate(user=User.objects.create(username="bot"))
+        self.assertQueryBudget(create_issues, 9)
@@ -0,0 +1,57 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import io
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from code_review_backend.issues.parsers import ORJSONParser
+from code_review_backend.issues.renderers import ORJSONRenderer
+
+
+class ORJSONTestCase(SimpleTestCase):
+    def test_render_same_as_drf(self):
+        data = {
+            "id": uuid.UUID("d5b3c2a0-52a4-4e0e-9e6f-2b0e2b4f0d7a"),
+            "created": datetime(2020, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc),
+            "naive": datetime(2020, 1, 2, 3, 4, 5),
+            "date": date(2020, 1, 2),
+            "ratio": Decimal("0.25"),
+            "label": gettext_lazy("Unicode ✓"),
+            "message": "Line\u2028Paragraph\u2029",
+            "counts": {1: [True, None, 1.5]},
+        }
+        content = ORJSONRenderer().render(data, "application/json")
+        self.assertEqual(content, JSONRenderer().render(data, "application/json"))
+        self.assertEqual(
+            content,
+            b'{"id":"d5b3c2a0-52a4-4e0e-9e6f-2b0e2b4f0d7a",'
+            b'"created":"2020-01-02T03:04:05.678901Z","naive":"2020-01-02T03:04:05",'
+            b'"date":"2020-01-02","ratio":0.25,"label":"Unicode \xe2\x9c\x93",'
+            b'"message":"Line\\u2028Paragraph\\u2029",'
+            b'"counts":{"1":[true,null,1.5]}}',
+        )
+
+    def test_render_indent(self):
+        data = {"results": []}
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+        self.assertEqual(
+            ORJSONRenderer().render(data, "application/json; indent=4"),
+            b'{\n    "results": []\n}',
+        )
+
+    def test_parse(self):
+        parser = ORJSONParser()
+        self.assertEqual(
+            parser.parse(io.BytesIO('{"message": "Unicode ✓"}'.encode())),
+            {"message": "Unicode ✓"},
+        )
+        with self.assertRaisesMessage(ParseError, "JSON parse error"):
+            parser.parse(io.BytesIO(b'{"message": NaN}'))
@@ -2,10 +2,19 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import hashlib
+
 from django.conf import settings
+from rest_framework import status
 from rest_framework.test import APITestCase
 
-from code_review_backend.issues.models import Repository, Revision
+from code_review_backend.issues.models import (
+    LEVEL_ERROR,
+    LEVEL_WARNING,
+    Issue,
+    Repository,
+    Revision,
+)
 
 
 class RevisionAPITestCase(APITestCase):
@@ -34,3 +43,63 @@ class RevisionAPITestCase(APITestCase):
         # Override host with complex url
         settings.PHABRICATOR_HOST = "http://anotherphab.test/api123/?custom"
         self.assertEqual(rev.url, "http://anotherphab.test/D12")
+
+    def test_details(self):
+        revision = Revision.objects.create(
+            provider="phabricator",
+            provider_id=34,
+            title="Some revision",
+            base_repository=self.repo,
+            head_repository=self.repo,
+        )
+        diffs = [
+            revision.diffs.create(
+                provider_id=f"PHID-DIFF-{index}",
+                review_task_id=f"task-{index}",
+                mercurial_hash=str(index) * 40,
+                repository=self.repo,
+            )
+            for index in range(3)
+        ]
+        for index, level in enumerate((LEVEL_ERROR, LEVEL_WARNING, LEVEL_WARNING)):
+            issue = Issue.objects.create(
+                path=f"path/{index}",
+                level=level,
+                analyzer="analyzer",
+                hash=hashlib.md5(str(index).encode()).hexdigest(),
+            )
+            for diff in diffs[: index + 1]:
+                revision.issue_links.create(
+                    issue=issue, diff=diff, in_patch=bool(index % 2), line=index
+                )
+
+        url = f"/v1/revision/{revision.id}/details/"
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data["id"], revision.id)
+        self.assertEqual(data["url"], revision.url)
+        self.assertListEqual(
+            [
+                (diff["provider_id"], diff["nb_issues"], diff["nb_errors"])
+                for diff in data["diffs"]
+            ],
+            [("PHID-DIFF-0", 3, 1), ("PHID-DIFF-1", 2, 0), ("PHID-DIFF-2", 1, 0)],
+        )
+        self.assertNotIn("issues", data["diffs"][0])
+
+        # Diffs and issues are the same as the ones of the separate endpoints
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {"issues": "true"})
+        for diff in response.json()["diffs"]:
+            issues = diff.pop("issues")
+            self.assertEqual(
+                issues, self.client.get(diff["issues_url"]).json()["results"]
+            )
+            expected = self.client.get(f"/v1/diff/{diff['id']}/").json()
+            del expected["revision"]
+            self.assertEqual(diff, expected)
+
+        response = self.client.get("/v1/revision/0/details/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
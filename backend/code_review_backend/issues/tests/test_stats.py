@@ -8,14 +8,20 @@ import uuid
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from code_review_backend.issues.models import Issue, IssueLink, Repository
+from code_review_backend.issues.tests import shared_cache
 
 
+@shared_cache()
 class StatsAPITestCase(APITestCase):
     def setUp(self):
+        # Responses of the check endpoints depend on the random issues of each test
+        cache.clear()
+
         # Create a user
         self.user = User.objects.create(username="crash_user")
 
@@ -262,3 +268,52 @@ class StatsAPITestCase(APITestCase):
             return True
 
         self.assertTrue(all(map(check_issue, data["results"])))
+
+    def test_details_hash(self):
+        """
+        Check issue hashes are listed as MD5 hexadecimal digests on both paginations
+        """
+        hashes = {
+            issue.hash.hex
+            for issue in Issue.objects.filter(
+                issue_links__revision__head_repository=self.repo_try,
+                analyzer="analyzer-X",
+                analyzer_check="check-1",
+            )
+        }
+        for params in ("publishable=all", "publishable=all&page_size=100"):
+            response = self.client.get(
+                f"/v1/check/myrepo-try/analyzer-X/check-1/?{params}"
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                {issue["hash"] for issue in response.json()["results"]}, hashes
+            )
+
+    def test_stats_compact(self):
+        """
+        Check the compact stats hold the same values as the paginated ones
+        """
+        with self.assertNumQueries(1):
+            response = self.client.get("/v1/check/stats/compact/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(
+            data["columns"], ["repository", "analyzer", "check", "total", "publishable"]
+        )
+        self.assertListEqual(
+            [dict(zip(data["columns"], row)) for row in data["rows"]],
+            self.client.get("/v1/check/stats/").json()["results"],
+        )
+        self.assertListEqual(
+            data["rows"][:2],
+            [
+                ["myrepo-try", "analyzer-X", "check-1", 34, 0],
+                ["myrepo-try", "analyzer-X", "check-1000", 34, 0],
+            ],
+        )
+
+        # The response is cached
+        with self.assertNumQueries(0):
+            response = self.client.get("/v1/check/stats/compact/")
+        self.assertEqual(response.json(), data)
@@ -10,4 +10,7 @@ python /src/backend/docker/wait_for_db.py
 # Run the migrations
 ./manage.py migrate --noinput
 
+# Create the table used by the database cache backend, when configured
+./manage.py createcachetable
+
 gunicorn code_review_backend.app.wsgi
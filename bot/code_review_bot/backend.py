@@ -2,6 +2,8 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import json
+import time
 import urllib.parse
 
 import requests
@@ -9,6 +11,7 @@ import structlog
 
 from code_review_bot import taskcluster
 from code_review_bot.config import GetAppUserAgent, settings
+from code_review_bot.profiling import profiler
 from code_review_bot.revisions import PhabricatorRevision
 from code_review_bot.tasks.lint import MozLintIssue
 
@@ -101,17 +104,21 @@ class BackendAPI:
     def publish_issues(self, issues, revision):
         """
         Publish all issues on the backend in bulk.
+        Returns the number of published issues, or None when the backend
+        failed to store some of them.
         """
         if not self.enabled:
             logger.warn("Skipping issues publication on backend")
             return
 
-        published = 0
+        published, failed = 0, 0
         assert (
             revision.issues_url is not None
         ), "Missing issues_url on the revision to publish issues in bulk."
 
         logger.info(f"Publishing issues in bulk of {settings.bulk_issue_chunks} items.")
+        # Chunks queued by the backend, as couples of (<valid_data>, <status_url>)
+        queued = []
         chunks = (
             issues[i : i + settings.bulk_issue_chunks]
             for i in range(0, len(issues), settings.bulk_issue_chunks)
@@ -120,22 +127,25 @@ class BackendAPI:
             # Store valid data as couples of (<issue>, <json_data>)
             valid_data = []
             # Build issues' payload for that given chunk
-            for issue in issues_chunk:
-                if (
-                    isinstance(issue, MozLintIssue)
-                    and issue.linter == "rust"
-                    and issue.path == "."
-                ):
-                    # Silently ignore issues with path "." from rustfmt, as they cannot be published
-                    # https://github.com/mozilla/code-review/issues/1577
-                    continue
-                if issue.hash is None:
-                    logger.warning(
-                        "Missing issue hash, cannot publish on backend",
-                        issue=str(issue),
-                    )
-                    continue
-                valid_data.append((issue, issue.as_dict()))
+            # Hashes are built there, reading the files of the issues
+            with profiler.span("hash_issues") as span:
+                span.add_items(len(issues_chunk))
+                for issue in issues_chunk:
+                    if (
+                        isinstance(issue, MozLintIssue)
+                        and issue.linter == "rust"
+                        and issue.path == "."
+                    ):
+                        # Silently ignore issues with path "." from rustfmt, as they cannot be published
+                        # https://github.com/mozilla/code-review/issues/1577
+                        continue
+                    if issue.hash is None:
+                        logger.warning(
+                            "Missing issue hash, cannot publish on backend",
+                            issue=str(issue),
+                        )
+                        continue
+                    valid_data.append((issue, issue.as_dict()))
 
             if not valid_data:
                 # May happen when a series of issues are missing a hash
@@ -149,18 +159,29 @@ class BackendAPI:
             response = self.create(
                 revision.issues_url,
                 {"issues": [json_data for _, json_data in valid_data]},
+                headers=(
+                    {"Prefer": "respond-async"}
+                    if settings.backend_async_ingestion
+                    else None
+                ),
             )
             if response is None:
                 # Backend rejected the payload, nothing more to do.
+                failed += len(valid_data)
+                continue
+            if response.get("status") is not None:
+                # Issues are created by the backend worker, wait for all chunks at once
+                queued.append((valid_data, response["url"]))
                 continue
-            created = response.get("issues")
 
-            assert created and len(created) == len(valid_data)
-            for (issue, _), return_value in zip(valid_data, created):
-                # Set the returned value on each issue
-                issue.on_backend = return_value
+            published += self.set_on_backend(valid_data, response.get("issues"))
 
-            published += len(valid_data)
+        for valid_data, status_url in queued:
+            response = self.wait_bulk_request(status_url)
+            if response is None:
+                failed += len(valid_data)
+                continue
+            published += self.set_on_backend(valid_data, response.get("issues"))
 
         total = len(issues)
         if published < total:
@@ -170,8 +191,63 @@ class BackendAPI:
         else:
             logger.info("Published all issues on backend", nb=published)
 
+        if failed:
+            logger.warn("Backend failed to store issues", failed=failed)
+            return None
         return published
 
+    def set_on_backend(self, valid_data, created):
+        """
+        Set the values returned by the backend on each published issue
+        """
+        assert created and len(created) == len(valid_data)
+        for (issue, _), return_value in zip(valid_data, created):
+            issue.on_backend = return_value
+        return len(valid_data)
+
+    def wait_bulk_request(self, url):
+        """
+        Poll the status of issues queued by the backend, until they are created.
+        The issues are already queued, so errors are retried until the deadline.
+        """
+        auth = (self.username, self.password)
+        deadline = time.monotonic() + settings.backend_async_timeout
+        delay = 0.5
+        while True:
+            try:
+                resp = requests.get(url, auth=auth, headers=GetAppUserAgent())
+                resp.raise_for_status()
+                data = resp.json()
+            except (requests.RequestException, ValueError) as e:
+                logger.warn("Failed to poll queued issues", url=url, error=str(e))
+            else:
+                if data["status"] == "done":
+                    return data
+                if data["status"] == "failed":
+                    logger.warn("Backend failed to create issues", error=data["error"])
+                    return None
+            if time.monotonic() > deadline:
+                logger.warn(
+                    "Timed out waiting for the backend to create issues", url=url
+                )
+                return None
+            time.sleep(delay)
+            delay = min(delay * 2, 10)
+
+    def compare_diffs(self, diff_phid, previous_diff_phid):
+        """
+        Compare the issues published on a diff to the ones of a previous diff
+        Returns the hashes of the unresolved, closed and new issues
+        """
+        url = urllib.parse.urljoin(
+            self.url, f"/v1/diff/{diff_phid}/compare/{previous_diff_phid}/"
+        )
+        resp = requests.get(
+            url, auth=(self.username, self.password), headers=GetAppUserAgent()
+        )
+        resp.raise_for_status()
+        return resp.json()
+
     def list_diff_issues(self, diff_id):
         """
         List issues for a given diff
@@ -181,9 +257,15 @@ class BackendAPI:
     def paginate(self, url_path):
         """
         Yield results from a paginated API one by one
+        Requesting a page size makes the backend use its keyset pagination,
+        so the next pages are reached by following the returned cursors.
         """
         auth = (self.username, self.password)
-        next_url = urllib.parse.urljoin(self.url, url_path)
+        url = urllib.parse.urlparse(urllib.parse.urljoin(self.url, url_path))
+        query = urllib.parse.parse_qsl(url.query) + [
+            ("page_size", settings.backend_page_size)
+        ]
+        next_url = url._replace(query=urllib.parse.urlencode(query)).geturl()
 
         # Iterate until there is no page left or a status error happen
         while next_url:
@@ -193,7 +275,7 @@ class BackendAPI:
             yield from data.get("results", [])
             next_url = data.get("next")
 
-    def create(self, url_path, data):
+    def create(self, url_path, data, headers=None):
         """
         Make an authenticated POST request on the backend
         Check that the requested item does not already exists on the backend
@@ -213,7 +295,10 @@ class BackendAPI:
         # Create the requested item
         url_post = urllib.parse.urljoin(self.url, url_path)
         response = requests.post(
-            url_post, headers=GetAppUserAgent(), json=data, auth=auth
+            url_post,
+            headers={**GetAppUserAgent(), **(headers or {})},
+            json=data,
+            auth=auth,
         )
         if not response.ok:
             logger.warn(f"Backend rejected the payload: {response.content}")
@@ -222,6 +307,46 @@ class BackendAPI:
         logger.info("Created item on backend", url=url_post, id=out.get("id"))
         return out
 
+    def refresh_known_issues(self, revision):
+        """
+        Use the issues published on an ingested revision as the known issues of its repository
+        """
+        if not self.enabled:
+            logger.warn("Skipping known issues refresh on backend")
+            return
+
+        url = urllib.parse.urljoin(
+            self.url, f"/v1/revision/{revision.id}/known-issues/"
+        )
+        response = requests.post(
+            url, auth=(self.username, self.password), headers=GetAppUserAgent()
+        )
+        response.raise_for_status()
+        out = response.json()
+        if out["refreshed"]:
+            logger.info("Refreshed known issues", nb=out["known_issues"])
+        else:
+            logger.info("Known issues come from a more recent revision, not refreshed")
+        return out
+
+    def list_known_issues(self, repo_slug, path):
+        """
+        List the hashes of the issues currently known on a path of a repository,
+        or None when the backend has no known issues for that repository
+        """
+        url = urllib.parse.urljoin(
+            self.url,
+            f"/v1/issues/{repo_slug}/known/?{urllib.parse.urlencode({'path': path})}",
+        )
+        response = requests.get(
+            url, auth=(self.username, self.password), headers=GetAppUserAgent()
+        )
+        response.raise_for_status()
+        data = response.json()
+        if data["revision"] is None:
+            return None
+        return set(data["hashes"])
+
     def list_repo_issues(
         self, repo_slug, date=None, revision_changeset=None, path=None
     ):
@@ -229,6 +354,7 @@ class BackendAPI:
         List issues detected from a specific repository.
         Optional `date` and `revision_id` parameters can be used to look for a
         specific revision (defaults to the revision closest to the given date).
+        Issues are streamed by the backend as newline-delimited JSON, in a single request.
         """
         params = {
             key: value
@@ -239,6 +365,16 @@ class BackendAPI:
             )
             if value is not None
         }
-        return list(
-            self.paginate(f"/v1/issues/{repo_slug}/?{urllib.parse.urlencode(params)}")
+        url = urllib.parse.urljoin(
+            self.url,
+            f"/v1/issues/{repo_slug}/export/?{urllib.parse.urlencode(params)}",
         )
+        # Lines are decompressed by requests when the backend uses gzip
+        with requests.get(
+            url,
+            auth=(self.username, self.password),
+            headers=GetAppUserAgent(),
+            stream=True,
+        ) as resp:
+            resp.raise_for_status()
+            return [json.loads(line) for line in resp.iter_lines() if line]
@@ -0,0 +1,461 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Run the bot workflow offline, against a recorded run or a synthetic task group,
+and report its wall time, CPU time, peak memory and the profile of its phases.
+"""
+
+import argparse
+import collections
+import json
+import os
+import random
+import re
+import resource
+import sys
+import time
+import urllib.parse
+from datetime import datetime, timezone
+from pathlib import Path
+
+import structlog
+from libmozdata.phabricator import PhabricatorAPI
+from taskcluster import Index, Queue
+
+from code_review_bot import taskcluster
+from code_review_bot.config import settings
+from code_review_bot.profiling import profiler
+from code_review_bot.replay import Replayer, build_exchange, load_archive
+from code_review_bot.revisions import PhabricatorRevision, Revision
+from code_review_bot.tools.libmozdata import setup as setup_libmozdata
+from code_review_bot.tools.log import init_logger
+from code_review_bot.workflow import Workflow
+
+logger = structlog.get_logger(__name__)
+
+REPORT_VERSION = 1
+
+# Group environment variables used by the settings, by workflow mode
+MODES = {
+    "run": ("TRY_TASK_ID", "TRY_TASK_GROUP_ID"),
+    "ingest": ("GENERIC_TASK_GROUP_ID",),
+}
+
+# Services used by a synthetic task group, never reached as requests are replayed
+SYNTHETIC_ROOT_URL = "https://taskcluster.benchmark.test"
+SYNTHETIC_BACKEND_URL = "https://backend.benchmark.test"
+SYNTHETIC_PHABRICATOR_URL = "https://phabricator.benchmark.test/api/"
+SYNTHETIC_REPOSITORIES = [
+    {
+        "url": "https://hg.mozilla.org/mozilla-central",
+        "decision_env_prefix": "GECKO",
+        "checkout": "robust",
+        "try_url": "ssh://hg.mozilla.org/try",
+        "try_name": "try",
+        "name": "mozilla-central",
+        "ssh_user": "reviewbot@mozilla.com",
+    }
+]
+LINTERS = ("eslint", "flake8", "clippy", "stylelint", "codespell", "rustfmt")
+LEVELS = ("warning", "warning", "warning", "error")
+
+
+class SyntheticTaskGroup:
+    """
+    Stand-ins for Taskcluster, HGMO and the backend serving a large task group
+    of mozlint tasks, finding `issues` issues in total across `tasks` tasks on
+    `files` files of `lines` lines. Each request waits for `latency` seconds,
+    plus the transfer of its content at `bandwidth` bytes per second.
+    """
+
+    def __init__(
+        self,
+        tasks=300,
+        issues=100_000,
+        files=2000,
+        lines=500,
+        latency=0.02,
+        bandwidth=10 * 1024 * 1024,
+        seed=0,
+    ):
+        self.group_id = "SyntheticGroup"
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.lines = lines
+        self.random = random.Random(seed)
+        self.seed = seed
+
+        self.files = [
+            f"synthetic/dir{index % 50}/file{index}.js" for index in range(files)
+        ]
+        self.tasks = {}
+        for index in range(tasks):
+            task_id = f"SyntheticTask{index:05d}"
+            self.tasks[task_id] = {
+                "status": {
+                    "taskId": task_id,
+                    "state": "completed",
+                    "runs": [{"runId": 0}],
+                },
+                "task": {
+                    "metadata": {
+                        "name": f"source-test-mozlint-{LINTERS[index % len(LINTERS)]}-{index}"
+                    }
+                },
+            }
+
+        # Split issues across tasks, a few tasks finding most of them
+        weights = [self.random.paretovariate(1.5) for _ in range(tasks)]
+        total = sum(weights)
+        self.nb_issues = {
+            task_id: int(issues * weight / total)
+            for task_id, weight in zip(self.tasks, weights)
+        }
+        first = next(iter(self.nb_issues), None)
+        if first is not None:
+            self.nb_issues[first] += issues - sum(self.nb_issues.values())
+
+        self.backend_issues = 0
+
+    @property
+    def decision_task(self):
+        return {
+            "payload": {
+                "env": {
+                    "GECKO_BASE_REPOSITORY": "https://hg.mozilla.org/mozilla-unified",
+                    "GECKO_HEAD_REPOSITORY": "https://hg.mozilla.org/integration/autoland",
+                    "GECKO_HEAD_REV": "deadbeef" * 5,
+                    "GECKO_BASE_REV": "beefdead" * 5,
+                }
+            }
+        }
+
+    @property
+    def handlers(self):
+        return [
+            (
+                re.compile(r"/api/queue/v1/task-group/([^/]+)/list"),
+                self.list_task_group,
+            ),
+            (
+                re.compile(r"/api/queue/v1/task/([^/]+)/runs/(\d+)/artifacts/"),
+                self.artifact,
+            ),
+            (re.compile(r"/raw-file/([^/]+)/(.+)$"), self.raw_file),
+            (re.compile(r"/v1/revision/$"), self.backend_revision),
+            (re.compile(r"/v1/revision/(\d+)/issues/$"), self.backend_issues_bulk),
+            (re.compile(r"/v1/revision/(\d+)/known-issues/$"), self.backend_known),
+        ]
+
+    def exchange(self, request, content, status=200):
+        return build_exchange(
+            request, content, status, latency=self.latency, bandwidth=self.bandwidth
+        )
+
+    def list_task_group(self, request, match):
+        # Taskcluster lists up to 1000 tasks per page
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(request.url).query)
+        page = int(query.get("continuationToken", ["0"])[0])
+        tasks = list(self.tasks.values())
+        out = {
+            "taskGroupId": match.group(1),
+            "tasks": tasks[page * 1000 : (page + 1) * 1000],
+        }
+        if (page + 1) * 1000 < len(tasks):
+            out["continuationToken"] = str(page + 1)
+        return self.exchange(request, out)
+
+    def artifact(self, request, match):
+        task_id = match.group(1)
+        if task_id not in self.tasks:
+            return self.exchange(request, {"code": "ResourceNotFound"}, 404)
+
+        # Issues of a task are always the same, whatever the order of the requests
+        rand = random.Random(f"{self.seed}-{task_id}")
+        linter = self.tasks[task_id]["task"]["metadata"]["name"].split("-")[3]
+        issues = collections.defaultdict(list)
+        for index in range(self.nb_issues[task_id]):
+            path = rand.choice(self.files)
+            issues[path].append(
+                {
+                    "path": path,
+                    "column": rand.randint(1, 80),
+                    "level": rand.choice(LEVELS),
+                    "lineno": rand.randint(1, self.lines),
+                    "linter": linter,
+                    "message": f"Synthetic {linter} message {index % 20}",
+                    "rule": f"{linter}-rule-{rand.randint(1, 30)}",
+                }
+            )
+        return self.exchange(request, issues)
+
+    def raw_file(self, request, match):
+        path = match.group(2)
+        content = "\n".join(
+            f"synthetic line {line} of {path}" for line in range(1, self.lines + 1)
+        )
+        return self.exchange(request, content.encode("utf-8"))
+
+    def backend_revision(self, request, match):
+        payload = json.loads(request.body)
+        base = f"{SYNTHETIC_BACKEND_URL}/v1/revision/1"
+        payload.update(
+            {
+                "id": 1,
+                "diffs_url": f"{base}/diffs/",
+                "issues_bulk_url": f"{base}/issues/",
+            }
+        )
+        return self.exchange(request, payload, 201)
+
+    def backend_issues_bulk(self, request, match):
+        payload = json.loads(request.body)
+        for issue in payload["issues"]:
+            self.backend_issues += 1
+            issue["id"] = f"synthetic-issue-{self.backend_issues}"
+        return self.exchange(request, payload, 201)
+
+    def backend_known(self, request, match):
+        return self.exchange(
+            request, {"refreshed": True, "known_issues": self.backend_issues}
+        )
+
+
+def parse_cli(args=None):
+    """
+    Setup CLI options parser
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Mozilla Code Review Bot workflow offline"
+    )
+    parser.add_argument(
+        "--archive",
+        help="Archive of a run recorded with code-review-bot --record, "
+        "replayed instead of a synthetic task group",
+        type=Path,
+    )
+    parser.add_argument(
+        "--latency-factor",
+        help="Multiply the recorded duration of every exchange",
+        type=float,
+        default=1.0,
+    )
+    parser.add_argument(
+        "--tasks", help="Number of tasks of a synthetic group", type=int, default=300
+    )
+    parser.add_argument(
+        "--issues",
+        help="Number of issues found in a synthetic group",
+        type=int,
+        default=100_000,
+    )
+    parser.add_argument(
+        "--files",
+        help="Number of files with issues in a synthetic group",
+        type=int,
+        default=2000,
+    )
+    parser.add_argument(
+        "--latency",
+        help="Latency of synthetic requests, in milliseconds",
+        type=float,
+        default=20,
+    )
+    parser.add_argument(
+        "--bandwidth",
+        help="Bandwidth of synthetic requests, in megabytes per second",
+        type=float,
+        default=10,
+    )
+    parser.add_argument(
+        "--seed", help="Seed of the synthetic group", type=int, default=0
+    )
+    parser.add_argument(
+        "--mercurial-repository",
+        help="Optional path to a mercurial repository used to build issues' hashes, "
+        "when the recorded run did not download files from HGMO",
+        type=Path,
+        default=None,
+    )
+    parser.add_argument(
+        "--output", help="Path of the JSON report", type=Path, default="benchmark.json"
+    )
+    return parser.parse_args(args)
+
+
+def setup_settings(mode, group, metadata, mercurial_repository=None):
+    """
+    Configure the settings as a local run of the recorded mode
+    """
+    for name in {name for names in MODES.values() for name in names}:
+        os.environ.pop(name, None)
+    for name, value in zip(MODES[mode], group):
+        os.environ[name] = value
+    settings.try_task_id = settings.try_group_id = settings.generic_group_id = None
+    settings.setup(
+        metadata.get("app_channel", "benchmark"),
+        metadata.get("allowed_paths", ["*"]),
+        metadata.get("repositories", SYNTHETIC_REPOSITORIES),
+        mercurial_cache=mercurial_repository,
+    )
+
+    # Backend credentials are never recorded
+    taskcluster.secrets = {"backend": {}}
+    if metadata.get("backend_url"):
+        taskcluster.secrets["backend"] = {
+            "url": metadata["backend_url"],
+            "username": "benchmark",
+            "password": "benchmark",
+        }
+
+
+def benchmark(args):
+    """
+    Run the workflow offline with the given CLI options, and write its report
+    """
+    if args.archive:
+        exchanges, metadata = load_archive(args.archive)
+        mode = metadata.get("mode")
+        assert (
+            mode in MODES
+        ), f"Only ingestion and try runs can be benchmarked, not {mode}"
+        group = metadata["group"]
+        replayer = Replayer(exchanges, latency_factor=args.latency_factor)
+        logger.info("Loaded recorded run", nb=len(exchanges), mode=mode)
+    else:
+        synthetic = SyntheticTaskGroup(
+            tasks=args.tasks,
+            issues=args.issues,
+            files=args.files,
+            latency=args.latency / 1000,
+            bandwidth=args.bandwidth * 1024 * 1024,
+            seed=args.seed,
+        )
+        mode, group = "ingest", [synthetic.group_id]
+        metadata = {
+            "root_url": SYNTHETIC_ROOT_URL,
+            "backend_url": SYNTHETIC_BACKEND_URL,
+            "phabricator_url": SYNTHETIC_PHABRICATOR_URL,
+            "zero_coverage_enabled": False,
+        }
+        replayer = Replayer(handlers=synthetic.handlers)
+
+    setup_settings(mode, group, metadata, args.mercurial_repository)
+    # Taskcluster services without credentials, as they are never recorded
+    options = {"rootUrl": metadata["root_url"]}
+    queue_service = Queue(options)
+    phabricator_api = PhabricatorAPI("api-benchmark", metadata["phabricator_url"])
+
+    def load_revision():
+        if args.archive is None:
+            return PhabricatorRevision.from_decision_task(
+                synthetic.decision_task, phabricator_api
+            )
+        elif mode == "ingest":
+            return PhabricatorRevision.from_decision_task(
+                queue_service.task(group[0]), phabricator_api
+            )
+        return Revision.from_try_task(
+            queue_service.task(group[0]), queue_service.task(group[1]), phabricator_api
+        )
+
+    # Nothing is published on Phabricator, nor on reporters
+    workflow = Workflow(
+        {},
+        Index(options),
+        queue_service,
+        phabricator_api,
+        zero_coverage_enabled=metadata.get("zero_coverage_enabled", False),
+        update_build=False,
+    )
+    profiler.reset()
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    with replayer:
+        # Count the transfers of the replayed responses
+        profiler.start()
+        try:
+            with profiler.span("load_revision"):
+                revision = load_revision()
+            if mode == "ingest":
+                workflow.ingest_revision(revision, group[0])
+            else:
+                workflow.run(revision)
+        finally:
+            profiler.stop()
+    wall = time.perf_counter() - start
+    end_usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    report = {
+        "version": REPORT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "source": str(args.archive) if args.archive else "synthetic",
+        "mode": mode,
+        "options": {
+            key: getattr(args, key)
+            for key in (
+                ("latency_factor",)
+                if args.archive
+                else ("tasks", "issues", "files", "latency", "bandwidth", "seed")
+            )
+        },
+        "wall_s": round(wall, 3),
+        "cpu_s": round(
+            end_usage.ru_utime + end_usage.ru_stime - usage.ru_utime - usage.ru_stime,
+            3,
+        ),
+        # Maximum resident set size of the whole process, in kilobytes on Linux
+        "peak_rss_mb": round(end_usage.ru_maxrss / 1024, 1),
+        "http": {
+            "requests": replayer.requests,
+            "bytes": replayer.bytes,
+            "latency_s": round(replayer.latency, 3),
+            "unused": replayer.left,
+        },
+        "phases": profiler.as_dict()["phases"],
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    logger.info(
+        "Benchmark done",
+        wall=report["wall_s"],
+        cpu=report["cpu_s"],
+        peak_rss_mb=report["peak_rss_mb"],
+        requests=replayer.requests,
+        output=str(args.output),
+    )
+    log_phases(report["phases"])
+    return report
+
+
+def log_phases(phases, parent=None):
+    """
+    Log the profile of every phase, nested phases being named after their parents
+    """
+    for phase in phases:
+        name = f"{parent}/{phase['name']}" if parent else phase["name"]
+        logger.info(
+            f"Phase {name}",
+            **{
+                key: value
+                for key, value in phase.items()
+                if key not in ("name", "children")
+            },
+        )
+        log_phases(phase["children"], name)
+
+
+def main():
+    args = parse_cli()
+    init_logger("bot", channel="benchmark")
+    setup_libmozdata("code-review-bot")
+    benchmark(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
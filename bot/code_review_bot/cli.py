@@ -3,6 +3,7 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import argparse
+import atexit
 import os
 import sys
 from pathlib import Path
@@ -25,6 +26,8 @@ from code_review_bot import (
     taskcluster,
 )
 from code_review_bot.config import settings
+from code_review_bot.profiling import profiler
+from code_review_bot.replay import Recorder
 from code_review_bot.report import get_reporters
 from code_review_bot.revisions import PhabricatorRevision, Revision
 from code_review_bot.tools.libmozdata import setup as setup_libmozdata
@@ -71,6 +74,13 @@ def parse_cli():
         type=Path,
         default=None,
     )
+    parser.add_argument(
+        "--record",
+        help="Record every HTTP exchange of the run in a compressed archive, "
+        "to replay it offline with code-review-bot-benchmark",
+        type=Path,
+        default=None,
+    )
     parser.add_argument("--taskcluster-client-id", help="Taskcluster Client ID")
     parser.add_argument("--taskcluster-access-token", help="Taskcluster Access token")
     return parser.parse_args()
@@ -79,6 +89,17 @@ def parse_cli():
 @stats.timer("runtime.analysis")
 def main():
     args = parse_cli()
+
+    # Record the exchanges of the whole run, until the process exits
+    recorder = None
+    if args.record:
+        recorder = Recorder(args.record)
+        recorder.start()
+        atexit.register(recorder.stop)
+
+    # Count the HTTP transfers of each phase
+    profiler.start()
+
     taskcluster.auth(args.taskcluster_client_id, args.taskcluster_access_token)
 
     taskcluster.load_secrets(
@@ -164,6 +185,26 @@ def main():
             ]
             reporters["lando"].setup_api(lando_api)
 
+    # Store what is needed to replay the run, without any credential
+    if recorder is not None:
+        if settings.generic_group_id:
+            mode, group = "ingest", [settings.generic_group_id]
+        elif settings.phabricator_build_target:
+            mode, group = "analysis", [settings.phabricator_build_target]
+        else:
+            mode, group = "run", [settings.try_task_id, settings.try_group_id]
+        recorder.metadata.update(
+            mode=mode,
+            group=group,
+            app_channel=taskcluster.secrets["APP_CHANNEL"],
+            allowed_paths=taskcluster.secrets["ALLOWED_PATHS"],
+            repositories=taskcluster.secrets["repositories"],
+            zero_coverage_enabled=taskcluster.secrets["ZERO_COVERAGE_ENABLED"],
+            root_url=queue_service.options["rootUrl"],
+            phabricator_url=phabricator["url"],
+            backend_url=taskcluster.secrets.get("backend", {}).get("url"),
+        )
+
     # We need Phabricator API to list black-listed users
     settings.load_user_blacklist(taskcluster.secrets["user_blacklist"], phabricator_api)
 
@@ -275,6 +316,13 @@ def main():
 
         # Then raise to mark task as erroneous
         raise
+    finally:
+        # Write the profile of the run next to its report, even when it failed,
+        # without replacing the error of the workflow
+        try:
+            profiler.publish()
+        except Exception as e:
+            logger.warning("Failed to publish the profile of the run", error=str(e))
 
     return 0
 
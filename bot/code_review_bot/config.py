@@ -53,6 +53,14 @@ class Settings:
         # Max number of issues published to the backend at a time during the ingestion of a revision
         self.bulk_issue_chunks = 100
 
+        # Number of items retrieved per page when listing data from the backend
+        self.backend_page_size = 500
+
+        # Let the backend queue the issues published in bulk, waiting up to
+        # backend_async_timeout seconds for their creation
+        self.backend_async_ingestion = False
+        self.backend_async_timeout = 600
+
         # Cache to store file-by-file from HGMO Rest API
         self.hgmo_cache = tempfile.mkdtemp(suffix="hgmo")
 
@@ -113,6 +121,18 @@ class Settings:
         if "BULK_ISSUE_CHUNKS" in os.environ:
             self.bulk_issue_chunks = int(os.environ["BULK_ISSUE_CHUNKS"])
 
+        if "BACKEND_PAGE_SIZE" in os.environ:
+            self.backend_page_size = int(os.environ["BACKEND_PAGE_SIZE"])
+
+        if "BACKEND_ASYNC_INGESTION" in os.environ:
+            self.backend_async_ingestion = os.environ["BACKEND_ASYNC_INGESTION"] in (
+                "1",
+                "true",
+            )
+
+        if "BACKEND_ASYNC_TIMEOUT" in os.environ:
+            self.backend_async_timeout = int(os.environ["BACKEND_ASYNC_TIMEOUT"])
+
         # Save allowed paths
         assert isinstance(allowed_paths, list)
         assert all(map(lambda p: isinstance(p, str), allowed_paths))
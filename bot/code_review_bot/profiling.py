@@ -0,0 +1,195 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Hierarchical profile of a bot run: the duration, the HTTP transfers, the number
+of processed items and the memory growth of each phase of the workflow,
+along with the peak memory of the whole run.
+"""
+
+import functools
+import json
+import os
+import resource
+import time
+from contextlib import contextmanager
+
+import structlog
+from requests.adapters import HTTPAdapter
+
+from code_review_bot import stats
+from code_review_bot.config import settings
+
+logger = structlog.get_logger(__name__)
+
+PROFILE_VERSION = 1
+PROFILE_FILENAME = "profile.json"
+
+
+def peak_rss():
+    """
+    Maximum resident set size of the process so far, in megabytes
+    """
+    # Linux reports this value in kilobytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Span:
+    """
+    A phase of the workflow, with its nested phases.
+    Phases running several times under the same parent are merged in a single span.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.duration = 0.0
+        self.requests = 0
+        self.bytes = 0
+        self.items = 0
+        self.rss_growth = 0.0
+        self.children = {}
+
+    def child(self, name):
+        if name not in self.children:
+            self.children[name] = Span(name)
+        return self.children[name]
+
+    def add_items(self, nb):
+        """
+        Count the items (tasks, issues...) processed by this phase
+        """
+        self.items += nb
+
+    def add_response(self, size):
+        self.requests += 1
+        self.bytes += size
+
+    def close(self, duration, rss_growth):
+        self.calls += 1
+        self.duration += duration
+        self.rss_growth += rss_growth
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "duration_s": round(self.duration, 3),
+            "self_s": round(
+                self.duration - sum(child.duration for child in self.children.values()),
+                3,
+            ),
+            "requests": self.requests,
+            "bytes": self.bytes,
+            "items": self.items,
+            "peak_rss_growth_mb": round(self.rss_growth, 1),
+            "children": [child.as_dict() for child in self.children.values()],
+        }
+
+
+class Profiler:
+    """
+    Record the spans of the workflow phases, and the HTTP responses received
+    during each of them once started
+    """
+
+    def __init__(self):
+        self.original_send = None
+        self.reset()
+
+    def reset(self):
+        self.root = Span("root")
+        self.stack = [self.root]
+
+    @property
+    def current(self):
+        return self.stack[-1]
+
+    @contextmanager
+    def span(self, name):
+        span = self.current.child(name)
+        self.stack.append(span)
+        start, start_rss = time.perf_counter(), peak_rss()
+        try:
+            yield span
+        finally:
+            self.stack.pop()
+            # The peak memory of the process only grows: a phase is charged
+            # with the growth it caused, not with the peak of previous phases
+            span.close(time.perf_counter() - start, peak_rss() - start_rss)
+
+    def phase(self, name):
+        """
+        Decorator running a whole function in a span
+        """
+
+        def _decorator(func):
+            @functools.wraps(func)
+            def _wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+
+            return _wrapper
+
+        return _decorator
+
+    def start(self):
+        """
+        Count the HTTP responses received during each span, and the bytes
+        announced by their Content-Length, without keeping the responses.
+        Without that header, the size of the decoded body is counted, except
+        for streamed responses that are not read here: the count is then
+        a lower bound.
+        """
+        assert self.original_send is None, "Profiler is already started"
+        self.original_send = HTTPAdapter.send
+        profiler = self
+
+        def send(adapter, request, **kwargs):
+            response = profiler.original_send(adapter, request, **kwargs)
+            try:
+                size = int(response.headers["Content-Length"])
+            except (KeyError, ValueError):
+                # The session reads the whole body right after anyway
+                size = 0 if kwargs.get("stream") else len(response.content)
+            # Responses are counted in every running span
+            for span in profiler.stack[1:]:
+                span.add_response(size)
+            return response
+
+        HTTPAdapter.send = send
+
+    def stop(self):
+        if self.original_send is None:
+            return
+        HTTPAdapter.send = self.original_send
+        self.original_send = None
+
+    def as_dict(self):
+        return {
+            "version": PROFILE_VERSION,
+            "peak_rss_mb": round(peak_rss(), 1),
+            "phases": [span.as_dict() for span in self.root.children.values()],
+        }
+
+    def publish(self):
+        """
+        Write the profile next to the analysis report, and report the peak
+        memory of the run and the duration of the main phases to InfluxDb
+        """
+        path = os.path.join(settings.taskcluster.results_dir, PROFILE_FILENAME)
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=2)
+        logger.info("Profile written", path=path)
+
+        stats.add_metric("profile.peak_rss", peak_rss())
+        for span in self.root.children.values():
+            stats.add_metric(f"profile.{span.name}", span.duration)
+            stats.add_metric(f"profile.{span.name}.bytes", span.bytes)
+            for child in span.children.values():
+                stats.add_metric(f"profile.{span.name}.{child.name}", child.duration)
+
+
+# Create common profiler instance
+profiler = Profiler()
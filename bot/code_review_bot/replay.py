@@ -0,0 +1,287 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Record the HTTP exchanges of a bot run, and replay them offline.
+
+All the external services used by the bot (Taskcluster, Phabricator, HGMO and
+the backend) are reached through requests, so patching the transport adapter
+of requests is enough to capture or serve every exchange of a run.
+"""
+
+import base64
+import collections
+import gzip
+import hashlib
+import http.client
+import io
+import json
+import re
+import threading
+import time
+from datetime import timedelta
+
+import requests
+import structlog
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+logger = structlog.get_logger(__name__)
+
+ARCHIVE_VERSION = 1
+
+# Only those response headers are needed to replay an exchange
+# Other headers (e.g. Content-Encoding) do not match the stored content anymore
+RECORDED_HEADERS = ("Content-Type", "Location")
+
+# Secrets loaded from Taskcluster must never be stored in an archive
+SKIPPED_URLS = re.compile(r"/api/secrets/v1/secret/")
+
+Exchange = collections.namedtuple(
+    "Exchange", "method, url, digest, status, headers, content, elapsed"
+)
+
+
+def body_digest(body):
+    """
+    Identify a request body, so identical requests on the same url can be told apart
+    """
+    if not body:
+        return None
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    elif not isinstance(body, bytes):
+        # Streamed bodies are not identified
+        return None
+    return hashlib.sha1(body).hexdigest()
+
+
+def load_archive(path):
+    """
+    Load the exchanges and the metadata stored in a recorded archive
+    """
+    exchanges, metadata = [], {}
+    with gzip.open(path, "rt") as f:
+        for line in f:
+            payload = json.loads(line)
+            if payload.pop("type") == "metadata":
+                assert (
+                    payload.get("version") == ARCHIVE_VERSION
+                ), f"Unsupported archive version {payload.get('version')}"
+                metadata.update(payload)
+                continue
+            payload["content"] = base64.b64decode(payload["content"])
+            exchanges.append(Exchange(**payload))
+    return exchanges, metadata
+
+
+class Recorder:
+    """
+    Store every HTTP exchange made through requests into a compact archive:
+    a gzipped file with one JSON exchange per line, and the run metadata
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.metadata = {"version": ARCHIVE_VERSION}
+        self.nb = 0
+        self.output = None
+        self.original_send = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        assert self.output is None, "Recorder is already started"
+        self.output = gzip.open(self.path, "wt")
+        self.original_send = HTTPAdapter.send
+        recorder = self
+
+        def send(adapter, request, **kwargs):
+            start = time.perf_counter()
+            response = recorder.original_send(adapter, request, **kwargs)
+            # Streamed content is fully read, so its download time is recorded too
+            content = response.content or b""
+            recorder.add(request, response, content, time.perf_counter() - start)
+            return response
+
+        HTTPAdapter.send = send
+        logger.info("Recording HTTP exchanges", path=self.path)
+
+    def add(self, request, response, content, elapsed):
+        if SKIPPED_URLS.search(request.url):
+            logger.debug("Skipping exchange recording", url=request.url)
+            return
+        exchange = {
+            "type": "exchange",
+            "method": request.method,
+            "url": request.url,
+            "digest": body_digest(request.body),
+            "status": response.status_code,
+            "headers": {
+                name: response.headers[name]
+                for name in RECORDED_HEADERS
+                if name in response.headers
+            },
+            "content": base64.b64encode(content).decode("ascii"),
+            "elapsed": round(elapsed, 6),
+        }
+        with self.lock:
+            self.output.write(json.dumps(exchange) + "\n")
+            self.nb += 1
+
+    def stop(self):
+        if self.output is None:
+            return
+        HTTPAdapter.send = self.original_send
+        with self.lock:
+            self.output.write(json.dumps({"type": "metadata", **self.metadata}) + "\n")
+            self.output.close()
+            self.output = None
+        logger.info("Recorded HTTP exchanges", path=self.path, nb=self.nb)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class Replayer:
+    """
+    Serve HTTP requests made through requests from recorded exchanges,
+    waiting for their recorded duration multiplied by a latency factor.
+
+    Exchanges are matched by method, url and request body first, then by method
+    and url only, in their recorded order. Requests matching none of the recorded
+    exchanges are served by the stand-in handlers: a list of couples
+    (compiled url regex, callable(request, match) returning an Exchange).
+    Any other request fails, as no network access must be made.
+    """
+
+    def __init__(self, exchanges=(), handlers=(), latency_factor=1.0):
+        self.handlers = list(handlers)
+        self.latency_factor = latency_factor
+        self.exact = collections.defaultdict(collections.deque)
+        self.loose = collections.defaultdict(collections.deque)
+        for exchange in exchanges:
+            self.exact[(exchange.method, exchange.url, exchange.digest)].append(
+                exchange
+            )
+            self.loose[(exchange.method, exchange.url)].append(exchange)
+
+        self.original_send = None
+        self.lock = threading.Lock()
+
+        # Replay statistics
+        self.requests = 0
+        self.bytes = 0
+        self.latency = 0.0
+
+    def find(self, request):
+        with self.lock:
+            exact = self.exact.get(
+                (request.method, request.url, body_digest(request.body))
+            )
+            if exact:
+                exchange = exact.popleft()
+                self.loose[(request.method, request.url)].remove(exchange)
+                return exchange
+
+            loose = self.loose.get((request.method, request.url))
+            if loose:
+                exchange = loose.popleft()
+                self.exact[(exchange.method, exchange.url, exchange.digest)].remove(
+                    exchange
+                )
+                return exchange
+
+        for regex, handler in self.handlers:
+            match = regex.search(request.url)
+            if match is not None:
+                return handler(request, match)
+
+    def send(self, adapter, request, **kwargs):
+        exchange = self.find(request)
+        if exchange is None:
+            raise requests.exceptions.ConnectionError(
+                f"No recorded exchange for {request.method} {request.url}",
+                request=request,
+            )
+
+        latency = exchange.elapsed * self.latency_factor
+        time.sleep(latency)
+        with self.lock:
+            self.requests += 1
+            self.bytes += len(exchange.content)
+            self.latency += latency
+
+        response = requests.Response()
+        response.status_code = exchange.status
+        response.reason = http.client.responses.get(exchange.status, "")
+        response.headers = CaseInsensitiveDict(exchange.headers)
+        response.headers["Content-Length"] = str(len(exchange.content))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = adapter
+        response.elapsed = timedelta(seconds=latency)
+        response.raw = io.BytesIO(exchange.content)
+        # The content is already available, even for streamed responses
+        response._content = exchange.content
+        response._content_consumed = True
+        return response
+
+    @property
+    def left(self):
+        """
+        Number of recorded exchanges that have not been replayed
+        """
+        return sum(len(exchanges) for exchanges in self.loose.values())
+
+    def start(self):
+        assert self.original_send is None, "Replayer is already started"
+        self.original_send = HTTPAdapter.send
+        replayer = self
+
+        def send(adapter, request, **kwargs):
+            return replayer.send(adapter, request, **kwargs)
+
+        HTTPAdapter.send = send
+
+    def stop(self):
+        if self.original_send is None:
+            return
+        HTTPAdapter.send = self.original_send
+        self.original_send = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def build_exchange(request, content, status=200, latency=0.0, bandwidth=None):
+    """
+    Build an exchange served by a stand-in handler, with a JSON or raw content.
+    Its duration is the latency, plus the transfer time of its content when
+    a bandwidth (in bytes per second) is given.
+    """
+    if isinstance(content, bytes):
+        headers = {"Content-Type": "text/plain; charset=utf-8"}
+    else:
+        content = json.dumps(content).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+    elapsed = latency + (len(content) / bandwidth if bandwidth else 0)
+    return Exchange(
+        request.method,
+        request.url,
+        body_digest(request.body),
+        status,
+        headers,
+        content,
+        elapsed,
+    )
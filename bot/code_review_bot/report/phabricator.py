@@ -2,7 +2,6 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
-from collections import defaultdict
 from typing import List
 from urllib.parse import urljoin
 
@@ -112,52 +111,47 @@ class PhabricatorReporter(Reporter):
         assert isinstance(nb, int)
         return "{} {}".format(nb, nb == 1 and word or word + "s")
 
-    def compare_issues(self, former_diff_id, issues):
+    def compare_issues(self, revision, former_diff_phid, issues):
         """
         Compare new issues depending on their evolution from the
         previous diff on the same revision.
+        The comparison is computed by the backend, from the issues published on both diffs.
         Returns a tuple containing lists of:
           * Unresolved issues, that are present on both diffs
-          * Closed issues, that were present in the previous diff and are now gone
+          * Closed issues hashes, that were present in the previous diff and are now gone
         """
         if not self.backend_api.enabled:
             logger.warning(
-                "Backend API must be enabled to compare issues with previous diff {former_diff_id}."
+                "Backend API must be enabled to compare issues with previous diff {former_diff_phid}."
             )
             return [], []
 
         # If this is the first diff, there's no need to compare issues with a
         # previous diff since there is no previous diff.
-        if former_diff_id is None:
+        if former_diff_phid is None:
             return [], []
 
-        # Retrieve issues related to the previous diff
         try:
-            previous_issues = self.backend_api.list_diff_issues(former_diff_id)
+            comparison = self.backend_api.compare_diffs(
+                revision.diff_phid, former_diff_phid
+            )
         except Exception as e:
             logger.warning(
-                f"An error occurred listing issues on previous diff {former_diff_id}: {e}. "
+                f"An error occurred comparing issues with previous diff {former_diff_phid}: {e}. "
                 "Each issue will be considered as a new case."
             )
-            previous_issues = []
+            return [], []
 
         # Multiple issues may share a similar hash in case they were
         # produced by the same linter on the same lines
-        indexed_issues = defaultdict(list)
-        for issue in previous_issues:
-            indexed_issues[issue["hash"]].append(issue)
-
-        # Compare current issues with the previous ones based on the hash
+        unresolved_hashes = set(comparison["unresolved"])
         unresolved = [
             issue.on_backend["hash"]
             for issue in issues
-            if issue.on_backend and issue.on_backend["hash"] in indexed_issues
+            if issue.on_backend and issue.on_backend["hash"] in unresolved_hashes
         ]
 
-        # All previous issues that are not unresolved are closed
-        closed = [issue for issue in previous_issues if issue["hash"] not in unresolved]
-
-        return unresolved, closed
+        return unresolved, comparison["closed"]
 
     def publish(self, issues, revision, task_failures, notices, reviewers):
         """
@@ -232,12 +226,13 @@ class PhabricatorReporter(Reporter):
             return publishable_issues, patches
 
         # Compare issues that are not known on the repository to a previous diff
-        older_diff_ids = [
-            diff["id"] for diff in rev_diffs if diff["id"] < revision.diff_id
-        ]
-        former_diff_id = sorted(older_diff_ids)[-1] if older_diff_ids else None
+        older_diffs = [diff for diff in rev_diffs if diff["id"] < revision.diff_id]
+        former_diff = (
+            max(older_diffs, key=lambda diff: diff["id"]) if older_diffs else None
+        )
+        former_diff_id = former_diff["id"] if former_diff else None
         unresolved_issues, closed_issues = self.compare_issues(
-            former_diff_id, publishable_issues
+            revision, former_diff and former_diff["phid"], publishable_issues
         )
 
         if (
@@ -24,6 +24,7 @@ from code_review_bot.mercurial import (
     MercurialWorker,
     robust_checkout,
 )
+from code_review_bot.profiling import profiler
 from code_review_bot.report.debug import DebugReporter
 from code_review_bot.revisions import GithubRevision, PhabricatorRevision, Revision
 from code_review_bot.sources.phabricator import (
@@ -93,6 +94,7 @@ class Workflow:
         # Is local clone already setup ?
         self.clone_available = False
 
+    @profiler.phase("run")
     def run(self, revision):
         """
         Find all issues on remote tasks and publish them
@@ -111,7 +113,8 @@ class Workflow:
             )
 
         # Analyze revision patch to get files/lines data
-        revision.analyze_patch()
+        with profiler.span("analyze_patch"):
+            revision.analyze_patch()
 
         # Find issues on remote tasks
         issues, task_failures, notices, reviewers = self.find_issues(
@@ -161,6 +164,7 @@ class Workflow:
 
         return issues
 
+    @profiler.phase("ingest_revision")
     def ingest_revision(self, revision, group_id):
         """
         Simpler workflow to ingest a revision
@@ -218,7 +222,9 @@ class Workflow:
                 supported_tasks.append(task)
 
         # Find potential issues in the task group
-        self.queue_service.listTaskGroup(group_id, paginationHandler=_build_tasks)
+        with profiler.span("list_tasks") as span:
+            self.queue_service.listTaskGroup(group_id, paginationHandler=_build_tasks)
+            span.add_items(len(supported_tasks))
         logger.info(
             "Loaded all supported tasks in the task group",
             group_id=group_id,
@@ -228,9 +234,13 @@ class Workflow:
         # Load all the artifacts and potential issues
         issues = []
         for task in supported_tasks:
-            artifacts = task.load_artifacts(self.queue_service)
+            with profiler.span("load_artifacts") as span:
+                artifacts = task.load_artifacts(self.queue_service)
+                span.add_items(len(artifacts or {}))
             if artifacts is not None:
-                task_issues = task.parse_issues(artifacts, revision)
+                with profiler.span("parse_issues") as span:
+                    task_issues = task.parse_issues(artifacts, revision)
+                    span.add_items(len(task_issues))
                 logger.info(
                     f"Found {len(task_issues)} issues",
                     task=task.name,
@@ -239,19 +249,30 @@ class Workflow:
                 issues += task_issues
 
         # Store the revision & diff in the backend
-        self.backend_api.publish_revision(revision)
+        with profiler.span("backend.publish_revision"):
+            self.backend_api.publish_revision(revision)
 
         # Publish issues when there are some
-        if not issues:
-            logger.info("No issues for that revision")
-            return
+        if issues:
+            # Clone local repo when required
+            self.clone_repository(revision)
 
-        # Clone local repo when required
-        self.clone_repository(revision)
+            # Publish issues in the backend
+            with profiler.span("backend.publish_issues") as span:
+                span.add_items(len(issues))
+                published = self.backend_api.publish_issues(issues, revision)
+            if published is None:
+                # Issues missing from the known issues would be reported as new ones
+                logger.warn("Known issues are not refreshed from a partial ingestion")
+                return
+        else:
+            logger.info("No issues for that revision")
 
-        # Publish issues in the backend
-        self.backend_api.publish_issues(issues, revision)
+        # Those issues are now the known issues of the repository
+        with profiler.span("backend.refresh_known_issues"):
+            self.backend_api.refresh_known_issues(revision)
 
+    @profiler.phase("start_analysis")
     def start_analysis(self, revision):
         """
         Apply a patch on a local clone and push to try to trigger a new Code review analysis
@@ -318,7 +339,8 @@ class Workflow:
         # Try to update the state 5 consecutive time
         for i in range(5):
             # Update the internal build state using Phabricator infos
-            phabricator.update_state(build)
+            with profiler.span("phabricator.update_state"):
+                phabricator.update_state(build)
 
             # Continue with workflow once the build is public
             if build.state is PhabricatorBuildState.Public:
@@ -341,11 +363,14 @@ class Workflow:
             raise Exception("No stack of patches to apply.")
 
         # We'll clone the required repository
-        repository.clone()
+        with profiler.span("mercurial.clone"):
+            repository.clone()
 
         # Apply the stack of patches and push to try
         worker = MercurialWorker()
-        output = worker.run(repository, build)
+        with profiler.span("mercurial.push_to_try") as span:
+            output = worker.run(repository, build)
+            span.add_items(len(build.stack))
 
         # Update index when the patch has been pushed to try
         self.index(revision, state="pushed_to_try")
@@ -363,6 +388,7 @@ class Workflow:
         else:
             logger.info("Skipping Lando publication")
 
+    @profiler.phase("clone_repository")
     def clone_repository(self, revision):
         """
         Clone the repo locally when configured
@@ -416,22 +442,27 @@ class Workflow:
 
         self.clone_available = True
 
+    @profiler.phase("publish")
     def publish(self, revision, issues, task_failures, notices, reviewers):
         """
         Publish issues on selected reporters
         """
         # Publish patches on Taskcluster
         # or write locally for local development
-        for patch in revision.improvement_patches:
-            if settings.taskcluster.local:
-                patch.write()
-            else:
-                patch.publish()
+        with profiler.span("publish_patches") as span:
+            span.add_items(len(revision.improvement_patches))
+            for patch in revision.improvement_patches:
+                if settings.taskcluster.local:
+                    patch.write()
+                else:
+                    patch.publish()
 
         # Publish issues on backend to retrieve their comparison state
         publishable_issues = [i for i in issues if i.is_publishable()]
 
-        self.backend_api.publish_issues(publishable_issues, revision)
+        with profiler.span("backend.publish_issues") as span:
+            span.add_items(len(publishable_issues))
+            self.backend_api.publish_issues(publishable_issues, revision)
 
         # Report issues publication stats
         nb_issues = len(issues)
@@ -450,8 +481,11 @@ class Workflow:
 
         # Publish reports about these issues
         with stats.timer("runtime.reports"):
-            for reporter in self.reporters.values():
-                reporter.publish(issues, revision, task_failures, notices, reviewers)
+            for name, reporter in self.reporters.items():
+                with profiler.span(f"report.{name}"):
+                    reporter.publish(
+                        issues, revision, task_failures, notices, reviewers
+                    )
 
         self.index(
             revision, state="done", issues=nb_issues, issues_publishable=nb_publishable
@@ -523,12 +557,14 @@ class Workflow:
                 },
             )
 
+    @profiler.phase("find_previous_issues")
     def find_previous_issues(self, revision, issues, base_rev_changeset=None):
         """
         Look for known issues in the backend matching the given list of issues
 
         If a base revision ID is provided, compare to issues detected on this revision
-        Otherwise, compare to issues detected on last ingested revision
+        Otherwise, compare to issues detected on last ingested revision (the known issues
+        of mozilla-central are maintained by the backend during the ingestion)
         """
         assert (
             self.backend_api.enabled
@@ -555,29 +591,40 @@ class Workflow:
             raise NotImplementedError
 
         for path, group_issues in issues_groups:
-            known_issues = self.backend_api.list_repo_issues(
-                repository_slug,
-                date=current_date,
-                revision_changeset=base_rev_changeset,
-                path=path,
-            )
-            hashes = [issue["hash"] for issue in known_issues]
+            hashes = None
+            if isinstance(revision, PhabricatorRevision) and base_rev_changeset is None:
+                # Use the issues of the last ingested revision, maintained by the backend
+                hashes = self.backend_api.list_known_issues(repository_slug, path)
+            if hashes is None:
+                # Use the issues of the base revision, or the ones closest to today
+                # when the backend has no known issues for that repository yet
+                known_issues = self.backend_api.list_repo_issues(
+                    repository_slug,
+                    date=current_date,
+                    revision_changeset=base_rev_changeset,
+                    path=path,
+                )
+                hashes = {issue["hash"] for issue in known_issues}
             for issue in group_issues:
                 issue.new_issue = bool(issue.hash and issue.hash not in hashes)
 
+    @profiler.phase("find_issues")
     def find_issues(self, revision, group_id):
         """
         Find all issues on remote Taskcluster task group
         """
         # Load all tasks in task group
-        tasks = self.queue_service.listTaskGroup(group_id)
-        assert "tasks" in tasks
-        tasks = {task["status"]["taskId"]: task for task in tasks["tasks"]}
+        with profiler.span("list_tasks") as span:
+            tasks = self.queue_service.listTaskGroup(group_id)
+            assert "tasks" in tasks
+            tasks = {task["status"]["taskId"]: task for task in tasks["tasks"]}
+            span.add_items(len(tasks))
         assert len(tasks) > 0
         logger.info("Loaded Taskcluster group", id=group_id, tasks=len(tasks))
 
         # Store the revision in the backend (or retrieve an existing one)
-        rev = self.backend_api.publish_revision(revision)
+        with profiler.span("backend.publish_revision"):
+            rev = self.backend_api.publish_revision(revision)
         assert (
             rev is not None
         ), "Stopping early because revision could not be created nor retrieved from the backend"
@@ -628,11 +675,15 @@ class Workflow:
                     task = self.build_task(tasks[dep])
                 if task is None:
                     continue
-                artifacts = task.load_artifacts(self.queue_service)
+                with profiler.span("load_artifacts") as span:
+                    artifacts = task.load_artifacts(self.queue_service)
+                    span.add_items(len(artifacts or {}))
                 if artifacts is not None:
                     task_issues, task_patches = [], []
                     if isinstance(task, AnalysisTask):
-                        task_issues = task.parse_issues(artifacts, revision)
+                        with profiler.span("parse_issues") as span:
+                            task_issues = task.parse_issues(artifacts, revision)
+                            span.add_items(len(task_issues))
                         logger.info(
                             f"Found {len(task_issues)} issues",
                             task=task.name,
@@ -43,5 +43,10 @@ setuptools.setup(
     include_package_data=True,
     zip_safe=False,
     license="MPL2",
-    entry_points={"console_scripts": ["code-review-bot = code_review_bot.cli:main"]},
+    entry_points={
+        "console_scripts": [
+            "code-review-bot = code_review_bot.cli:main",
+            "code-review-bot-benchmark = code_review_bot.benchmark:main",
+        ]
+    },
 )
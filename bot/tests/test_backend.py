@@ -2,11 +2,15 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import json
+import re
 from unittest.mock import call, patch
 
 import pytest
+import responses
 
 from code_review_bot.backend import BackendAPI
+from code_review_bot.config import settings
 from code_review_bot.tasks.clang_tidy import ClangTidyIssue
 from code_review_bot.tasks.lint import MozLintIssue, MozLintTask
 
@@ -313,6 +317,134 @@ def test_publish_issues(
     }
 
 
+@patch("code_review_bot.backend.time.sleep")
+def test_publish_issues_async(
+    mock_sleep,
+    mock_clang_tidy_issues,
+    mock_revision,
+    mock_backend_secret,
+    mock_config,
+    monkeypatch,
+):
+    """
+    Test publication of issues queued by the backend, waiting for their creation
+    """
+    monkeypatch.setattr(settings, "backend_async_ingestion", True)
+    monkeypatch.setattr(settings, "bulk_issue_chunks", 1)
+    mock_revision.issues_url = "http://code-review-backend.test/v1/revision/51/issues/"
+
+    queued = {}
+
+    def post_issues_bulk(request):
+        assert request.headers["Prefer"] == "respond-async"
+        request_id = len(queued) + 1
+        queued[request_id] = json.loads(request.body)["issues"]
+        url = f"{mock_revision.issues_url}{request_id}/"
+        return (202, {"Location": url}, json.dumps({"status": "pending", "url": url}))
+
+    polls = []
+
+    def get_status(request):
+        request_id = int(request.path_url.split("/")[5])
+        polls.append(request_id)
+        # The first request is still pending on its first poll
+        if polls.count(request_id) == 1 and request_id == 1:
+            return (200, {}, json.dumps({"status": "pending"}))
+        # The first poll of the second request hits a transient error
+        if polls.count(request_id) == 1 and request_id == 2:
+            return (503, {}, "Service Unavailable")
+        issues = [
+            {**issue, "id": f"issue-{request_id}"} for issue in queued[request_id]
+        ]
+        return (200, {}, json.dumps({"status": "done", "issues": issues}))
+
+    responses.add_callback(
+        responses.POST, mock_revision.issues_url, callback=post_issues_bulk
+    )
+    responses.add_callback(
+        responses.GET,
+        re.compile(rf"^{mock_revision.issues_url}(\d+)/$"),
+        callback=get_status,
+    )
+
+    r = BackendAPI()
+    assert r.publish_issues(mock_clang_tidy_issues, mock_revision) == 2
+
+    # All chunks are sent before waiting for their creation
+    assert list(queued.keys()) == [1, 2]
+    assert polls == [1, 1, 2, 2]
+    assert mock_sleep.call_count == 2
+    assert [issue.on_backend["id"] for issue in mock_clang_tidy_issues] == [
+        "issue-1",
+        "issue-2",
+    ]
+
+
+def test_publish_issues_failed(
+    mock_clang_tidy_issues,
+    mock_revision,
+    mock_backend_secret,
+    mock_config,
+    monkeypatch,
+):
+    """
+    Test a publication is reported as failed when the backend rejects a chunk of issues
+    """
+    monkeypatch.setattr(settings, "bulk_issue_chunks", 1)
+    mock_revision.issues_url = "http://code-review-backend.test/v1/revision/51/issues/"
+
+    posted = []
+
+    def post_issues_bulk(request):
+        # Only the first chunk is accepted
+        posted.append(request)
+        if len(posted) > 1:
+            return (400, {}, "")
+        issues = json.loads(request.body)["issues"]
+        return (201, {}, json.dumps({"issues": [{**issues[0], "id": "issue-1"}]}))
+
+    responses.add_callback(
+        responses.POST, mock_revision.issues_url, callback=post_issues_bulk
+    )
+
+    r = BackendAPI()
+    assert r.publish_issues(mock_clang_tidy_issues, mock_revision) is None
+    assert [issue.on_backend for issue in mock_clang_tidy_issues] == [
+        {**mock_clang_tidy_issues[0].as_dict(), "id": "issue-1"},
+        None,
+    ]
+
+
+@patch("code_review_bot.backend.time.sleep")
+def test_publish_issues_async_unavailable(
+    mock_sleep,
+    mock_clang_tidy_issues,
+    mock_revision,
+    mock_backend_secret,
+    mock_config,
+    monkeypatch,
+):
+    """
+    Test queued issues are reported as failed when their status stays unavailable
+    """
+    monkeypatch.setattr(settings, "backend_async_ingestion", True)
+    monkeypatch.setattr(settings, "backend_async_timeout", 0)
+    mock_revision.issues_url = "http://code-review-backend.test/v1/revision/51/issues/"
+    url = f"{mock_revision.issues_url}1/"
+    responses.add(
+        responses.POST,
+        mock_revision.issues_url,
+        status=202,
+        json={"status": "pending", "url": url},
+    )
+    responses.add(responses.GET, url, status=500)
+
+    r = BackendAPI()
+    assert r.publish_issues(mock_clang_tidy_issues, mock_revision) is None
+    assert [issue.on_backend for issue in mock_clang_tidy_issues] == [None, None]
+    assert mock_sleep.call_count == 0
+
+
 @patch("code_review_bot.backend.logger")
 def test_publication_skips_rustfmt_dot_path(
     logger_mock,
@@ -384,3 +516,21 @@ def test_publication_skips_rustfmt_dot_path(
             issue="mock-clang-tidy issue clanck.checker@warning . line 57",
         ),
     ]
+
+
+def test_refresh_known_issues(mock_revision, mock_backend_secret, mock_config):
+    """
+    Test the known issues of a repository are refreshed from an ingested revision
+    """
+    responses.add(
+        responses.POST,
+        "http://code-review-backend.test/v1/revision/51/known-issues/",
+        json={"refreshed": True, "known_issues": 12},
+    )
+    mock_revision.id = 51
+
+    r = BackendAPI()
+    assert r.refresh_known_issues(mock_revision) == {
+        "refreshed": True,
+        "known_issues": 12,
+    }
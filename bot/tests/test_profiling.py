@@ -0,0 +1,114 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import os
+from unittest import mock
+
+import requests
+import responses
+
+from code_review_bot import stats
+from code_review_bot.config import settings
+from code_review_bot.profiling import Profiler, profiler
+
+
+def test_spans():
+    """
+    Test phases are recorded as a tree of spans, with their HTTP transfers
+    """
+    responses.add(
+        responses.GET,
+        "http://artifact.test/issues.json",
+        body="x" * 100,
+        headers={"Content-Length": "100"},
+    )
+    test_profiler = Profiler()
+    test_profiler.start()
+    try:
+        with test_profiler.span("ingest") as ingest:
+            for _ in range(3):
+                with test_profiler.span("load_artifacts") as span:
+                    requests.get("http://artifact.test/issues.json")
+                    span.add_items(1)
+            ingest.add_items(3)
+        # Responses received out of any span are not counted
+        requests.get("http://artifact.test/issues.json")
+    finally:
+        test_profiler.stop()
+
+    profile = test_profiler.as_dict()
+    assert profile["version"] == 1
+    assert profile["peak_rss_mb"] > 0
+
+    (ingest,) = profile["phases"]
+    (artifacts,) = ingest["children"]
+    assert ingest["name"] == "ingest"
+    assert ingest["calls"] == 1
+    assert ingest["requests"] == 3
+    assert ingest["bytes"] == 300
+    assert ingest["items"] == 3
+    assert ingest["self_s"] <= ingest["duration_s"]
+    assert artifacts == {
+        "name": "load_artifacts",
+        "calls": 3,
+        "duration_s": artifacts["duration_s"],
+        "self_s": artifacts["duration_s"],
+        "requests": 3,
+        "bytes": 300,
+        "items": 3,
+        "peak_rss_growth_mb": artifacts["peak_rss_growth_mb"],
+        "children": [],
+    }
+
+
+def test_spans_without_content_length():
+    """
+    Test the body of responses without a Content-Length is counted, unless streamed
+    """
+    responses.add(responses.GET, "http://artifact.test/issues.json", body="x" * 100)
+    test_profiler = Profiler()
+    test_profiler.start()
+    try:
+        with test_profiler.span("load_artifacts"):
+            assert len(requests.get("http://artifact.test/issues.json").content) == 100
+            requests.get("http://artifact.test/issues.json", stream=True)
+    finally:
+        test_profiler.stop()
+
+    (artifacts,) = test_profiler.as_dict()["phases"]
+    assert artifacts["requests"] == 2
+    assert artifacts["bytes"] == 100
+
+
+def test_workflow_profile(mock_workflow, mock_revision):
+    """
+    Test the phases of a try workflow are profiled, then published
+    """
+    mock_workflow.publish = mock.Mock()
+    mock_workflow.find_issues = mock.Mock(return_value=([], [], [], []))
+    stats.metrics = []
+    profiler.reset()
+
+    mock_workflow.run(mock_revision)
+
+    (run,) = profiler.as_dict()["phases"]
+    assert run["name"] == "run"
+    assert [phase["name"] for phase in run["children"]] == [
+        "analyze_patch",
+        "clone_repository",
+    ]
+
+    profiler.publish()
+    with open(os.path.join(settings.taskcluster.results_dir, "profile.json")) as f:
+        assert json.load(f)["phases"][0]["name"] == "run"
+    assert [metric["measurement"] for metric in stats.metrics] == [
+        "code-review.analysis.files",
+        "code-review.analysis.lines",
+        "code-review.profile.peak_rss",
+        "code-review.profile.run",
+        "code-review.profile.run.bytes",
+        "code-review.profile.run.analyze_patch",
+        "code-review.profile.run.clone_repository",
+    ]
@@ -0,0 +1,149 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+
+import pytest
+import requests
+import responses
+
+from code_review_bot.replay import Recorder, Replayer, load_archive
+from code_review_bot.tools.libmozdata import setup as setup_libmozdata
+
+
+def test_record_replay(tmp_path):
+    """
+    Test the exchanges of a run are recorded then replayed offline
+    """
+    responses.add(
+        responses.GET,
+        "http://taskcluster.test/api/queue/v1/task/someTask",
+        json={"metadata": {"name": "source-test-mozlint-eslint"}},
+    )
+    responses.add(
+        responses.POST,
+        "http://code-review-backend.test/v1/revision/",
+        json={"id": 1},
+        status=201,
+    )
+    responses.add(
+        responses.POST,
+        "http://code-review-backend.test/v1/revision/",
+        json={"id": 2},
+        status=201,
+    )
+    responses.add(
+        responses.GET,
+        "http://taskcluster.test/api/secrets/v1/secret/project/relman/code-review",
+        json={"secret": {"PHABRICATOR": {"api_key": "deadbeef"}}},
+    )
+
+    path = tmp_path / "run.jsonl.gz"
+    with Recorder(path) as recorder:
+        recorder.metadata["mode"] = "ingest"
+        requests.get("http://taskcluster.test/api/queue/v1/task/someTask")
+        requests.post("http://code-review-backend.test/v1/revision/", json={"a": 1})
+        requests.post("http://code-review-backend.test/v1/revision/", json={"b": 2})
+        requests.get(
+            "http://taskcluster.test/api/secrets/v1/secret/project/relman/code-review"
+        )
+
+    # Secrets are never stored
+    exchanges, metadata = load_archive(path)
+    assert metadata == {"version": 1, "mode": "ingest"}
+    assert [(exchange.method, exchange.url) for exchange in exchanges] == [
+        ("GET", "http://taskcluster.test/api/queue/v1/task/someTask"),
+        ("POST", "http://code-review-backend.test/v1/revision/"),
+        ("POST", "http://code-review-backend.test/v1/revision/"),
+    ]
+
+    # Requests are matched on their body first, then in their recorded order
+    with Replayer(exchanges, latency_factor=0) as replayer:
+        response = requests.post(
+            "http://code-review-backend.test/v1/revision/", json={"b": 2}
+        )
+        assert response.status_code == 201
+        assert response.json() == {"id": 2}
+        assert requests.post(
+            "http://code-review-backend.test/v1/revision/", json={"c": 3}
+        ).json() == {"id": 1}
+
+        response = requests.get("http://taskcluster.test/api/queue/v1/task/someTask")
+        assert response.json() == {"metadata": {"name": "source-test-mozlint-eslint"}}
+
+        # No network access is made
+        with pytest.raises(requests.exceptions.ConnectionError):
+            requests.get("http://taskcluster.test/api/queue/v1/task/someTask")
+
+    assert replayer.requests == 3
+    assert replayer.left == 0
+
+
+def test_benchmark_synthetic(tmp_path, monkeypatch):
+    """
+    Test the ingestion of a synthetic task group is benchmarked offline
+    """
+    from code_review_bot.benchmark import benchmark, parse_cli
+
+    # Restore the environment modified by the benchmark
+    for name in ("TRY_TASK_ID", "TRY_TASK_GROUP_ID", "GENERIC_TASK_GROUP_ID"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("BULK_ISSUE_CHUNKS", "100")
+    setup_libmozdata("code-review-bot")
+
+    output = tmp_path / "benchmark.json"
+    args = parse_cli(
+        [
+            "--tasks=12",
+            "--issues=500",
+            "--files=20",
+            "--latency=0",
+            f"--output={output}",
+        ]
+    )
+    report = benchmark(args)
+    with open(output) as f:
+        assert json.load(f) == report
+
+    assert report["mode"] == "ingest"
+    assert report["source"] == "synthetic"
+    assert report["wall_s"] > 0
+    assert report["peak_rss_mb"] > 0
+
+    # Task group listing, 12 artifacts, 20 files, the revision,
+    # 5 chunks of 100 issues and the known issues
+    assert report["http"] == {
+        "requests": 40,
+        "bytes": report["http"]["bytes"],
+        "latency_s": report["http"]["latency_s"],
+        "unused": 0,
+    }
+
+    load_revision, ingestion = report["phases"]
+    assert load_revision["name"] == "load_revision"
+    assert ingestion["name"] == "ingest_revision"
+    assert ingestion["requests"] == 40
+    assert ingestion["bytes"] == report["http"]["bytes"]
+    phases = {phase["name"]: phase for phase in ingestion["children"]}
+    assert list(phases) == [
+        "list_tasks",
+        "load_artifacts",
+        "parse_issues",
+        "backend.publish_revision",
+        "clone_repository",
+        "backend.publish_issues",
+        "backend.refresh_known_issues",
+    ]
+    assert phases["list_tasks"]["items"] == 12
+    assert phases["load_artifacts"]["calls"] == 12
+    assert phases["load_artifacts"]["requests"] == 12
+    assert phases["parse_issues"]["items"] == 500
+    assert phases["backend.publish_issues"]["requests"] == 25
+
+    # Issues are hashed by chunks, downloading their files
+    (hashes,) = phases["backend.publish_issues"]["children"]
+    assert hashes["name"] == "hash_issues"
+    assert hashes["calls"] == 5
+    assert hashes["items"] == 500
+    assert hashes["requests"] == 20
@@ -1238,43 +1238,17 @@ def test_phabricator_former_diff_comparison(
             "publishable": True,
         }
 
-    # Mock a paginated backend response
-    backend = "code-review-backend.test"
+    # Mock the comparison computed by the backend
     responses.add(
         responses.GET,
-        f"http://{backend}/v1/diff/41/issues/",
-        json={
-            "count": 2,
-            "previous": None,
-            "next": f"http://{backend}/v1/diff/41/issues/?page=2",
-            "results": [
-                {
-                    "id": "issue 1",
-                    "hash": "hash02",
-                }
-            ],
-        },
-    )
-    responses.add(
-        responses.GET,
-        f"http://{backend}/v1/diff/41/issues/?page=2",
-        json={
-            "count": 2,
-            "previous": f"http://{backend}/v1/diff/41/issues/",
-            "next": None,
-            "results": [
-                {
-                    "id": "issue 2",
-                    "hash": "hash03",
-                }
-            ],
-        },
+        "http://code-review-backend.test/v1/diff/PHID-DIFF-test/compare/PHID-DIFF-41/",
+        json={"unresolved": ["hash02"], "closed": ["hash03"], "new": ["hash01"]},
     )
 
     reporter.api.search_diffs = lambda revision_phid: [
-        {"id": 39},
-        {"id": 41},
-        {"id": 42},
+        {"id": 39, "phid": "PHID-DIFF-39"},
+        {"id": 41, "phid": "PHID-DIFF-41"},
+        {"id": 42, "phid": "PHID-DIFF-test"},
     ]
 
     os.environ["SPECIAL_NAME"] = "PHID-DREV-zzzzz-updated"
@@ -1389,7 +1363,7 @@ def test_phabricator_before_after_comment(
     assert cov_issue.is_publishable() is False
 
     # Tag the coverage issue as a new issue (nor unresolved nor closed)
-    reporter.compare_issues = lambda former_diff, issues: ([], [])
+    reporter.compare_issues = lambda revision, former_diff, issues: ([], [])
 
     with capture_logs() as cap_logs:
         issues, patches = reporter.publish(
@@ -3,7 +3,7 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import os
-from datetime import datetime
+import re
 from unittest import mock
 from urllib.parse import unquote_plus
 
@@ -219,18 +219,13 @@ def test_before_after(mock_taskcluster_config, mock_workflow, mock_task, mock_re
     for index, hash_val in enumerate(("aaaa", "bbbb")):
         issues[index].hash = hash_val
 
-    current_date = datetime.now().strftime("%Y-%m-%d")
     responses.add(
         responses.GET,
-        f"https://backend.test/v1/issues/mozilla-central/?path=outside%2Fof%2Fthe%2Fpatch.cpp&date={current_date}",
+        "https://backend.test/v1/issues/mozilla-central/known/?path=outside%2Fof%2Fthe%2Fpatch.cpp",
         json={
-            "count": 2,
-            "previous": None,
-            "next": None,
-            "results": [
-                {"id": "issue 1", "hash": "bbbb"},
-                {"id": "issue 42", "hash": "xxxx"},
-            ],
+            "path": "outside/of/the/patch.cpp",
+            "revision": 42,
+            "hashes": ["bbbb", "xxxx"],
         },
     )
 
@@ -251,6 +246,44 @@ def test_before_after(mock_taskcluster_config, mock_workflow, mock_task, mock_re
     assert issues[1].new_issue is False
 
 
+def test_before_after_without_known_issues(
+    mock_taskcluster_config, mock_workflow, mock_task, mock_revision
+):
+    """
+    Test the issues closest to today are used when the backend has
+    no known issues for the repository yet
+    """
+    issues = [
+        ClangFormatIssue(
+            mock_task(ClangFormatTask, "source-test-clang-format"),
+            "outside/of/the/patch.cpp",
+            [(42, 42, message)],
+            mock_revision,
+        )
+        for message in (b"This is a new warning.", b"This is a known warning.")
+    ]
+    for issue, hash_val in zip(issues, ("aaaa", "bbbb")):
+        issue.hash = hash_val
+    mock_workflow.backend_api.url = "https://backend.test"
+    mock_workflow.backend_api.username = "root"
+    mock_workflow.backend_api.password = "hunter2"
+
+    responses.add(
+        responses.GET,
+        "https://backend.test/v1/issues/mozilla-central/known/?path=outside%2Fof%2Fthe%2Fpatch.cpp",
+        json={"path": "outside/of/the/patch.cpp", "revision": None, "hashes": []},
+    )
+    responses.add(
+        responses.GET,
+        re.compile(r"^https://backend.test/v1/issues/mozilla-central/export/"),
+        body='{"hash": "bbbb"}\n{"hash": "xxxx"}\n',
+    )
+
+    mock_workflow.find_previous_issues(mock_revision, issues)
+    assert issues[0].new_issue is True
+    assert issues[1].new_issue is False
+
+
 def test_publish_link_duplicate_harbormaster_uri(mock_workflow):
     """
     When publish_link raises a ConduitError due to a duplicate Harbormaster URI
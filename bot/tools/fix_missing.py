@@ -37,7 +37,8 @@ def phab_state(revision_id):
 
 
 def list_diffs(min_date, max_date):
-    url = BACKEND_URL
+    # Use the keyset pagination, following cursors from the most recent diff
+    url = f"{BACKEND_URL}?page_size=500"
 
     revisions = []
     updates = {}
@@ -6,6 +6,9 @@ Vue.use(Vuex);
 const TASKCLUSTER_DIFF_INDEX =
   "https://index.taskcluster.net/v1/task/project.relman.production.code-review.phabricator.diff.";
 
+// Number of issues retrieved per request on a diff
+const ISSUES_PAGE_SIZE = 500;
+
 export default new Vuex.Store({
   state: {
     backend_url: BACKEND_URL,
@@ -122,7 +125,11 @@ export default new Vuex.Store({
         return;
       }
 
-      axios.get(payload.url).then((resp) => {
+      // Use large pages through the backend keyset pagination
+      // Next urls already contain the page size and cursor
+      const params = payload.cursor ? {} : { page_size: ISSUES_PAGE_SIZE };
+
+      axios.get(payload.url, { params }).then((resp) => {
         // Store new issues
         state.commit("add_issues", {
           diffId: payload.diffId,
@@ -131,35 +138,27 @@ export default new Vuex.Store({
 
         // Load next issues
         payload.url = resp.data.next;
+        payload.cursor = true;
         state.dispatch("load_issues", payload);
       });
     },
 
     load_stats(state, payload) {
-      if (payload.url === undefined) {
-        state.commit("reset_stats");
-      }
-      const url = payload.url || BACKEND_URL + "/v1/check/stats/";
+      state.commit("reset_stats");
 
       const params = {};
-      if (payload.since !== undefined) {
+      if (payload.since !== undefined && payload.since !== null) {
         params.since = payload.since;
       }
 
-      // Remove null values from params
-      Object.entries(params).forEach(([k, v]) => {
-        if (v === null) delete params[k];
-      });
-
+      // All the stats are returned at once, as rows sharing a list of columns
+      const url = BACKEND_URL + "/v1/check/stats/compact/";
       axios.get(url, { params }).then((resp) => {
-        // Store new stats
-        state.commit("add_stats", resp.data);
-
-        // Load next stats
-        if (resp.data.next !== null) {
-          // Do not propagate since, as it's already included in the next
-          state.dispatch("load_stats", { url: resp.data.next });
-        }
+        const { columns, rows } = resp.data;
+        const results = rows.map((row) =>
+          Object.fromEntries(columns.map((column, i) => [column, row[i]])),
+        );
+        state.commit("add_stats", { results, count: results.length });
       });
     },
 
@@ -197,23 +196,20 @@ export default new Vuex.Store({
       return axios.get(url);
     },
 
-    // Load a specific revision and its diffs
+    // Load a specific revision, its diffs and their issues in a single request
     load_revision(state, payload) {
-      return Promise.all([
-        axios.get(BACKEND_URL + "/v1/revision/" + payload.id),
-        axios.get(BACKEND_URL + "/v1/revision/" + payload.id + "/diffs/"),
-      ]).then(([respRevision, respDiffs]) => {
+      const url = BACKEND_URL + "/v1/revision/" + payload.id + "/details/";
+      return axios.get(url, { params: { issues: true } }).then((resp) => {
+        const { diffs, ...revision } = resp.data;
+
         // Store revision & diffs data
-        state.commit("use_revision", {
-          revision: respRevision.data,
-          diffs: respDiffs.data.results,
-        });
+        state.commit("use_revision", { revision, diffs });
 
-        // Start loading issues for each diff
-        for (const diff of respDiffs.data.results) {
-          state.dispatch("load_issues", {
+        // Store issues of each diff
+        for (const diff of diffs) {
+          state.commit("add_issues", {
             diffId: diff.id,
-            url: diff.issues_url,
+            issues: diff.issues,
           });
         }
       });